@@ -0,0 +1,67 @@
+from __future__ import annotations
+import argparse, random, time
+from src.simulator.des import DESSimulation, replay_checkpoint, load_checkpoint
+from bench.bench_ospf import _graph
+
+# Failure experiments forked from one checkpointed warm-up (discovery, and with --ospf the
+# cold-start flooding) vs simulating the warm-up again for every experiment.
+# usage: python -m bench.bench_checkpoint --nodes 5000 --experiments 200 --ospf
+
+def experiment(sim: DESSimulation, edge, seconds: float) -> str:
+    sim.fail_link(*edge)
+    sim.run_for(seconds)
+    return sim.digest()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--nodes", type=int, default=5000)
+    ap.add_argument("--degree", type=int, default=3)
+    ap.add_argument("--warmup", type=float, default=30.0, help="virtual seconds before the failures")
+    ap.add_argument("--seconds", type=float, default=2.0, help="virtual seconds after each failure")
+    ap.add_argument("--experiments", type=int, default=200)
+    ap.add_argument("--cold", type=int, default=3, help="experiments also run from a cold start, for the comparison")
+    ap.add_argument("--ospf", action="store_true", help="run OSPF from empty databases during the warm-up")
+    ap.add_argument("--delay", type=float, default=1.0, help="per-hop link delay, ms")
+    args = ap.parse_args()
+    G = _graph(args.nodes, args.degree)
+    opts = {"seed": 1, "link_delay": args.delay / 1000.0, "ospf": "cold" if args.ospf else None}
+    edges = random.Random(5).sample(list(G.edges()), args.experiments)
+
+    def warm() -> DESSimulation:
+        sim = DESSimulation(G, None, echo=False, **opts)
+        sim.start()
+        sim.run_for(args.warmup)
+        return sim
+
+    t0 = time.perf_counter()
+    sim = warm()
+    t_warm = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    blob = sim.checkpoint()
+    t_ck = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    forked = [experiment(DESSimulation.restore(blob, None, echo=False), e, args.seconds) for e in edges]
+    t_fork = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for i in range(args.cold):
+        assert experiment(warm(), edges[i], args.seconds) == forked[i], "forked run differs from a cold one"
+    t_cold = (time.perf_counter() - t0) / max(args.cold, 1)
+
+    last = DESSimulation.restore(blob, None, echo=False)
+    experiment(last, edges[-1], args.seconds)
+    ck = load_checkpoint(last.checkpoint())
+    t0 = time.perf_counter()
+    assert replay_checkpoint(ck).digest() == ck["digest"] == forked[-1]
+    t_replay = time.perf_counter() - t0
+
+    n = args.experiments
+    print(f"{args.nodes} nodes, {G.number_of_edges()} links, {args.warmup:g}s warm-up"
+          f"{' with OSPF' if args.ospf else ''}, {n} experiments of {args.seconds:g}s")
+    print(f"  warm-up            {t_warm:8.2f}s   checkpoint {t_ck:.2f}s, {len(blob) / 1e6:.1f} MB")
+    print(f"  from checkpoint    {t_fork / n:8.3f}s per experiment   ({t_fork:.1f}s for {n})")
+    print(f"  from cold          {t_cold:8.3f}s per experiment   (~{t_cold * n:.0f}s for {n}; same end state)")
+    print(f"  replay from cold   {t_replay:8.2f}s   digest matches the checkpoint")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+from __future__ import annotations
+import argparse, random, time
+import networkx as nx
+import numpy as np
+from src.contingency import CONTINGENCY_ORDERS, ContingencyModel, run_contingency
+from src.loadengine import aggregate_demands
+from src.topology import compute_link_loads
+
+# Exhaustive N-1 on a random core graph.
+# usage: python -m bench.bench_contingency --nodes 10000 --degree 3 --flows 20000 --jobs 0
+
+def check(G: nx.Graph, pairs, order: int, k: int, ecmp: bool = False, seed: int = 3):
+    # k failure sets evaluated by the model vs re-routing every flow on G without them.
+    # With ECMP every link's load must match; with single paths a flow the failure did not
+    # touch may take another equal-cost path in a full re-route, so there the demand times
+    # path cost summed over the links must match (every flow is still on a shortest path)
+    flows, demand = aggregate_demands(pairs)
+    m = ContingencyModel(G, flows, demand, ecmp)
+    rnd = random.Random(seed)
+    loaded = np.nonzero(m.loaded)[0].tolist()
+    cost = np.array([G[u][v].get(m.weight, 1) if m.weight else 1 for u, v in m.rm.edges], dtype=np.float64)
+    for _ in range(k):
+        failed = tuple(sorted({rnd.choice(loaded)} | set(rnd.sample(range(len(m.rm.edges)), order - 1))))
+        if len(failed) < order:
+            continue
+        rows, new, lost = m.scenario(failed)
+        got = m.base.copy()
+        got[rows] = new
+        H = G.copy()
+        H.remove_edges_from(m.rm.edges[i] for i in failed)
+        ref = compute_link_loads(H, pairs, ecmp=ecmp)
+        want = np.array([ref.get(e, 0) for e in m.rm.edges], dtype=np.float64)
+        if got[list(failed)].any():
+            raise SystemExit(f"failing {[m.rm.edges[i] for i in failed]}: failed links still carry load")
+        if ecmp and not np.allclose(got, want, atol=1e-6):
+            bad = [m.rm.edges[i] for i in np.nonzero(~np.isclose(got, want, atol=1e-6))[0][:5]]
+            raise SystemExit(f"failing {[m.rm.edges[i] for i in failed]}: loads differ from a full "
+                             f"re-route on {bad}")
+        if not ecmp and not np.isclose(got @ cost, want @ cost):
+            raise SystemExit(f"failing {[m.rm.edges[i] for i in failed]}: flows are not on shortest paths "
+                             f"({got @ cost} vs {want @ cost} Mbps x cost)")
+        reachable = {(s, d) for s, d in flows if s == d or (s in H and d in H and nx.has_path(H, s, d))}
+        want_lost = float(sum(x for f, x in zip(flows, demand) if f not in reachable))
+        if abs(lost - want_lost) > 1e-6:
+            raise SystemExit(f"failing {[m.rm.edges[i] for i in failed]}: {lost} Mbps unrouted, "
+                             f"a full re-route leaves {want_lost}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--nodes", type=int, default=10000)
+    ap.add_argument("--degree", type=int, default=3)
+    ap.add_argument("--flows", type=int, default=20000)
+    ap.add_argument("--sources", type=int, default=500)
+    ap.add_argument("--mode", default="N-1")
+    ap.add_argument("--jobs", type=int, default=1)
+    ap.add_argument("--check", type=int, default=20, help="failure sets also checked against a full re-route")
+    args = ap.parse_args()
+    G = nx.random_regular_graph(args.degree, args.nodes, seed=7)
+    G = nx.relabel_nodes(G, {n: f"R{n}" for n in G})
+    rnd = random.Random(1)
+    for u, v in G.edges():
+        G[u][v]["bandwidth"] = rnd.choice([1000000, 10000000])
+    nodes = list(G)
+    srcs = rnd.sample(nodes, min(args.sources, len(nodes)))
+    pairs = [(rnd.choice(srcs), rnd.choice(nodes), rnd.randint(1, 100)) for _ in range(args.flows)]
+    print(f"{G.number_of_nodes()} nodes, {G.number_of_edges()} edges, {len(pairs)} flows")
+    t0 = time.perf_counter()
+    for ecmp in (False, True):
+        check(G, pairs, CONTINGENCY_ORDERS[args.mode], args.check, ecmp)
+    print(f"{args.check} failure sets match a full re-route, with and without ECMP "
+          f"({time.perf_counter() - t0:.1f}s)")
+    t0 = time.perf_counter()
+    res = run_contingency(G, pairs, mode=args.mode, jobs=args.jobs)
+    dt = time.perf_counter() - t0
+    print(f"{args.mode}: {res['evaluated']} of {res['scenarios']} scenarios evaluated in {dt:.1f}s "
+          f"({res['evaluated'] / dt:.0f}/s), {len(res['overloads'])} with new overloads/unrouted demand")
+
+if __name__ == "__main__":
+    main()
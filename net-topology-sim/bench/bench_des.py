@@ -0,0 +1,30 @@
+from __future__ import annotations
+import argparse, time
+import networkx as nx
+from src.simulator.des import DESSimulation
+
+# Virtual-time HELLO discovery on a large random topology.
+# usage: python -m bench.bench_des --nodes 10000 --seconds 600
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--nodes", type=int, default=10000)
+    ap.add_argument("--degree", type=int, default=3)
+    ap.add_argument("--seconds", type=float, default=600)
+    ap.add_argument("--logs", default=None, help="write per-node logs here (default: no logging)")
+    args = ap.parse_args()
+    G = nx.random_regular_graph(args.degree, args.nodes, seed=7)
+    G = nx.relabel_nodes(G, {n: f"R{n}" for n in G})
+    t0 = time.perf_counter()
+    sim = DESSimulation(G, logs_dir=args.logs, echo=False)
+    sim.start()
+    t1 = time.perf_counter()
+    sim.run_for(args.seconds)
+    sim.stop()
+    t2 = time.perf_counter()
+    print(f"{args.nodes} nodes, {G.number_of_edges()} links: setup {t1 - t0:.2f}s, "
+          f"{args.seconds:.0f} virtual s in {t2 - t1:.1f}s wall ({args.seconds / (t2 - t1):.1f}x real time), "
+          f"{sim.events / (t2 - t1):,.0f} events/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+from __future__ import annotations
+import argparse, copy, os, tempfile, time
+from collections import Counter
+from src.incremental import ValidationState, save_state, load_state
+from src.validators import run_validation, finding_key
+from src.topology import build_topology
+from bench.bench_topology import dense_lans, _iface
+
+# Incremental re-validation of single-device edits vs a full validation of the estate.
+# usage: python -m bench.bench_incremental --lans 400 --hosts 48 --mode segment
+
+def _edits(devices):
+    # (label, changes) applied one after the other
+    s, r = devices["S1_0"], devices["R2_0"]
+    dup = copy.deepcopy(s)
+    dup["interfaces"][0]["ip"] = devices["S1_1"]["interfaces"][0]["ip"]
+    vlan = copy.deepcopy(dup)
+    vlan["interfaces"][0]["vlan"] = 20
+    desc = copy.deepcopy(r)
+    desc["interfaces"][0]["description"] = "to CORE9"
+    new = {"hostname": "S1_new", "interfaces": [_iface("Vlan10", "10.1.3.250", "255.255.252.0", "10.1.0.0/22", vlan=10)],
+           "routing": {"ospf": [], "bgp": []}}
+    return [("duplicate ip", {"S1_0": dup}), ("vlan change", {"S1_0": vlan}), ("description", {"R2_0": desc}),
+            ("add switch", {"S1_new": new}), ("remove switch", {"S1_new": None, "S1_0": s}),
+            ("remove router", {"R2_0": None})]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lans", type=int, default=400)
+    ap.add_argument("--hosts", type=int, default=48)
+    ap.add_argument("--mode", default="segment")
+    ap.add_argument("--check", action="store_true", help="compare every step with a full validation")
+    args = ap.parse_args()
+    options = {"loops": "summary"}
+    devices = dense_lans(args.lans, args.hosts)
+    edits = _edits(devices)
+    t0 = time.perf_counter()
+    state = ValidationState(".", devices, {}, mode=args.mode, options=options)
+    res = state.validate()
+    full = time.perf_counter() - t0
+    print(f"{len(devices)} devices, {state.G.number_of_edges()} edges ({args.mode}); "
+          f"full build + validation {full:.2f}s, {len(res['issues'])} findings")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "state.pkl")
+        t0 = time.perf_counter()
+        save_state(state, path)
+        t_save = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        state = load_state(path)
+        t_load = time.perf_counter() - t0
+        print(f"state file {os.path.getsize(path) / 2**20:.1f} MB, save {t_save:.2f}s, load {t_load:.2f}s")
+    for label, changes in edits:
+        t0 = time.perf_counter()
+        r = state.apply(changes)
+        dt = time.perf_counter() - t0
+        rechecked = [x["rule"] for x in r["rules"] if x["rechecked"]]
+        line = (f"  {label:<14} {dt * 1000:8.1f}ms  +{len(r['added'])} -{len(r['resolved'])}  "
+                f"rechecked {len(rechecked)}/{len(r['rules'])} rules")
+        if args.check:
+            t0 = time.perf_counter()
+            ref = run_validation(build_topology(state.devices, mode=args.mode), state.devices, options=options)
+            line += f"  full {time.perf_counter() - t0:.2f}s, identical"
+            want, got = Counter(map(finding_key, ref["issues"])), Counter(map(finding_key, state.issues()))
+            if got != want:
+                raise SystemExit(f"{label}: incremental findings differ from a full validation: missing "
+                                 f"{list((want - got).elements())[:5]}, extra {list((got - want).elements())[:5]}")
+        print(line)
+
+if __name__ == "__main__":
+    main()
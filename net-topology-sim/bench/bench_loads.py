@@ -0,0 +1,40 @@
+from __future__ import annotations
+import argparse, random, time
+import networkx as nx
+from src.topology import compute_link_loads, compute_link_loads_pairwise
+
+# Per-pair shortest_path loads vs the batched routing-matrix engine.
+# usage: python -m bench.bench_loads --nodes 2000 --flows 200000
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--nodes", type=int, default=2000)
+    ap.add_argument("--degree", type=int, default=4)
+    ap.add_argument("--flows", type=int, default=100000)
+    ap.add_argument("--sources", type=int, default=200, help="distinct source devices")
+    ap.add_argument("--skip-pairwise", action="store_true")
+    args = ap.parse_args()
+    G = nx.random_regular_graph(args.degree, args.nodes, seed=7)
+    G = nx.relabel_nodes(G, {n: f"R{n}" for n in G})
+    for u, v in G.edges():
+        G[u][v]["bandwidth"] = 10000000
+    rnd = random.Random(1)
+    nodes = list(G)
+    srcs = rnd.sample(nodes, min(args.sources, len(nodes)))
+    pairs = [(rnd.choice(srcs), rnd.choice(nodes), rnd.randint(1, 100)) for _ in range(args.flows)]
+    print(f"{G.number_of_nodes()} nodes, {G.number_of_edges()} edges, {len(pairs)} flows from {len(srcs)} sources")
+
+    t0 = time.perf_counter()
+    fast = compute_link_loads(G, pairs)
+    print(f"engine          {time.perf_counter() - t0:7.2f}s")
+    t0 = time.perf_counter()
+    compute_link_loads(G, pairs, ecmp=True)
+    print(f"engine (ecmp)   {time.perf_counter() - t0:7.2f}s")
+    if not args.skip_pairwise:
+        t0 = time.perf_counter()
+        ref = compute_link_loads_pairwise(G, pairs)
+        print(f"pairwise        {time.perf_counter() - t0:7.2f}s")
+        print("identical:", fast == ref)
+
+if __name__ == "__main__":
+    main()
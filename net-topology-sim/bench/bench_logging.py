@@ -0,0 +1,56 @@
+from __future__ import annotations
+import argparse, os, tempfile, threading, time
+from src.simulator.logsink import LogOptions, make_logger
+
+# Node log throughput: the old open/append/close per line vs the buffered pipeline,
+# with one producer thread per node as in the threaded simulator.
+# usage: python -m bench.bench_logging --nodes 200 --lines 5000
+
+def legacy(logs_dir: str, nodes: int, lines: int):
+    def node(i):
+        path = os.path.join(logs_dir, f"N{i}.log")
+        for k in range(lines):
+            line = f"[{time.strftime('%H:%M:%S')}] N{i}: HELLO from N{k}"
+            with open(path, "a") as f:
+                f.write(line + "\n")
+    return node
+
+def pipeline(logger, nodes: int, lines: int):
+    def node(i):
+        name = f"N{i}"
+        for k in range(lines):
+            logger.log(time.time(), name, "HELLO", f"HELLO from N{k}")
+    return node
+
+def run(target, nodes: int) -> float:
+    ts = [threading.Thread(target=target, args=(i,)) for i in range(nodes)]
+    t0 = time.perf_counter()
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    return time.perf_counter() - t0
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--nodes", type=int, default=200)
+    ap.add_argument("--lines", type=int, default=5000, help="records per node")
+    args = ap.parse_args()
+    total = args.nodes * args.lines
+    print(f"{args.nodes} nodes x {args.lines} records")
+    with tempfile.TemporaryDirectory() as d:
+        dt = run(legacy(d, args.nodes, args.lines), args.nodes)
+        print(f"open per line     {dt:7.2f}s  {total / dt:10,.0f} lines/s")
+    for label, opts in (("text", LogOptions(quiet=True)),
+                        ("ndjson", LogOptions(quiet=True, fmt="ndjson")),
+                        ("text HELLO=10", LogOptions(quiet=True, sample={"HELLO": 10}))):
+        with tempfile.TemporaryDirectory() as d:
+            logger = make_logger(d, opts)
+            t0 = time.perf_counter()
+            produce = run(pipeline(logger, args.nodes, args.lines), args.nodes)
+            logger.close()
+            dt = time.perf_counter() - t0
+            print(f"{label:<16}  {dt:7.2f}s  {total / dt:10,.0f} lines/s  (producers done after {produce:.2f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+from __future__ import annotations
+import argparse, json, time, tracemalloc
+import networkx as nx
+from src.validators import loops, loop_summary
+
+# Loop findings on a meshed core: full cycle basis vs biconnected-component summary.
+# usage: python -m bench.bench_loops --nodes 40000 --degree 6
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--nodes", type=int, default=40000)
+    ap.add_argument("--degree", type=int, default=6)
+    ap.add_argument("--max-cycles", type=int, default=10)
+    args = ap.parse_args()
+    G = nx.random_regular_graph(args.degree, args.nodes, seed=3)
+    G = nx.relabel_nodes(G, {n: f"R{n}" for n in G})
+    print(f"{args.nodes} nodes, {G.number_of_edges()} links, "
+          f"E - V + 1 = {G.number_of_edges() - args.nodes + 1}")
+    for name, fn in (("summary", lambda: loop_summary(G, args.max_cycles)), ("basis", lambda: loops(G))):
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        issues = fn()
+        dt = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        size = len(json.dumps(issues))
+        print(f"{name:<8} {dt:7.2f}s  peak {peak / 2**20:7.1f} MB  {len(issues)} findings, "
+              f"{size / 2**20:.1f} MB of JSON")
+
+if __name__ == "__main__":
+    main()
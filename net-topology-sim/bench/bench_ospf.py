@@ -0,0 +1,165 @@
+from __future__ import annotations
+import argparse, random, time
+import networkx as nx
+from src.simulator.des import DESSimulation
+
+# OSPF convergence after link flaps on one large area, incremental vs full SPF.
+# usage: python -m bench.bench_ospf --nodes 5000 --flaps 5
+
+def _graph(nodes: int, degree: int) -> nx.Graph:
+    G = nx.random_regular_graph(degree, nodes, seed=7)
+    G = nx.relabel_nodes(G, {n: f"R{n}" for n in G})
+    rnd = random.Random(1)
+    for u, v in G.edges():
+        G[u][v]["bandwidth"] = rnd.choice([10000, 50000, 100000])  # OSPF cost 10, 2, 1
+    for n in G:
+        G.nodes[n]["ospf"] = ["0.0.0.0/0"]
+    return G
+
+def _segment_check():
+    # A, X and C on one LAN, A-X also point-to-point: when X loses the LAN, its new LSA reaches
+    # A over the point-to-point link and has to be flooded onto the LAN for C
+    G = nx.Graph(mode="segment")
+    seg = "seg:10.0.0.0/24"
+    G.add_node(seg, kind="segment")
+    for n in ("A", "X", "C"):
+        G.add_node(n, ospf=["0.0.0.0/0"])
+        G.add_edge(n, seg, network="10.0.0.0/24", bandwidth=100000)
+    G.add_edge("A", "X", network="10.0.1.0/30", bandwidth=100000)
+    sim = DESSimulation(G, None, echo=False, ospf="warm", link_delay=0.001)
+    sim.start()
+    sim.run_for(1.0)
+    sim.fail_link("X", seg)
+    sim.run_for(1.0)
+    x = sim.area.index["X"]
+    seqs = {n: sim.ospf_routers[n].lsdb[x].seq for n in ("A", "X", "C")}
+    assert seqs == {"A": 2, "X": 2, "C": 2}, f"X's LSA did not reach every router: {seqs}"
+    assert sim.ospf_routers["C"].routes()["X"]["next_hop"] == "A", "C still routes X over the LAN"
+
+def _member_check():
+    # A, B and C on one LAN that is C's only link: when C loses it, the DR re-originates the
+    # network LSA without C and A and B drop their routes to it; they come back with the link
+    G = nx.Graph(mode="segment")
+    seg = "seg:10.0.0.0/24"
+    G.add_node(seg, kind="segment")
+    for n in ("A", "B", "C"):
+        G.add_node(n, ospf=["0.0.0.0/0"])
+        G.add_edge(n, seg, network="10.0.0.0/24", bandwidth=100000)
+    for mode in ("warm", "cold"):
+        sim = DESSimulation(G, None, echo=False, ospf=mode, link_delay=0.001)
+        sim.start()
+        sim.run_for(1.0)
+        sim.fail_link("C", seg)
+        sim.run_for(1.0)
+        for n in ("A", "B"):
+            assert "C" not in sim.ospf_routers[n].routes(), f"{mode}: {n} still routes to C after it left the LAN"
+        _check_routes(sim)
+        sim.fail_link("C", seg, down=False)
+        sim.run_for(1.0)
+        for n in ("A", "B"):
+            assert sim.ospf_routers[n].routes().get("C") == {"next_hop": "C", "cost": 1.0}, f"{mode}: {n} lost C"
+        _check_routes(sim)
+
+def _check_routes(sim):
+    # every router's routes against Dijkstra on what is still up (segments: member -> LAN
+    # at the interface cost, LAN -> member at 0)
+    D = nx.DiGraph()
+    for u, nbrs in sim.area.adj.items():
+        for v, c in nbrs.items():
+            if sim.links[tuple(sorted((u, v)))]:
+                D.add_edge(u, v, cost=c)
+    for name, r in sim.ospf_routers.items():
+        dist = nx.single_source_dijkstra_path_length(D, name, weight="cost") if name in D else {}
+        want = {n: float(d) for n, d in dist.items() if n != name and n not in sim.area.segments}
+        got = {n: x["cost"] for n, x in r.routes().items()}
+        assert got == want, f"{name}: routes differ from Dijkstra for {sorted(set(got.items()) ^ set(want.items()))[:5]}"
+
+def _random_check(routers: int = 40, events: int = 30):
+    # segment-mode area with random LANs and point-to-point links, random link flaps
+    rnd = random.Random(3)
+    G = nx.Graph(mode="segment")
+    names = [f"R{i}" for i in range(routers)]
+    for n in names:
+        G.add_node(n, ospf=["0.0.0.0/0"])
+    for i in range(routers // 4):
+        seg = f"seg:10.{i}.0.0/24"
+        G.add_node(seg, kind="segment")
+        for n in rnd.sample(names, rnd.randint(2, 5)):
+            G.add_edge(n, seg, network=f"10.{i}.0.0/24", bandwidth=rnd.choice([10000, 100000]))
+    for _ in range(routers):
+        u, v = rnd.sample(names, 2)
+        G.add_edge(u, v, network="", bandwidth=rnd.choice([10000, 50000, 100000]))
+    for mode in ("warm", "cold"):
+        sim = DESSimulation(G, None, echo=False, ospf=mode, link_delay=0.001)
+        sim.start()
+        sim.run_for(1.0)
+        _check_routes(sim)
+        edges = sorted(sim.links)
+        for _ in range(events):
+            a, b = rnd.choice(edges)
+            sim.fail_link(a, b, down=sim.links[(a, b)])
+            sim.run_for(1.0)
+            _check_routes(sim)
+
+def _flaps(sim, edges, settle: float):
+    # -> [(phase, convergence s, SPF CPU s summed over routers)]
+    out = []
+    for a, b in edges:
+        for down in (True, False):
+            cpu0 = sum(r.spf_cpu for r in sim.ospf_routers.values())
+            sim.fail_link(a, b, down=down)
+            sim.run_for(settle)
+            rep = sim.ospf_report(routes=False)
+            out.append(("down" if down else "up", rep["converged_after_s"], rep["spf_cpu_ms"] / 1000 - cpu0))
+    return out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--nodes", type=int, default=5000)
+    ap.add_argument("--degree", type=int, default=3)
+    ap.add_argument("--flaps", type=int, default=5)
+    ap.add_argument("--delay", type=float, default=1.0, help="per-hop link delay, ms")
+    ap.add_argument("--full-sample", type=int, default=100,
+                    help="routers run with full SPF for the comparison (0 = all)")
+    args = ap.parse_args()
+    _segment_check()
+    _member_check()
+    _random_check()
+    G = _graph(args.nodes, args.degree)
+    rnd = random.Random(5)
+    edges = rnd.sample(list(G.edges()), args.flaps)
+    print(f"{args.nodes} routers, {G.number_of_edges()} links, {args.flaps} flaps, "
+          f"{args.delay:g} ms per hop")
+
+    t0 = time.perf_counter()
+    sim = DESSimulation(G, None, echo=False, ospf="warm", link_delay=args.delay / 1000.0)
+    print(f"warm start (one full SPF per router): {time.perf_counter() - t0:.1f}s")
+    sim.start()
+    sim.run_for(1.0)
+    scans0 = sum(r.rescanned for r in sim.ospf_routers.values())
+    t0 = time.perf_counter()
+    res = _flaps(sim, edges, 2.0)
+    wall = time.perf_counter() - t0
+    rescanned = sum(r.rescanned for r in sim.ospf_routers.values()) - scans0
+    for phase, conv, cpu in res:
+        print(f"  link {phase:<4} converged after {conv * 1000:6.1f} ms (virtual), "
+              f"SPF CPU {cpu * 1000:8.1f} ms total, {cpu / args.nodes * 1e6:6.1f} us/router")
+    inc_cpu = sum(c for _, _, c in res) / len(res)
+    print(f"incremental: {inc_cpu * 1000:.0f} ms SPF CPU per flap across the area, {wall:.1f}s wall for "
+          f"{len(res)} events, {rescanned / len(res) / args.nodes:.1f} tree nodes rescanned per router per event")
+
+    # reference: full Dijkstra on every change, on a sample of routers
+    k = args.full_sample or args.nodes
+    sample = sorted(rnd.sample(list(G), min(k, args.nodes)))
+    for name in sample:
+        sim.ospf_routers[name].full_spf = True
+    cpu0 = {n: sim.ospf_routers[n].spf_cpu for n in sample}
+    inc0 = sum(sim.ospf_routers[n].spf_cpu for n in G if n not in cpu0)
+    _flaps(sim, edges, 2.0)
+    full = sum(sim.ospf_routers[n].spf_cpu - cpu0[n] for n in sample) / len(sample) / len(res)
+    inc = (sum(sim.ospf_routers[n].spf_cpu for n in G if n not in cpu0) - inc0) / max(1, args.nodes - len(sample)) / len(res)
+    print(f"full SPF:    {full * 1000:.2f} ms per router per flap ({full * args.nodes:.1f}s across the area), "
+          f"incremental {inc * 1000:.3f} ms ({full / inc:.0f}x less)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+from __future__ import annotations
+import argparse, os, tempfile, time, tracemalloc
+from src.parser import parse_device_config, parse_device_config_regex
+
+# Compares the single-pass parser against the old regex cascade on one large config.
+# usage: python -m bench.bench_parser --lines 300000
+
+def write_big_config(path: str, lines: int) -> int:
+    n = 0
+    with open(path, "w") as f:
+        f.write("hostname CORE1\n!\n")
+        i = 0
+        while n < lines:
+            a, b = (i >> 8) & 255, i & 255
+            f.write(f"interface TenGig{i // 48}/{i % 48}\n"
+                    f" description to LEAF{i} Eth1\n"
+                    f" ip address 10.{a}.{b}.1 255.255.255.252\n"
+                    f" bandwidth 10000000\n"
+                    f" mtu 9216\n"
+                    f" no shutdown\n!\n"
+                    f"interface TenGig{i // 48}/{i % 48}.100\n"
+                    f" encapsulation dot1q 100\n"
+                    f" ip address 172.{16 + a % 16}.{b}.1 255.255.255.0\n!\n")
+            n += 10
+            i += 1
+        f.write("router ospf 1\n")
+        for j in range(i):
+            f.write(f" network 10.{(j >> 8) & 255}.{j & 255}.0 0.0.0.3 area 0\n")
+        f.write("!\nrouter bgp 65000\n neighbor 10.0.0.2 remote-as 65001\n!\n")
+        n += i + 5
+    return n
+
+def measure(fn, path: str):
+    t0 = time.perf_counter()
+    dev = fn(path)
+    dt = time.perf_counter() - t0
+    # separate run for memory: tracemalloc would distort the timing
+    tracemalloc.start()
+    fn(path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return dev, dt, peak
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=300000)
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "CORE1", "config.dump")
+        os.makedirs(os.path.dirname(path))
+        n = write_big_config(path, args.lines)
+        print(f"config: {n} lines, {os.path.getsize(path) / 1e6:.1f} MB")
+        for label, fn in (("regex cascade", parse_device_config_regex), ("single pass", parse_device_config)):
+            dev, dt, peak = measure(fn, path)
+            print(f"{label:14s} {dt:7.2f}s  {n / dt:12,.0f} lines/s  peak {peak / 1e6:7.1f} MB  "
+                  f"{len(dev['interfaces'])} interfaces")
+        # the subinterfaces pick up their parent's bandwidth/mtu in the new engine, so only
+        # compare the fields both engines derive from the same lines
+        keys = ("name", "description", "ip", "mask", "vlan", "network")
+        old, new = parse_device_config_regex(path), parse_device_config(path)
+        if [{k: i[k] for k in keys} for i in old["interfaces"]] != \
+                [{k: i[k] for k in keys} for i in new["interfaces"]]:
+            raise SystemExit("the single-pass parser reads other interface fields than the regex cascade")
+        print("interface fields match")
+
+if __name__ == "__main__":
+    main()
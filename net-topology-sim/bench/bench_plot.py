@@ -0,0 +1,68 @@
+from __future__ import annotations
+import argparse, os, tempfile, time
+import networkx as nx
+from src.parser import parse_conf_dir
+from src.topology import build_topology
+from src.plot import auto_grouping, cached_layout, collapse, group_nodes, neighborhood, render
+from bench.generate import SHAPES, generate
+
+# Drawing a generated estate the old way (spring_layout over every node, nx.draw with all
+# labels) vs grouped, with the layout cached, after a one-device change, and a 2-hop view.
+# usage: python -m bench.bench_plot --shape leaf-spine --devices 400
+
+def old_plot(G: nx.Graph, out: str) -> float:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    t0 = time.perf_counter()
+    pos = nx.spring_layout(G, seed=42)
+    nx.draw(G, pos, with_labels=True, node_color="lightblue", node_size=2000, font_size=12, font_weight="bold")
+    nx.draw_networkx_edge_labels(G, pos, edge_labels=nx.get_edge_attributes(G, "network"), font_size=8)
+    plt.savefig(out)
+    plt.close()
+    return time.perf_counter() - t0
+
+def new_plot(G: nx.Graph, out: str, cache: str) -> tuple:
+    t0 = time.perf_counter()
+    H = collapse(G, group_nodes(G, auto_grouping(G)))
+    pos, how = cached_layout(H, cache)
+    render(H, pos, out)
+    return time.perf_counter() - t0, how
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--shape", choices=SHAPES, default="leaf-spine")
+    ap.add_argument("--devices", type=int, default=400)
+    ap.add_argument("--old-max", type=int, default=1000, help="skip the old path above this many nodes")
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        info = generate(tmp, args.shape, args.devices)
+        G = build_topology(parse_conf_dir(info["conf"]))
+        cache = os.path.join(tmp, "layout")
+        t_old = None
+        if G.number_of_nodes() <= args.old_max:
+            try:
+                t_old = old_plot(G, os.path.join(tmp, "old.png"))
+            except ImportError as e:  # spring_layout needs scipy above 500 nodes
+                print(f"old path skipped: {e}")
+        t_cold, _ = new_plot(G, os.path.join(tmp, "new.png"), cache)
+        t_warm, how = new_plot(G, os.path.join(tmp, "new.png"), cache)
+        assert how == "cached"
+        H = G.copy()
+        H.remove_node(next(n for n in G if G.degree(n) == min(d for _, d in G.degree())))
+        t_edit, how_edit = new_plot(H, os.path.join(tmp, "edit.png"), cache)
+        t0 = time.perf_counter()
+        K = neighborhood(G, next(iter(G)), 2)
+        new_plot(K, os.path.join(tmp, "hop.png"), cache)
+        t_hop = time.perf_counter() - t0
+
+    print(f"{args.shape}: {G.number_of_nodes()} nodes, {G.number_of_edges()} links")
+    if t_old is not None:
+        print(f"  spring_layout + nx.draw  {t_old:8.2f}s")
+    print(f"  grouped, cold layout     {t_cold:8.2f}s")
+    print(f"  grouped, cached layout   {t_warm:8.2f}s")
+    print(f"  one device removed       {t_edit:8.2f}s   (layout {how_edit})")
+    print(f"  2-hop view ({K.number_of_nodes()} nodes)  {t_hop:8.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+from __future__ import annotations
+import argparse, json, os, subprocess, sys, tempfile, time
+from src import ndjson
+from src.parser import parse_conf_dir
+
+# parse report as one indented JSON document vs streamed NDJSON: wall time and peak RSS
+# of the whole CLI run, plus raw encoder throughput of the stdlib vs the optional orjson.
+# usage: python -m bench.bench_reports --devices 5000 --ifaces 50
+
+def write_estate(root: str, devices: int, ifaces: int):
+    for d in range(devices):
+        os.makedirs(os.path.join(root, f"D{d}"))
+        with open(os.path.join(root, f"D{d}", "config.dump"), "w") as f:
+            f.write(f"hostname D{d}\n!\n")
+            for i in range(ifaces):
+                n = d * ifaces + i
+                f.write(f"interface Gi1/0/{i}\n description to D{(d + 1) % devices} port {i}\n"
+                        f" ip address 10.{n >> 14 & 255}.{n >> 6 & 255}.{(n & 63) * 4 + 1} 255.255.255.252\n"
+                        f" bandwidth 1000000\n mtu 1500\n switchport access vlan {i % 4 + 10}\n!\n")
+            f.write("router ospf 1\n network 10.0.0.0 0.255.255.255 area 0\n!\n")
+
+def run(conf: str, out: str, fmt: str):
+    t0 = time.perf_counter()
+    p = subprocess.Popen([sys.executable, "-m", "src.main", "parse", "--conf", conf, "--out", out, "--format", fmt],
+                         stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(p.pid, 0)
+    assert status == 0, status
+    return time.perf_counter() - t0, usage.ru_maxrss / 1024, os.path.getsize(out) / 2**20
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--devices", type=int, default=5000)
+    ap.add_argument("--ifaces", type=int, default=50)
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        conf = os.path.join(tmp, "conf")
+        write_estate(conf, args.devices, args.ifaces)
+        print(f"{args.devices} devices x {args.ifaces} interfaces, NDJSON encoder: {ndjson.JSON_BACKEND}")
+        for fmt, name in (("json", "parsed.json"), ("ndjson", "parsed.ndjson")):
+            dt, rss, size = run(conf, os.path.join(tmp, name), fmt)
+            print(f"  parse --format {fmt:<7} {dt:6.2f}s  peak RSS {rss:7.1f} MB  output {size:6.1f} MB")
+        t0 = time.perf_counter()
+        n = sum(1 for _ in ndjson.iter_records(os.path.join(tmp, "parsed.ndjson")))
+        print(f"  read back {n} records in {time.perf_counter() - t0:.2f}s")
+        # both formats read back as the same report, and as what the parser produced
+        as_json = ndjson.load_report(os.path.join(tmp, "parsed.json"))
+        if ndjson.load_report(os.path.join(tmp, "parsed.ndjson")) != as_json:
+            raise SystemExit("the NDJSON parse report reads back differently from the JSON one")
+        if json.loads(json.dumps(parse_conf_dir(conf))) != as_json:
+            raise SystemExit("the parse report differs from the parsed devices")
+        devs = [v for _, v in ndjson.iter_records(os.path.join(tmp, "parsed.ndjson"))]
+        enc = json.JSONEncoder(separators=(",", ":")).encode
+        t0 = time.perf_counter()
+        for d in devs:
+            enc({"device": d})
+        t_std = time.perf_counter() - t0
+        print(f"  encode: json {t_std:.2f}s", end="")
+        if ndjson.orjson is not None:
+            t0 = time.perf_counter()
+            for d in devs:
+                ndjson.orjson.dumps({"device": d})
+            print(f", orjson {time.perf_counter() - t0:.2f}s", end="")
+            if any(json.loads(ndjson.orjson.dumps(d)) != json.loads(enc(d)) for d in devs):
+                raise SystemExit("orjson and json encode a device differently")
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+from __future__ import annotations
+import argparse, tempfile, time
+import numpy as np
+from src.parser import parse_conf_dir
+from src.topology import build_topology, compute_link_loads
+from src.traffic import DemandSeries, load_traffic
+from src.scenarios import evaluate_scenarios
+from bench.generate import SHAPES, generate
+
+# A day of 5-minute intervals (x growth multipliers) over one routing matrix vs routing
+# every interval's demand set on its own.
+# usage: python -m bench.bench_scenarios --shape fat-tree --devices 5000 --flows 20000
+
+def day(flows: int, intervals: int, seed: int = 0) -> np.ndarray:
+    # flows x intervals: a diurnal curve per flow with its own phase and noise
+    rnd = np.random.default_rng(seed)
+    base = rnd.integers(10, 2000, size=(flows, 1))
+    t = np.arange(intervals) / intervals * 2 * np.pi
+    phase = rnd.uniform(0, 2 * np.pi, size=(flows, 1))
+    return np.round(base * (1.2 + np.sin(t - phase)) * rnd.uniform(0.9, 1.1, size=(flows, intervals)))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--shape", choices=SHAPES, default="fat-tree")
+    ap.add_argument("--devices", type=int, default=5000)
+    ap.add_argument("--flows", type=int, default=20000)
+    ap.add_argument("--intervals", type=int, default=288)
+    ap.add_argument("--growth", default="1,1.1,1.25")
+    ap.add_argument("--ecmp", action="store_true")
+    args = ap.parse_args()
+    growth = [float(x) for x in args.growth.split(",")]
+    with tempfile.TemporaryDirectory() as tmp:
+        info = generate(tmp, args.shape, args.devices, flows=args.flows)
+        G = build_topology(parse_conf_dir(info["conf"]))
+        flows = list(dict.fromkeys((a, b) for a, b, _ in load_traffic(info["traffic"])))
+        series = DemandSeries(flows, [str(i * 300) for i in range(args.intervals)], day(len(flows), args.intervals))
+
+        t0 = time.perf_counter()
+        compute_link_loads(G, [(a, b, int(d)) for (a, b), d in zip(flows, series.demand[:, 0])], ecmp=args.ecmp)
+        t_one = time.perf_counter() - t0
+        cache = f"{tmp}/routing"
+        t0 = time.perf_counter()
+        rep, _ = evaluate_scenarios(G, series, growth, ecmp=args.ecmp, cache_dir=cache)
+        t_sweep = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        rep2, _ = evaluate_scenarios(G, series, growth, ecmp=args.ecmp, cache_dir=cache)
+        t_cached = time.perf_counter() - t0
+        assert rep2["routing_cached"] and rep2["links"] == rep["links"]
+
+    n = rep["scenarios"]
+    print(f"{args.shape}: {G.number_of_nodes()} nodes, {G.number_of_edges()} links, {len(flows)} flows, "
+          f"{n} scenarios ({args.intervals} intervals x {len(growth)} growth)")
+    print(f"  one evaluation        {t_one:8.2f}s   (one at a time: ~{t_one * n:.0f}s)")
+    print(f"  sweep                 {t_sweep:8.2f}s   (routing {rep['routing_seconds']:.2f}s, "
+          f"scenarios {rep['evaluate_seconds']:.2f}s)  x{t_sweep / t_one:.2f} one evaluation")
+    print(f"  sweep, cached routing {t_cached:8.2f}s   x{t_cached / t_one:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+from __future__ import annotations
+import argparse, http.client, json, os, subprocess, sys, tempfile, time
+from src.traffic import load_traffic
+from src.service import SocketClient
+from bench.generate import SHAPES, generate
+
+# Queries against a running serve process (Unix socket and HTTP keep-alive) vs starting
+# the CLI once per question, which parses and builds everything again each time.
+# usage: python -m bench.bench_serve --shape leaf-spine --devices 2000 --queries 5000
+
+def wait_for(path: str, proc, timeout: float = 600):
+    t0 = time.perf_counter()
+    while not os.path.exists(path):
+        if proc.poll() is not None or time.perf_counter() - t0 > timeout:
+            raise SystemExit(f"serve did not start:\n{proc.stdout.read()}")
+        time.sleep(0.1)
+    return time.perf_counter() - t0
+
+def rate(fn, n: int) -> float:
+    t0 = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    return n / (time.perf_counter() - t0)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--shape", choices=SHAPES, default="leaf-spine")
+    ap.add_argument("--devices", type=int, default=2000)
+    ap.add_argument("--queries", type=int, default=5000)
+    ap.add_argument("--port", type=int, default=8479)
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        info = generate(tmp, args.shape, args.devices)
+        pairs = [(a, b) for a, b, _ in load_traffic(info["traffic"])]
+        sock = os.path.join(tmp, "serve.sock")
+        proc = subprocess.Popen([sys.executable, "-m", "src.main", "serve", "--conf", info["conf"],
+                                 "--traffic", info["traffic"], "--socket", sock,
+                                 "--http", f"127.0.0.1:{args.port}", "--watch-interval", "0"],
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        try:
+            t_start = wait_for(sock, proc)
+            c = SocketClient(sock)
+            path_q = lambda i: {"q": "path", "src": pairs[i % len(pairs)][0], "dst": pairs[(i * 7) % len(pairs)][1]}
+            cold = rate(lambda i: c.query(path_q(i)), len(pairs))  # one tree per source
+            warm = rate(lambda i: c.query(path_q(i)), args.queries)
+            t0 = time.perf_counter()
+            first = c.query({"q": "load"})
+            t_load = time.perf_counter() - t0
+            loads = rate(lambda i: c.query({"q": "load", "limit": 10}), min(args.queries, 1000))
+            a, b = first["links"][0]["a"], first["links"][0]["b"]
+            whatif = rate(lambda i: c.query({"q": "what-if", "fail": [[a, b]]}), min(args.queries, 200))
+            conn = http.client.HTTPConnection("127.0.0.1", args.port)
+            def http_path(i):
+                q = path_q(i)
+                conn.request("GET", f"/path?src={q['src']}&dst={q['dst']}")
+                json.loads(conn.getresponse().read())
+            web = rate(http_path, args.queries)
+            c.close()
+
+            out = os.path.join(tmp, "out", "loads.json")
+            t0 = time.perf_counter()
+            subprocess.run([sys.executable, "-m", "src.main", "plan-load", "--conf", info["conf"],
+                            "--traffic", info["traffic"], "--out", out], check=True, capture_output=True)
+            t_cli = time.perf_counter() - t0
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    print(f"{args.shape}: {info['devices']} devices, {len(pairs)} traffic pairs; serve ready in {t_start:.1f}s")
+    print(f"  path, socket     {warm:8.0f} q/s  ({cold:.0f} q/s while the tree cache fills)")
+    print(f"  path, http       {web:8.0f} q/s  (keep-alive)")
+    print(f"  load, socket     {loads:8.0f} q/s  (first one {t_load * 1000:.0f}ms: routes the demand set)")
+    print(f"  what-if, socket  {whatif:8.0f} q/s")
+    print(f"  CLI per query    {1 / t_cli:8.2f} q/s  (plan-load {t_cli:.1f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+from __future__ import annotations
+import argparse, os, time
+import networkx as nx
+from src.simulator.des import DESSimulation
+from src.simulator.sharded import ShardedSimulation
+
+# HELLO discovery throughput of the sharded engine for several worker counts,
+# against the single-process DES engine.
+# usage: python -m bench.bench_sharded --nodes 10000 --seconds 60 --workers 1,2,4,8
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--nodes", type=int, default=10000)
+    ap.add_argument("--degree", type=int, default=3)
+    ap.add_argument("--seconds", type=float, default=60)
+    ap.add_argument("--workers", default="1,2,4,8")
+    ap.add_argument("--window", type=float, default=0.05)
+    args = ap.parse_args()
+    G = nx.random_regular_graph(args.degree, args.nodes, seed=7)
+    G = nx.relabel_nodes(G, {n: f"R{n}" for n in G})
+    print(f"{args.nodes} nodes, {G.number_of_edges()} links, {args.seconds:.0f} virtual s, {os.cpu_count()} CPUs")
+
+    sim = DESSimulation(G, logs_dir=None, echo=False)
+    sim.start()
+    t0 = time.perf_counter()
+    sim.run_for(args.seconds)
+    dt = time.perf_counter() - t0
+    print(f"des             {dt:7.2f}s  {sim.events / dt:12,.0f} events/s")
+
+    for w in [int(x) for x in args.workers.split(",")]:
+        t0 = time.perf_counter()
+        sim = ShardedSimulation(G, logs_dir=None, workers=w, window=args.window, echo=False)
+        sim.start()
+        t1 = time.perf_counter()
+        sim.run_for(args.seconds)
+        dt = time.perf_counter() - t1
+        sim.stop()
+        print(f"sharded x{w:<2}     {dt:7.2f}s  {sim.events / dt:12,.0f} events/s  "
+              f"(setup {t1 - t0:.1f}s, {sim.cut} cut links, {sim.cross_messages:,} cross-shard messages)")
+
+if __name__ == "__main__":
+    main()
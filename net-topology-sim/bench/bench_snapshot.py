@@ -0,0 +1,71 @@
+from __future__ import annotations
+import argparse, os, tempfile, time
+from src.parser import parse_conf_dir
+from src.topology import build_topology
+from src.snapshot import SnapshotCache, write_snapshot, load_snapshot
+from bench.generate import SHAPES, generate
+
+# Loading a build snapshot vs parsing the configs and building the graph again.
+# usage: python -m bench.bench_snapshot --shape leaf-spine --devices 20000
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--shape", choices=SHAPES, default="leaf-spine")
+    ap.add_argument("--devices", type=int, default=20000)
+    ap.add_argument("--mode", default="mesh")
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        info = generate(tmp, args.shape, args.devices)
+        sources = {}
+        t0 = time.perf_counter()
+        devices = parse_conf_dir(info["conf"], sources=sources)
+        t_parse = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        G = build_topology(devices, mode=args.mode)
+        t_build = time.perf_counter() - t0
+        path = os.path.join(tmp, "snapshot")
+        t0 = time.perf_counter()
+        meta = write_snapshot(path, info["conf"], devices, G, sources)
+        t_write = time.perf_counter() - t0
+        size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)) / 2**20
+
+        t0 = time.perf_counter()
+        snap = load_snapshot(path)
+        stale = snap.stale()
+        t_check = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        G2 = snap.graph()
+        t_graph = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        devices2 = snap.devices()
+        t_devices = time.perf_counter() - t0
+        if stale:
+            raise SystemExit(f"a fresh snapshot is stale: {stale}")
+        if devices2 != devices:
+            raise SystemExit("the snapshot's devices differ from a fresh parse")
+        if list(G2.nodes(data=True)) != list(G.nodes(data=True)) or \
+                list(G2.edges(data=True)) != list(G.edges(data=True)):
+            raise SystemExit("the snapshot's graph differs from a fresh build")
+
+        # after an edit the snapshot is stale, and re-parsing only the changed config
+        # gives what a full parse does
+        cfg = sorted(sources)[0]
+        with open(cfg, "a") as f:
+            f.write("interface Loopback99\n ip address 192.0.2.99 255.255.255.255\n")
+        stale = snap.stale()
+        if stale != {"changed": [os.path.abspath(cfg)]}:
+            raise SystemExit(f"editing {cfg} was not detected: {stale}")
+        cache = SnapshotCache(snap)
+        if parse_conf_dir(info["conf"], cache=cache) != parse_conf_dir(info["conf"]) or cache.stats["misses"] != 1:
+            raise SystemExit(f"re-parsing a stale snapshot differs from a fresh parse ({cache.stats})")
+
+    print(f"{args.shape}: {meta['devices']} devices, {meta['edges']} edges, {meta['interfaces']} interfaces "
+          f"({args.mode}); snapshot {size:.1f} MB, written in {t_write:.2f}s")
+    print(f"  parse + build       {t_parse + t_build:8.3f}s  (parse {t_parse:.3f}s, build {t_build:.3f}s)")
+    print(f"  snapshot: stale check {t_check:.3f}s, graph {t_graph:.3f}s, devices {t_devices:.3f}s")
+    print(f"  graph-only commands {t_check + t_graph:8.3f}s  x{(t_parse + t_build) / (t_check + t_graph):.0f}")
+    print(f"  with devices        {t_check + t_graph + t_devices:8.3f}s  "
+          f"x{(t_parse + t_build) / (t_check + t_graph + t_devices):.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+from __future__ import annotations
+import argparse, gc, time, tracemalloc
+from src.parser import iter_conf_dir, _new_iface
+from src.store import DeviceStore
+from src.topology import build_topology
+from src.validators import ValidationIndex, run_validation
+
+# Memory of the parsed devices as nested dicts vs the columnar DeviceStore, and the time
+# build_topology and the validation index take on each.
+# usage: python -m bench.bench_store --devices 20000 --ifaces 50   (or --conf DIR)
+
+def estate(devices: int, ifaces: int):
+    # (hostname, device) shaped like parse_device_config's output, one device at a time:
+    # /30 uplinks, access ports on a VLAN per port group, descriptions naming the next device
+    for d in range(devices):
+        dev = {"hostname": f"D{d}", "interfaces": [], "routing": {"ospf": [], "bgp": []}}
+        for i in range(ifaces):
+            n = d * ifaces + i
+            iface = _new_iface(f"Gi1/0/{i}")
+            iface.update(description=f"to D{(d + 1) % devices} port {i}" if i < 2 else f"access port {i}",
+                         ip=f"10.{n >> 14 & 255}.{n >> 6 & 255}.{(n & 63) * 4 + 1}", mask="255.255.255.252",
+                         bandwidth=1000000, vlan=i % 4 + 10,
+                         network=f"10.{n >> 14 & 255}.{n >> 6 & 255}.{(n & 63) * 4}/30")
+            dev["interfaces"].append(iface)
+        dev["routing"]["ospf"].append({"process": 1, "networks": [{"network": "10.0.0.0/8", "area": "0"}]})
+        yield f"D{d}", dev
+
+def traced(load):
+    # -> (result, MB held once loaded, peak MB while loading)
+    gc.collect()
+    tracemalloc.start()
+    res = load()
+    cur, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return res, cur / 2**20, peak / 2**20
+
+def timed(fn, *a, **kw):
+    t0 = time.perf_counter()
+    r = fn(*a, **kw)
+    return r, time.perf_counter() - t0
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--devices", type=int, default=5000)
+    ap.add_argument("--ifaces", type=int, default=50)
+    ap.add_argument("--conf", default=None, help="parse this config tree instead of generating devices")
+    ap.add_argument("--mode", default="mesh")
+    args = ap.parse_args()
+    source = (lambda: iter_conf_dir(args.conf)) if args.conf else (lambda: estate(args.devices, args.ifaces))
+
+    devices, dict_mb, dict_peak = traced(lambda: dict(source()))
+    del devices
+    store, store_mb, store_peak = traced(lambda: DeviceStore(source()))
+    print(f"{len(store)} devices, {store.interfaces} interfaces, {len(store.strings)} distinct strings")
+    print(f"  dicts   {dict_mb:9.1f} MB  (peak {dict_peak:.1f} MB)")
+    print(f"  store   {store_mb:9.1f} MB  (peak {store_peak:.1f} MB)  x{dict_mb / store_mb:.1f} smaller")
+
+    # one representation alive at a time, as in a real run
+    times = {}
+    for kind, load in (("dicts", lambda: dict(source())), ("store", lambda: store)):
+        devices = load()
+        if kind == "dicts":
+            bad = next((d for d in devices if d not in store or store[d].to_dict() != devices[d]), None)
+            if bad is not None or len(store) != len(devices):
+                raise SystemExit(f"the store does not hold the parsed devices (first difference: {bad})")
+        G, t_build = timed(build_topology, devices, mode=args.mode)
+        _, t_index = timed(ValidationIndex, G, devices)
+        res, t_validate = timed(run_validation, G, devices)
+        times[kind] = (t_build, t_index, t_validate, list(G.edges(data=True)), res["issues"])
+        del devices, G, res, _
+    d, s = times["dicts"], times["store"]
+    if d[3] != s[3]:
+        raise SystemExit("build_topology gives another graph on the store than on the dicts")
+    if d[4] != s[4]:
+        raise SystemExit("run_validation gives other findings on the store than on the dicts")
+    print(f"  build_topology     dicts {d[0]:7.3f}s  store {s[0]:7.3f}s  ({len(d[3])} edges)")
+    print(f"  validation index   dicts {d[1]:7.3f}s  store {s[1]:7.3f}s")
+    print(f"  run_validation     dicts {d[2]:7.3f}s  store {s[2]:7.3f}s  ({len(d[4])} findings)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+from __future__ import annotations
+import argparse, random, tempfile, time
+from src.topology import build_topology, compute_link_loads
+from src.validators import loops
+from src.simulator.core import Simulation
+
+# Edge count and runtime of mesh vs segment topology on dense access LANs.
+# usage: python -m bench.bench_topology --lans 2 --hosts 400
+
+def _iface(name, ip, mask, net, bw=1000000, vlan=0, desc=""):
+    return {"name": name, "description": desc, "ip": ip, "mask": mask, "bandwidth": bw,
+            "mtu": 1500, "vlan": vlan, "network": net}
+
+def dense_lans(lans: int, hosts: int):
+    # two core routers per /22, `hosts` switches on each, routers chained by /30s
+    devices = {}
+    for l in range(lans):
+        net = f"10.{l}.0.0/22"
+        for r in range(2):
+            name = f"R{l}_{r}"
+            ifaces = [_iface("Vlan10", f"10.{l}.0.{r + 1}", "255.255.252.0", net)]
+            if l + 1 < lans:
+                ifaces.append(_iface("Gig0/0", f"172.16.{l}.{r * 4 + 1}", "255.255.255.252", f"172.16.{l}.{r * 4}/30"))
+            if l > 0:
+                ifaces.append(_iface("Gig0/1", f"172.16.{l - 1}.{r * 4 + 2}", "255.255.255.252", f"172.16.{l - 1}.{r * 4}/30"))
+            devices[name] = {"hostname": name, "interfaces": ifaces, "routing": {"ospf": [], "bgp": []}}
+        for h in range(hosts):
+            name = f"S{l}_{h}"
+            ip = f"10.{l}.{1 + h // 250}.{1 + h % 250}"
+            devices[name] = {"hostname": name, "interfaces": [_iface("Vlan10", ip, "255.255.252.0", net, vlan=10)],
+                             "routing": {"ospf": [], "bgp": []}}
+    return devices
+
+def timed(fn, *a, **kw):
+    t0 = time.perf_counter()
+    r = fn(*a, **kw)
+    return r, time.perf_counter() - t0
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lans", type=int, default=2)
+    ap.add_argument("--hosts", type=int, default=400)
+    ap.add_argument("--flows", type=int, default=2000)
+    args = ap.parse_args()
+    devices = dense_lans(args.lans, args.hosts)
+    rnd = random.Random(1)
+    names = list(devices)
+    flows = [(rnd.choice(names), rnd.choice(names), 10) for _ in range(args.flows)]
+    print(f"{len(devices)} devices, {args.lans} LAN(s) of {args.hosts} switches, {len(flows)} flows")
+    print(f"{'mode':8s} {'nodes':>7s} {'edges':>9s} {'build':>8s} {'loads':>8s} {'loops':>8s} {'sim init':>9s}")
+    for mode in ("mesh", "segment"):
+        G, t_build = timed(build_topology, devices, mode=mode)
+        _, t_loads = timed(compute_link_loads, G, flows)
+        _, t_loops = timed(loops, G)
+        with tempfile.TemporaryDirectory() as logs:
+            _, t_sim = timed(Simulation, G, logs)
+        print(f"{mode:8s} {G.number_of_nodes():7d} {G.number_of_edges():9d} {t_build:7.2f}s {t_loads:7.2f}s "
+              f"{t_loops:7.2f}s {t_sim:8.2f}s")
+
+if __name__ == "__main__":
+    main()
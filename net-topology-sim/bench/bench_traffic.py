@@ -0,0 +1,60 @@
+from __future__ import annotations
+import argparse, csv, os, random, tempfile, time, tracemalloc
+from src.traffic import read_traffic
+
+# Streaming flow-record ingestion (chunked read, summed per device pair as it goes) vs
+# reading every row first and aggregating afterwards.
+# usage: python -m bench.bench_traffic --rows 2000000 --devices 2000 --pairs 50000
+
+def write_flows(path: str, rows: int, devices: int, pairs: int, seed: int = 0):
+    rnd = random.Random(seed)
+    keys = [(f"D{rnd.randrange(devices)}", f"D{rnd.randrange(devices)}") for _ in range(pairs)]
+    classes = ("be", "af21", "ef")
+    with open(path, "w") as f:
+        f.write("src,dst,avg,peak,class\n")
+        for i in range(rows):
+            a, b = keys[rnd.randrange(pairs)]
+            f.write(f"{a},{b},{rnd.random():.3f},{rnd.random() * 4:.3f},{classes[i % 3]}\n")
+
+def read_all(path: str):
+    # every row in memory, then summed
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))[1:]
+    sums = {}
+    for src, dst, avg, peak, cls in rows:
+        v = sums.setdefault((src, dst, cls), [0.0, 0.0])
+        v[0] += float(avg)
+        v[1] += float(peak)
+    return sums
+
+def measured(fn, *a):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    res = fn(*a)
+    t = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return res, t, peak
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=2000000)
+    ap.add_argument("--devices", type=int, default=2000)
+    ap.add_argument("--pairs", type=int, default=50000)
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "flows.csv")
+        write_flows(path, args.rows, args.devices, args.pairs)
+        size = os.path.getsize(path) / 2**20
+        t0 = time.perf_counter()
+        tm = read_traffic(path)
+        t_stream = time.perf_counter() - t0
+        _, _, peak_stream = measured(read_traffic, path)
+        sums, t_all, peak_all = measured(read_all, path)
+    assert sums.keys() == tm.sums.keys()
+    print(f"{args.rows} flow records ({size:.0f} MB) -> {len(tm.pairs())} device pairs, {len(tm.classes())} classes")
+    print(f"  streamed     {t_stream:7.2f}s  ({args.rows / t_stream / 1e6:.2f}M rows/s)  peak {peak_stream:8.1f} MB")
+    print(f"  read whole   {t_all:7.2f}s  (traced)                peak {peak_all:8.1f} MB")
+
+if __name__ == "__main__":
+    main()
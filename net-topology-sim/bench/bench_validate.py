@@ -0,0 +1,43 @@
+from __future__ import annotations
+import argparse, time
+from src.topology import build_topology
+from src.validators import validate_all_sequential, run_validation
+from bench.bench_topology import dense_lans, _iface
+
+# Rule-by-rule validation vs the indexed engine on dense LANs with many ports per device.
+# usage: python -m bench.bench_validate --lans 2 --hosts 400 --ports 48 --jobs 0
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lans", type=int, default=2)
+    ap.add_argument("--hosts", type=int, default=400)
+    ap.add_argument("--ports", type=int, default=48, help="extra access ports per device")
+    ap.add_argument("--mode", default="mesh")
+    ap.add_argument("--jobs", type=int, default=0)
+    args = ap.parse_args()
+    devices = dense_lans(args.lans, args.hosts)
+    for k, dev in enumerate(devices.values()):
+        for p in range(args.ports):
+            n = k * args.ports + p
+            dev["interfaces"].append(_iface(f"Gi1/0/{p}", f"100.{n >> 14 & 63}.{n >> 6 & 255}.{(n & 63) * 4 + 1}",
+                                            "255.255.255.252", f"100.{n >> 14 & 63}.{n >> 6 & 255}.{(n & 63) * 4}/30",
+                                            vlan=p % 4))
+    G = build_topology(devices, mode=args.mode)
+    print(f"{len(devices)} devices, {sum(len(d['interfaces']) for d in devices.values())} interfaces, "
+          f"{G.number_of_edges()} edges ({args.mode})")
+    t0 = time.perf_counter()
+    ref = validate_all_sequential(G, devices)
+    print(f"sequential      {time.perf_counter() - t0:7.2f}s  {len(ref)} findings")
+    for jobs in (1, args.jobs):
+        t0 = time.perf_counter()
+        res = run_validation(G, devices, jobs=jobs)
+        dt = time.perf_counter() - t0
+        if res["issues"] != ref:
+            raise SystemExit(f"engine jobs={jobs}: findings differ from the sequential rules "
+                             f"({len(res['issues'])} vs {len(ref)})")
+        print(f"engine jobs={jobs:<3} {dt:7.2f}s  identical  (index {res['index_seconds']:.2f}s)")
+        for r in res["rules"]:
+            print(f"    {r['rule']:<32} {r['seconds']:7.3f}s  {r['findings']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+from __future__ import annotations
+import argparse, json, math, os, random
+from typing import Dict, Any, List, Optional
+from src.utils import int_to_ip
+
+# Synthetic estates: a conf/<DEVICE>/config.dump tree plus a matching traffic.json.
+# usage: python -m bench.generate --shape leaf-spine --devices 1000 --out /tmp/estate
+#
+# shapes (--devices is the target; fat-tree rounds down to a whole k):
+#   leaf-spine  up to 16 spines, every leaf uplinked to every spine, one access VLAN per leaf
+#   fat-tree    k-ary fat tree: (k/2)^2 cores, k pods of k/2 aggregation + k/2 edge switches
+#   ring        routers in a ring of /30s
+#   hub-spoke   full mesh of hubs (1 per 1000 devices, at least 2), spokes dual-homed to two hubs
+#   dense-lans  LANs of --lan-size switches behind two routers, routers chained between LANs
+
+SHAPES = ("leaf-spine", "fat-tree", "ring", "hub-spoke", "dense-lans")
+FABRIC_KBPS, ACCESS_KBPS, WAN_KBPS = 100000000, 10000000, 1000000
+LAN_POOL = 11 << 24
+
+def _wildcard(prefix: int) -> str:
+    w = (1 << (32 - prefix)) - 1
+    return f"{w >> 24 & 255}.{w >> 16 & 255}.{w >> 8 & 255}.{w & 255}"
+
+def _mask(prefix: int) -> str:
+    m = (0xFFFFFFFF << (32 - prefix)) & 0xFFFFFFFF
+    return f"{m >> 24}.{m >> 16 & 255}.{m >> 8 & 255}.{m & 255}"
+
+class Estate:
+    # devices with their interfaces; /30s for links come from 10.0.0.0/8, LAN subnets from 11.0.0.0/8
+    def __init__(self, seed: int = 0):
+        self.rnd = random.Random(seed)
+        self.devices: Dict[str, Dict[str, Any]] = {}
+        self.links = 0
+        self.lans = 0
+        self.lan_units = 0  # next free /26 in LAN_POOL
+        self.edge: List[str] = []  # devices that source/sink traffic
+
+    def device(self, name: str, bgp: Optional[int] = None, edge: bool = False) -> str:
+        self.devices[name] = {"ifaces": [], "bgp": bgp}
+        if edge:
+            self.edge.append(name)
+        return name
+
+    def _iface(self, dev: str, port: str, **kw) -> str:
+        # port: "Ethernet1/" gets the next free number appended; "Vlan<id>" is used as is
+        ifaces = self.devices[dev]["ifaces"]
+        name = f"{port}{len(ifaces)}" if port.endswith("/") else port
+        ifaces.append(dict(name=name, **kw))
+        return name
+
+    def link(self, a: str, b: str, bandwidth: int, mtu: int = 9216):
+        i = self.links
+        self.links += 1
+        if i >= 1 << 22:
+            raise ValueError("out of /30s in 10.0.0.0/8")
+        base = f"10.{i >> 14 & 255}.{i >> 6 & 255}."
+        net, last = f"{base}{(i & 63) * 4}", (i & 63) * 4
+        ia = self._iface(a, "Ethernet1/", ip=f"{base}{last + 1}", prefix=30, net=net, bw=bandwidth, mtu=mtu, desc=f"to {b}")
+        self._iface(b, "Ethernet1/", ip=f"{base}{last + 2}", prefix=30, net=net, bw=bandwidth, mtu=mtu,
+                    desc=f"to {a} {ia}")
+
+    def lan(self, members: List[str], vlan: int, bandwidth: int = ACCESS_KBPS):
+        # a /26, /24 or /22 depending on the member count, allocated in /26 units
+        prefix = next((p for p in (26, 24, 22) if len(members) < (1 << (32 - p)) - 1), None)
+        if prefix is None:
+            raise ValueError("LANs are at most a /22 (1022 members)")
+        units = 1 << (26 - prefix)
+        self.lan_units = -(-self.lan_units // units) * units
+        base = LAN_POOL + self.lan_units * 64
+        self.lan_units += units
+        self.lans += 1
+        if self.lan_units > 1 << 18:
+            raise ValueError("out of LAN subnets in 11.0.0.0/8")
+        for k, m in enumerate(members):
+            self._iface(m, f"Vlan{vlan}", ip=int_to_ip(base + k + 1), prefix=prefix, net=int_to_ip(base), bw=bandwidth,
+                        mtu=1500, vlan=vlan, desc=f"vlan {vlan} lan")
+
+    def inject_anomalies(self, rate: float):
+        # a few findings for the validators: MTU mismatches, duplicate IPs, VLAN mismatches
+        # and descriptions naming devices that have no config
+        rnd, names = self.rnd, list(self.devices)
+        count = max(1, round(len(names) * rate)) if rate > 0 else 0
+        for _ in range(count):
+            d = self.devices[rnd.choice(names)]
+            if not d["ifaces"]:
+                continue
+            i = rnd.choice(d["ifaces"])
+            kind = rnd.randrange(4)
+            if kind == 0:
+                i["mtu"] = 1400
+            elif kind == 1:
+                other = self.devices[rnd.choice(names)]["ifaces"]
+                if other:
+                    i["ip"] = rnd.choice(other)["ip"]
+            elif kind == 2 and "vlan" in i:
+                i["vlan"] += 1
+            else:
+                i["desc"] = f"to GHOST{rnd.randrange(1000)}"
+
+    def config(self, name: str) -> str:
+        dev = self.devices[name]
+        out = [f"hostname {name}", "!"]
+        for i in dev["ifaces"]:
+            out.append(f"interface {i['name']}")
+            out.append(f" description {i['desc']}")
+            out.append(f" ip address {i['ip']} {_mask(i['prefix'])}")
+            out.append(f" bandwidth {i['bw']}")
+            out.append(f" mtu {i['mtu']}")
+            if "vlan" in i:
+                out.append(f" switchport access vlan {i['vlan']}")
+            out.append(" no shutdown")
+            out.append("!")
+        out.append("router ospf 1")
+        for i in dev["ifaces"]:
+            out.append(f" network {i['net']} {_wildcard(i['prefix'])} area 0")
+        out.append("!")
+        if dev["bgp"]:
+            out += [f"router bgp {dev['bgp']}", f" neighbor 192.0.2.1 remote-as {dev['bgp'] + 1}", "!"]
+        return "\n".join(out) + "\n"
+
+    def traffic(self, flows: int) -> Dict[str, Any]:
+        # src.traffic reads traffic.json pairing endpoints in order: (0, 1), (2, 3), ...
+        rnd, eps = self.rnd, []
+        pool = self.edge or list(self.devices)
+        for f in range(flows if len(pool) > 1 else 0):
+            a, b = rnd.sample(pool, 2)
+            avg = rnd.choice([10, 50, 100, 500])
+            for side, dev in (("A", a), ("B", b)):
+                eps.append({"name": f"flow{f}{side}", "device": dev, "vlan": 0, "avg_mbps": avg,
+                            "peak_mbps": avg * rnd.choice([2, 3, 5])})
+        return {"endpoints": eps, "assumptions": {"use_peak": True}}
+
+    def write(self, root: str, flows: int) -> Dict[str, Any]:
+        conf = os.path.join(root, "conf")
+        for name in self.devices:
+            d = os.path.join(conf, name)
+            os.makedirs(d, exist_ok=True)
+            with open(os.path.join(d, "config.dump"), "w") as f:
+                f.write(self.config(name))
+        with open(os.path.join(conf, "traffic.json"), "w") as f:
+            json.dump(self.traffic(flows), f, indent=1)
+        return {"conf": conf, "traffic": os.path.join(conf, "traffic.json"), "devices": len(self.devices),
+                "links": self.links, "lans": self.lans}
+
+def leaf_spine(e: Estate, n: int):
+    spines = min(16, max(2, n // 32))
+    leaves = [e.device(f"LEAF{i}", edge=True) for i in range(max(1, n - spines))]
+    for s in range(spines):
+        sp = e.device(f"SPINE{s}", bgp=65000)
+        for leaf in leaves:
+            e.link(leaf, sp, FABRIC_KBPS)
+    for i, leaf in enumerate(leaves):
+        e.lan([leaf], vlan=100 + i % 3000)  # host-facing SVI
+
+def fat_tree(e: Estate, n: int):
+    k = max(2, 2 * int(math.sqrt(n / 5)))
+    half = k // 2
+    cores = [e.device(f"CORE{i}", bgp=65000) for i in range(half * half)]
+    for p in range(k):
+        aggs = [e.device(f"P{p}AGG{j}") for j in range(half)]
+        edges = [e.device(f"P{p}EDGE{j}", edge=True) for j in range(half)]
+        for j, agg in enumerate(aggs):
+            for c in range(half):
+                e.link(agg, cores[j * half + c], FABRIC_KBPS)
+            for edge in edges:
+                e.link(edge, agg, ACCESS_KBPS)
+
+def ring(e: Estate, n: int):
+    names = [e.device(f"RING{i}", edge=True) for i in range(max(3, n))]
+    for i, a in enumerate(names):
+        e.link(a, names[(i + 1) % len(names)], WAN_KBPS)
+
+def hub_spoke(e: Estate, n: int):
+    hubs = [e.device(f"HUB{i}", bgp=65000) for i in range(max(2, n // 1000))]
+    for i, a in enumerate(hubs):
+        for b in hubs[i + 1:]:
+            e.link(a, b, FABRIC_KBPS)
+    for s in range(max(1, n - len(hubs))):
+        spoke = e.device(f"SPOKE{s}", edge=True)
+        for h in {s % len(hubs), (s + 1) % len(hubs)}:
+            e.link(spoke, hubs[h], WAN_KBPS, mtu=1500)
+
+def dense_lans(e: Estate, n: int, lan_size: int = 200):
+    lans = max(1, -(-n // (lan_size + 2)))
+    prev = None
+    for l in range(lans):
+        routers = [e.device(f"L{l}R{r}", edge=True) for r in range(2)]
+        switches = [e.device(f"L{l}SW{h}") for h in range(min(lan_size, max(1, n - l * (lan_size + 2) - 2)))]
+        e.lan(routers + switches, vlan=10 + l % 4000)
+        if prev:
+            for a, b in zip(prev, routers):
+                e.link(a, b, ACCESS_KBPS)
+        prev = routers
+
+GENERATORS = {"leaf-spine": leaf_spine, "fat-tree": fat_tree, "ring": ring, "hub-spoke": hub_spoke,
+              "dense-lans": dense_lans}
+
+def generate(root: str, shape: str, devices: int, seed: int = 0, flows: int = 0,
+             anomalies: float = 0.001, lan_size: int = 200) -> Dict[str, Any]:
+    # -> {"conf", "traffic", "devices", "links", "lans"}; flows defaults to one per 10 devices
+    if shape not in GENERATORS:
+        raise ValueError(f"unknown shape {shape!r}")
+    e = Estate(seed)
+    if shape == "dense-lans":
+        dense_lans(e, devices, lan_size)
+    else:
+        GENERATORS[shape](e, devices)
+    e.inject_anomalies(anomalies)
+    return e.write(root, flows or max(1, devices // 10))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--shape", choices=SHAPES, required=True)
+    ap.add_argument("--devices", type=int, default=100)
+    ap.add_argument("--out", required=True, help="directory; configs go to <out>/conf")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--flows", type=int, default=0, help="traffic flows (default: devices / 10)")
+    ap.add_argument("--anomalies", type=float, default=0.001, help="misconfigurations per device")
+    ap.add_argument("--lan-size", type=int, default=200, help="switches per LAN (dense-lans)")
+    args = ap.parse_args()
+    info = generate(args.out, args.shape, args.devices, seed=args.seed, flows=args.flows,
+                    anomalies=args.anomalies, lan_size=args.lan_size)
+    print(f"{args.shape}: {info['devices']} devices, {info['links']} links, {info['lans']} LANs -> {info['conf']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+from __future__ import annotations
+import argparse, json, os, platform, subprocess, sys, tempfile, time
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+# End-to-end benchmark: generates estates (bench/generate.py), times each pipeline stage with
+# its peak RSS, and compares against a stored baseline. Each case runs in its own process.
+# usage: python -m bench.suite                                  # compare with bench/baseline.json
+#        python -m bench.suite --save-baseline                  # record a new baseline
+#        python -m bench.suite --shapes ring,fat-tree --devices 1000,100000 --threshold 0.2
+# Exit status 1 if any stage regressed by more than the threshold.
+
+from bench.generate import SHAPES, generate
+from src.profiling import RSSSampler
+
+STAGES = ("parse", "build", "validate", "loads", "simulate", "simulate-threads")
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_DEVICES = (1000,)
+MIN_SECONDS = 0.05  # differences below this are noise, whatever the ratio
+MIN_MB = 16.0
+
+def calibrate(rounds: int = 3) -> float:
+    # seconds for a fixed pure-Python workload (best of rounds); the ratio between two
+    # runs' calibrations scales their stage times, so a slower or throttled host is not
+    # reported as a regression
+    best = float("inf")
+    for _ in range(rounds):
+        t0, d = time.perf_counter(), {}
+        for i in range(300000):
+            d[i % 1000] = d.get(i % 1000, 0) + i
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def run_case(shape: str, devices: int, seed: int = 0, sim_seconds: float = 10.0,
+             threads_max: int = 500) -> Dict[str, Any]:
+    # -> {"devices", "edges", "generate_seconds", "calibration", "stages": {stage: {"seconds", "peak_mb"}}}
+    from src.parser import parse_conf_dir
+    from src.topology import build_topology, compute_link_loads
+    from src.validators import run_validation
+    from src.traffic import load_traffic
+    from src.simulator.core import Simulation
+    from src.simulator.des import DESSimulation
+    from src.simulator.logsink import LogOptions
+
+    stages: Dict[str, Dict[str, float]] = {}
+    calib = calibrate()
+    sampler = RSSSampler()
+
+    @contextmanager
+    def stage(name: str):
+        sampler.reset()
+        t0 = time.perf_counter()
+        yield
+        dt = time.perf_counter() - t0
+        stages[name] = {"seconds": round(dt, 4), "peak_mb": round(max(sampler.peak, sampler.rss_mb()), 1)}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        info = generate(tmp, shape, devices, seed=seed)
+        gen_seconds = time.perf_counter() - t0
+        with stage("parse"):
+            devs = parse_conf_dir(info["conf"])
+        with stage("build"):
+            G = build_topology(devs)
+        with stage("validate"):
+            run_validation(G, devs, options={"loops": "summary"})
+        pairs = load_traffic(info["traffic"])
+        with stage("loads"):
+            compute_link_loads(G, pairs)
+        with stage("simulate"):
+            sim = DESSimulation(G, None, seed=seed, echo=False)
+            sim.start()
+            sim.run_for(sim_seconds)
+            sim.stop()
+        if len(devs) <= threads_max:
+            # one thread per device: real time, so only the setup/teardown cost varies
+            with stage("simulate-threads"):
+                os.makedirs(os.path.join(tmp, "logs"))
+                sim = Simulation(G, os.path.join(tmp, "logs"), log=LogOptions(quiet=True))
+                sim.start()
+                sim.run_for(1)
+                sim.stop()
+    sampler.stop()
+    calib = min(calib, calibrate())
+    return {"devices": len(devs), "edges": G.number_of_edges(), "generate_seconds": round(gen_seconds, 2),
+            "calibration": round(calib, 5), "stages": stages}
+
+def _run_isolated(shape: str, devices: int, args, best: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    # best of --repeat fresh processes per stage (merged into best, if given): shared hosts
+    # only ever add time
+    cmd = [sys.executable, "-m", "bench.suite", "--case", f"{shape}:{devices}", "--seed", str(args.seed),
+           "--sim-seconds", str(args.sim_seconds), "--threads-max", str(args.threads_max)]
+    for _ in range(max(1, args.repeat)):
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise SystemExit(f"{shape}:{devices} failed:\n{proc.stderr}")
+        case = json.loads(proc.stdout.strip().splitlines()[-1])
+        if best is None:
+            best = case
+            continue
+        best["calibration"] = min(best["calibration"], case["calibration"])
+        for name, st in case["stages"].items():
+            b = best["stages"][name]
+            b["seconds"], b["peak_mb"] = min(b["seconds"], st["seconds"]), min(b["peak_mb"], st["peak_mb"])
+    return best
+
+def host_info() -> Dict[str, Any]:
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()}
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float, mem_threshold: float,
+            scale: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+    # -> one row per measured stage; "regressed" lists the metrics over threshold.
+    # scale: "shape/devices" -> baseline calibration / this run's; times are compared after
+    # multiplying by it ("seconds" in the row stays as measured, "scaled_seconds" is compared)
+    rows = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        f = (scale or {}).get(key.rsplit("/", 1)[0], 1.0)
+        row = {"key": key, **cur, "scaled_seconds": round(cur["seconds"] * f, 4), "base_seconds": None,
+               "base_mb": None, "regressed": []}
+        if base:
+            row["base_seconds"], row["base_mb"] = base["seconds"], base["peak_mb"]
+            t = row["scaled_seconds"]
+            if t > base["seconds"] * (1 + threshold) and t - base["seconds"] > MIN_SECONDS:
+                row["regressed"].append("time")
+            if cur["peak_mb"] > base["peak_mb"] * (1 + mem_threshold) and cur["peak_mb"] - base["peak_mb"] > MIN_MB:
+                row["regressed"].append("memory")
+        rows.append(row)
+    return rows
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--shapes", default=",".join(SHAPES))
+    ap.add_argument("--devices", default=",".join(map(str, DEFAULT_DEVICES)), help="comma-separated sizes")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--sim-seconds", type=float, default=10.0, help="virtual seconds for the des stage")
+    ap.add_argument("--threads-max", type=int, default=500, help="largest estate for the thread engine stage")
+    ap.add_argument("--repeat", type=int, default=3, help="runs per case; the fastest of each stage counts")
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    ap.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    ap.add_argument("--mem-threshold", type=float, default=0.25, help="allowed peak RSS growth vs baseline")
+    ap.add_argument("--no-normalize", dest="normalize", action="store_false",
+                    help="compare raw times, without scaling by the host calibration")
+    ap.add_argument("--out", default=None, help="also write the results as JSON")
+    ap.add_argument("--case", default=None, help=argparse.SUPPRESS)  # shape:devices, run in this process
+    args = ap.parse_args()
+
+    if args.case:
+        shape, n = args.case.split(":")
+        print(json.dumps(run_case(shape, int(n), args.seed, args.sim_seconds, args.threads_max)))
+        return
+
+    baseline, base_calib = {}, {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            data = json.load(f)
+        baseline, base_calib = data["results"], data.get("calibration", {})
+        if data.get("host") != host_info():
+            print(f"note: baseline was recorded on {data.get('host')}, this is {host_info()}")
+
+    results: Dict[str, Dict[str, float]] = {}
+    calib: Dict[str, float] = {}
+    scale: Dict[str, float] = {}
+    for n in (int(x) for x in args.devices.split(",")):
+        for shape in args.shapes.split(","):
+            key, case = f"{shape}/{n}", None
+            for attempt in range(2):
+                # a case over the threshold is measured again before it counts as a regression
+                case = _run_isolated(shape, n, args, case)
+                calib[key] = case["calibration"]
+                if args.normalize and key in base_calib:
+                    scale[key] = base_calib[key] / case["calibration"]
+                for name, st in case["stages"].items():
+                    results[f"{key}/{name}"] = st
+                rows = compare({k: v for k, v in results.items() if k.startswith(key + "/")}, baseline,
+                               args.threshold, args.mem_threshold, scale)
+                if not any(r["regressed"] for r in rows):
+                    break
+            print(f"{shape} {n}: {case['devices']} devices, {case['edges']} edges "
+                  f"(generated in {case['generate_seconds']:.1f}s)")
+            if key in scale:
+                print(f"  (host calibration x{1 / scale[key]:.2f} vs baseline; times scaled)")
+            for r in rows:
+                vs = ""
+                if r["base_seconds"] is not None:
+                    vs = (f"  baseline {r['base_seconds']:8.3f}s {r['base_mb']:7.1f} MB  "
+                          f"x{r['scaled_seconds'] / max(r['base_seconds'], 1e-9):5.2f}")
+                flag = f"  REGRESSION ({', '.join(r['regressed'])})" if r["regressed"] else ""
+                print(f"  {r['key'].rsplit('/', 1)[1]:<17} {r['seconds']:8.3f}s {r['peak_mb']:7.1f} MB{vs}{flag}")
+
+    regressions = [r for r in compare(results, baseline, args.threshold, args.mem_threshold, scale)
+                   if r["regressed"]]
+    report = {"host": host_info(), "threshold": args.threshold, "mem_threshold": args.mem_threshold,
+              "calibration": calib, "results": results}
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(dict(report, regressions=regressions), f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline written to {args.baseline}")
+    elif baseline:
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%} time / {args.mem_threshold:.0%} memory")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
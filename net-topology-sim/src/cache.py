@@ -0,0 +1,100 @@
+from __future__ import annotations
+import os, json, hashlib
+from typing import Dict, Any, Optional
+
+CACHE_FORMAT = 1
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+class ParseCache:
+    # On-disk cache of parse_device_config results.
+    # entry key: absolute file path
+    # entry value: {"mtime_ns", "size", "sha1", "used", "device"}
+    # An entry is reused when mtime/size are unchanged, or when they changed but the
+    # content hash did not (e.g. after a fresh checkout). Entries written by another
+    # parser version are dropped on load.
+    def __init__(self, path: str, parser_version: str, max_entries: int = 100000):
+        self.path = path
+        self.parser_version = parser_version
+        self.max_entries = max_entries
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.clock = 0  # monotonic use counter for LRU eviction
+        self.dirty = False
+        self.stats = {"hits": 0, "misses": 0, "rehashed": 0, "invalidated": 0, "evicted": 0}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            self.dirty = True
+            return
+        if data.get("format") != CACHE_FORMAT or data.get("parser_version") != self.parser_version:
+            self.stats["invalidated"] += len(data.get("entries", {}))
+            self.dirty = True
+            return
+        self.entries = data.get("entries", {})
+        self.clock = data.get("clock", 0)
+
+    def get(self, cfg_path: str) -> Optional[Dict[str, Any]]:
+        key = os.path.abspath(cfg_path)
+        ent = self.entries.get(key)
+        st = os.stat(cfg_path)
+        if ent is not None:
+            if ent["mtime_ns"] != st.st_mtime_ns or ent["size"] != st.st_size:
+                # metadata changed: only re-parse if the content really changed
+                self.stats["rehashed"] += 1
+                if ent["size"] != st.st_size or ent["sha1"] != file_digest(cfg_path):
+                    ent = None
+                else:
+                    self.entries[key].update(mtime_ns=st.st_mtime_ns, size=st.st_size)
+        if ent is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        self.clock += 1
+        ent["used"] = self.clock
+        self.dirty = True
+        return ent["device"]
+
+    def put(self, cfg_path: str, device: Dict[str, Any]):
+        st = os.stat(cfg_path)
+        self.clock += 1
+        self.entries[os.path.abspath(cfg_path)] = {
+            "mtime_ns": st.st_mtime_ns,
+            "size": st.st_size,
+            "sha1": file_digest(cfg_path),
+            "used": self.clock,
+            "device": device,
+        }
+        self.dirty = True
+
+    def _evict(self):
+        extra = len(self.entries) - self.max_entries
+        if extra <= 0:
+            return
+        for key in sorted(self.entries, key=lambda k: self.entries[k]["used"])[:extra]:
+            del self.entries[key]
+        self.stats["evicted"] += extra
+
+    def save(self):
+        if not self.dirty:
+            return
+        self._evict()
+        d = os.path.dirname(self.path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"format": CACHE_FORMAT, "parser_version": self.parser_version,
+                       "clock": self.clock, "entries": self.entries}, f)
+        os.replace(tmp, self.path)  # atomic, so an interrupted run never leaves a torn cache
+        self.dirty = False
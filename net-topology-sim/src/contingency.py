@@ -0,0 +1,202 @@
+from __future__ import annotations
+import itertools, os
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Tuple, Optional
+import networkx as nx
+import numpy as np
+from .loadengine import RoutingMatrix, aggregate_demands, route_flows
+from .topology import path_weight
+
+# N-1 / N-2 link-failure analysis on top of the routing matrix.
+# For a failure set F only the flows whose base path crossed F are removed and
+# re-routed on G without F; every other link keeps its base load.
+
+CONTINGENCY_ORDERS = {"N-1": 1, "N-2": 2}
+
+def link_capacity_mbps(G: nx.Graph, u: str, v: str) -> int:
+    return int(G[u][v].get("bandwidth", 0) or 0) // 1000  # kbps->Mbps
+
+def _gather(ptr: np.ndarray, data: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    # concatenation of data[ptr[i]:ptr[i+1]] for every i in ids, without a Python loop
+    starts, ends = ptr[ids], ptr[ids + 1]
+    lens = ends - starts
+    total = int(lens.sum())
+    if not total:
+        return data[:0]
+    offs = np.repeat(starts - np.concatenate(([0], np.cumsum(lens)[:-1])), lens)
+    return data[offs + np.arange(total)]
+
+def _csr(keys: np.ndarray, n: int):
+    order = np.argsort(keys, kind="stable")
+    ptr = np.searchsorted(keys[order], np.arange(n + 1))
+    return ptr, order
+
+@contextmanager
+def _without_edges(G: nx.Graph, edges: List[Tuple[str, str]]):
+    # Hide edges by swapping in filtered neighbor dicts for their endpoints and putting
+    # the originals back afterwards. Same neighbor order as nx.restricted_view (so the
+    # same networkx tie-breaking) without the per-lookup cost of filter views.
+    hidden: Dict[str, set] = {}
+    for u, v in edges:
+        hidden.setdefault(u, set()).add(v)
+        hidden.setdefault(v, set()).add(u)
+    saved = {n: G._adj[n] for n in hidden}
+    for n, gone in hidden.items():
+        G._adj[n] = {k: d for k, d in saved[n].items() if k not in gone}
+    try:
+        yield G
+    finally:
+        G._adj.update(saved)
+
+class ContingencyModel:
+    def __init__(self, G: nx.Graph, flows: List[Tuple[str, str]], demand: List[float], ecmp: bool = False):
+        self.G = G.copy()  # scenarios temporarily edit adjacency, never touch the caller's graph
+        self.flows = flows
+        self.ecmp = ecmp
+        self.weight = path_weight(G)
+        self.rm = RoutingMatrix.build(G, flows, ecmp=ecmp, weight=self.weight)
+        self.index = {e: i for i, e in enumerate(self.rm.edges)}
+        self.demand = np.asarray(demand, dtype=np.float64)
+        self.contrib = self.rm.vals * self.demand[self.rm.cols]
+        E = len(self.rm.edges)
+        self.base = np.bincount(self.rm.rows, weights=self.contrib, minlength=E)
+        self.capacity = np.array([link_capacity_mbps(G, u, v) for u, v in self.rm.edges], dtype=np.float64)
+        # edge -> flows crossing it, flow -> its matrix entries
+        ptr, order = _csr(self.rm.rows, E)
+        self.edge_ptr, self.edge_flows = ptr, self.rm.cols[order]
+        self.flow_ptr, self.flow_entries = _csr(self.rm.cols, len(flows))
+        self.loaded = np.diff(self.edge_ptr) > 0
+
+    def scenario(self, failed: Tuple[int, ...]):
+        # -> (rows whose load changed, their new loads, demand left without a path)
+        failed_arr = np.asarray(failed, dtype=np.int64)
+        affected = np.unique(_gather(self.edge_ptr, self.edge_flows, failed_arr))
+        if not len(affected):
+            return failed_arr, np.zeros(len(failed_arr)), 0.0
+        ent = _gather(self.flow_ptr, self.flow_entries, affected)
+        sub = [self.flows[j] for j in affected]
+        with _without_edges(self.G, [self.rm.edges[i] for i in failed]) as H:
+            rows, cols, vals = route_flows(H, sub, self.index, ecmp=self.ecmp, weight=self.weight)
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = affected[np.asarray(cols, dtype=np.int64)]
+        touched = np.unique(np.concatenate((self.rm.rows[ent], rows, failed_arr)))
+        pos = np.searchsorted(touched, self.rm.rows[ent])
+        delta = np.bincount(pos, weights=-self.contrib[ent], minlength=len(touched))
+        delta += np.bincount(np.searchsorted(touched, rows), weights=np.asarray(vals) * self.demand[cols],
+                             minlength=len(touched))
+        new = np.round(self.base[touched] + delta, 9)  # ECMP fractions leave float noise
+        new[np.searchsorted(touched, failed_arr)] = 0.0
+        routed = np.zeros(len(self.flows), dtype=bool)
+        routed[cols] = True
+        lost = float(self.demand[affected[~routed[affected]]].sum())
+        return touched, new, lost
+
+def _failure_sets(loaded: np.ndarray, order: int, firsts):
+    # firsts are loaded links; a pair only matters if at least one of its links is loaded,
+    # and a pair of two loaded links is generated once (from its smaller index)
+    for i in firsts:
+        if order == 1:
+            yield (i,)
+            continue
+        for j in range(len(loaded)):
+            if j == i or (loaded[j] and j < i):
+                continue
+            yield (i, j) if i < j else (j, i)
+
+class _Worst:
+    def __init__(self, model: ContingencyModel):
+        self.load = model.base.copy()
+        self.failure: List[Optional[Tuple[int, ...]]] = [None] * len(model.base)
+        self.overloads: List[Dict[str, Any]] = []
+
+    def update(self, rows: np.ndarray, loads: np.ndarray, failures):
+        # keep the highest load per link; on equal loads the smallest failure tuple wins,
+        # so the result does not depend on how scenarios were split across workers
+        for i, l, f in zip(rows.tolist(), loads.tolist(), failures):
+            if l > self.load[i] or (self.failure[i] is not None and l == self.load[i] and f < self.failure[i]):
+                self.load[i] = l
+                self.failure[i] = f
+
+    def merge(self, other: "_Worst"):
+        rows = np.nonzero(other.load >= self.load)[0]
+        rows = [i for i in rows.tolist() if other.failure[i] is not None]
+        self.update(np.asarray(rows, dtype=np.int64), other.load[rows], [other.failure[i] for i in rows])
+        self.overloads += other.overloads
+
+def _run_chunk(model: ContingencyModel, order: int, firsts) -> _Worst:
+    worst = _Worst(model)
+    base_over = model.base > model.capacity
+    for failed in _failure_sets(model.loaded, order, firsts):
+        touched, new, lost = model.scenario(failed)
+        cand = (new > worst.load[touched]) | ((new == worst.load[touched]) & (new > model.base[touched]))
+        if cand.any():
+            worst.update(touched[cand], new[cand], [failed] * int(cand.sum()))
+        over = (new > model.capacity[touched]) & ~base_over[touched]
+        if over.any() or lost:
+            worst.overloads.append({"failure": failed, "links": list(zip(touched[over].tolist(), new[over].tolist())),
+                                    "unrouted_mbps": lost})
+    return worst
+
+_MODEL: Optional[ContingencyModel] = None
+
+def _init_worker(G, flows, demand, ecmp):
+    global _MODEL
+    _MODEL = ContingencyModel(G, flows, demand, ecmp)
+
+def _worker_chunk(order: int, firsts):
+    return _run_chunk(_MODEL, order, firsts)
+
+def _result_link(model: ContingencyModel, i: int) -> str:
+    a, b = model.rm.edges[i]
+    return f"{a}-{b}"
+
+def run_contingency(G: nx.Graph, traffic_pairs: List[Tuple[str, str, int]], mode: str = "N-1",
+                    jobs: int = 1, ecmp: bool = False) -> Dict[str, Any]:
+    order = CONTINGENCY_ORDERS[mode]
+    flows, demand = aggregate_demands(traffic_pairs)
+    model = ContingencyModel(G, flows, demand, ecmp)
+    E = len(model.base)
+    firsts = np.nonzero(model.loaded)[0].tolist()
+    L = len(firsts)
+    workers = jobs if jobs > 0 else (os.cpu_count() or 1)
+    if workers == 1 or len(firsts) < 2:
+        worst = _run_chunk(model, order, firsts)
+    else:
+        # several chunks per worker, interleaved so heavy and light links spread evenly
+        chunks = [firsts[k::workers * 4] for k in range(min(len(firsts), workers * 4))]
+        worst = _Worst(model)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(G, flows, demand, ecmp)) as ex:
+            for part in ex.map(_worker_chunk, itertools.repeat(order), chunks):
+                worst.merge(part)
+    worst.overloads.sort(key=lambda o: o["failure"])
+
+    def names(failed):
+        return [_result_link(model, i) for i in failed] if failed else []
+
+    per_link = []
+    for i in range(E):
+        cap = model.capacity[i]
+        load = float(worst.load[i])
+        per_link.append({
+            "link": _result_link(model, i),
+            "base_mbps": float(model.base[i]),
+            "worst_mbps": load,
+            "capacity_mbps": int(cap),
+            "worst_utilization": round(load / cap, 4) if cap else None,
+            "worst_failure": names(worst.failure[i]),
+        })
+    return {
+        "mode": mode,
+        "scenarios": E if order == 1 else E * (E - 1) // 2,
+        # the rest provably leave every load unchanged (only unloaded links fail)
+        "evaluated": len(firsts) if order == 1 else L * (L - 1) // 2 + L * (E - L),
+        "links": per_link,
+        "overloads": [{
+            "failure": names(o["failure"]),
+            "overloaded": [{"link": _result_link(model, i), "load_mbps": l, "capacity_mbps": int(model.capacity[i])}
+                           for i, l in o["links"]],
+            "unrouted_mbps": o["unrouted_mbps"],
+        } for o in worst.overloads],
+    }
@@ -0,0 +1,130 @@
+from __future__ import annotations
+import os, pickle, time
+from typing import Dict, Any, List, Optional
+
+from .parser import find_device_configs, _parse_one, PARSER_VERSION
+from .topology import build_topology, patch_topology, TopologyIndex
+from .store import DeviceStore
+from .validators import ValidationIndex, RULES, run_validation, run_incremental
+
+STATE_FORMAT = 1
+
+class ValidationState:
+    # Everything a validate run derives from the configs: devices, graph, topology and
+    # validation indexes, findings per rule and the stat of every config file. Saved
+    # between runs (validate --state FILE) so the next run only re-parses the files that
+    # changed, patches the graph around them and re-checks what they can affect.
+    def __init__(self, conf_root: str, devices: Dict[str, Any], sources: Dict[str, str],
+                 mode: str = "mesh", options: Optional[Dict[str, Any]] = None, G=None):
+        # sources: config path -> hostname, as filled in by parse_conf_dir; G: the devices'
+        # build_topology graph, if already built
+        self.conf_root = os.path.abspath(conf_root)
+        self.mode = mode
+        self.options = dict(options or {})
+        self.devices = devices
+        self.sources: Dict[str, Dict[str, Any]] = {}  # abs path -> {"mtime_ns", "size", "hostname"}
+        for path, hostname in sources.items():
+            self._record(path, hostname)
+        self.G = G if G is not None else build_topology(devices, mode=mode)
+        self.topo = TopologyIndex(devices)
+        self.index = ValidationIndex(self.G, devices, self.options)
+        self.findings: Dict[str, List[Dict[str, Any]]] = {}
+
+    def _record(self, path: str, hostname: str):
+        st = os.stat(path)
+        self.sources[os.path.abspath(path)] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "hostname": hostname}
+
+    def matches(self, conf_root: str, mode: str, options: Dict[str, Any]) -> bool:
+        return (self.conf_root, self.mode, self.options) == (os.path.abspath(conf_root), mode, dict(options))
+
+    def validate(self, jobs: int = 1) -> Dict[str, Any]:
+        # full run; same result as run_validation
+        res = run_validation(self.G, self.devices, jobs=jobs, index=self.index)
+        pos = 0
+        for r in res["rules"]:
+            self.findings[r["rule"]] = res["issues"][pos:pos + r["findings"]]
+            pos += r["findings"]
+        return res
+
+    def issues(self) -> List[Dict[str, Any]]:
+        return [f for name in RULES for f in self.findings.get(name, ())]
+
+    def scan(self, only: Optional[List[str]] = None,
+             errors: Optional[List[Dict[str, str]]] = None) -> Dict[str, Optional[Dict[str, Any]]]:
+        # -> device -> re-parsed device, or None if its config is gone. Files whose mtime and
+        # size are unchanged are skipped; a touched file that parses to the same device is
+        # not a change. only: look at these devices alone and assume the rest unchanged.
+        if only is None:
+            paths = set(find_device_configs(self.conf_root)) | set(self.sources)
+        else:
+            by_name = {s["hostname"]: p for p, s in self.sources.items()}
+            paths = {by_name.get(n) or os.path.join(self.conf_root, n, "config.dump") for n in only}
+        changes: Dict[str, Optional[Dict[str, Any]]] = {}
+        for path in sorted(paths):
+            old = self.sources.get(path)
+            if not os.path.exists(path):
+                if old is not None:
+                    changes.setdefault(old["hostname"], None)
+                    del self.sources[path]
+                continue
+            st = os.stat(path)
+            if old is not None and (old["mtime_ns"], old["size"]) == (st.st_mtime_ns, st.st_size):
+                continue
+            _, dev, err = _parse_one(path)
+            if err:
+                if errors is None:
+                    raise RuntimeError(f"{path}: {err}")
+                errors.append({"path": path, "error": err})
+                continue
+            if old is not None and old["hostname"] != dev["hostname"]:
+                changes.setdefault(old["hostname"], None)
+            self._record(path, dev["hostname"])
+            if self.devices.get(dev["hostname"]) != dev:
+                changes[dev["hostname"]] = dev
+        return {d: dev for d, dev in changes.items() if dev is not None or d in self.devices}
+
+    def apply(self, changes: Dict[str, Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+        # -> run_incremental's {"added", "resolved", "rules"} plus "patch_seconds" and
+        # "graph_changed": whether G was patched at all (edges re-added, nodes added or removed)
+        t0 = time.perf_counter()
+        ips = set()
+        for d, dev in changes.items():
+            old = self.devices.get(d)
+            for x in (old, dev):
+                if x is not None:
+                    ips |= {i.get("ip", "") for i in x.get("interfaces", [])} - {""}
+            if old is not None:
+                self.index.remove(d, old, forget=dev is None)
+        change = patch_topology(self.G, self.devices, self.topo, changes)
+        for d, dev in changes.items():
+            if dev is not None:
+                self.index.add(d, dev)
+        change["ips"] = ips
+        if isinstance(self.devices, DeviceStore) and self.devices.dead > self.devices.interfaces:
+            self.devices.compact()  # replaced devices' rows; nothing holds views into them now
+        patch_seconds = time.perf_counter() - t0
+        res = run_incremental(self.index, self.findings, change)
+        res["patch_seconds"] = round(patch_seconds, 6)
+        res["graph_changed"] = bool(change["rebuilt"] or change["nodes"])
+        return res
+
+def save_state(state: ValidationState, path: str):
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump({"format": STATE_FORMAT, "parser_version": PARSER_VERSION, "state": state}, f,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)  # atomic, like the parse cache
+
+def load_state(path: str) -> Optional[ValidationState]:
+    # None if missing, unreadable, or written by another state format / parser version
+    try:
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+    if not isinstance(data, dict) or data.get("format") != STATE_FORMAT or data.get("parser_version") != PARSER_VERSION:
+        return None
+    return data["state"]
@@ -0,0 +1,250 @@
+from __future__ import annotations
+import hashlib, heapq, os
+from collections import deque
+from typing import Dict, List, Tuple, Optional
+import networkx as nx
+import numpy as np
+
+Edge = Tuple[str, str]
+
+# A full single-source search costs O(V+E) while a bidirectional point-to-point search
+# usually touches far less of the graph, so sources with only a few flows go pairwise.
+SSSP_MIN_FLOWS = 8
+ROUTING_FORMAT = 1
+ROUTING_CACHE_KEEP = 16
+
+def edge_key(u: str, v: str) -> Edge:
+    return (u, v) if u <= v else (v, u)
+
+def shortest_path_dag(G: nx.Graph, src: str, weight: Optional[str] = None):
+    # One single-source search (BFS, or Dijkstra when weighted) that keeps every
+    # equal-cost predecessor and the number of shortest paths (sigma) to each node.
+    # Returns (dist, sigma, preds); nodes are in dist in non-decreasing distance order.
+    dist = {src: 0}
+    sigma = {src: 1}
+    preds: Dict[str, List[str]] = {src: []}
+    adj = G._adj
+    if weight is None:
+        q = deque([src])
+        while q:
+            v = q.popleft()
+            dv = dist[v] + 1
+            for w in adj[v]:
+                dw = dist.get(w)
+                if dw is None:
+                    dist[w] = dv
+                    sigma[w] = sigma[v]
+                    preds[w] = [v]
+                    q.append(w)
+                elif dw == dv:
+                    sigma[w] += sigma[v]
+                    preds[w].append(v)
+        return dist, sigma, preds
+
+    final: Dict[str, float] = {}
+    seen = {src: 0}
+    heap = [(0, 0, src)]
+    count = 1
+    while heap:
+        d, _, v = heapq.heappop(heap)
+        if v in final:
+            continue
+        final[v] = d
+        for w, attrs in adj[v].items():
+            dw = d + attrs.get(weight, 1)
+            if w in final:
+                continue
+            old = seen.get(w)
+            if old is None or dw < old:
+                seen[w] = dw
+                sigma[w] = sigma[v]
+                preds[w] = [v]
+                heapq.heappush(heap, (dw, count, w))
+                count += 1
+            elif dw == old:
+                sigma[w] += sigma[v]
+                preds[w].append(v)
+    return final, sigma, preds
+
+def _nx_path_edges(G: nx.Graph, src: str, dst: str, weight: Optional[str]) -> List[Tuple[str, str]]:
+    # exactly what nx.shortest_path(G, src, dst, weight) returns, minus its dispatch layer
+    if weight is None:
+        path = nx.bidirectional_shortest_path(G, src, dst)
+    else:
+        path = nx.bidirectional_dijkstra(G, src, dst, weight=weight)[1]
+    return list(zip(path, path[1:]))
+
+def _unique_path_edges(preds, dst: str) -> List[Tuple[str, str]]:
+    hops = []
+    v = dst
+    while preds[v]:
+        p = preds[v][0]
+        hops.append((p, v))
+        v = p
+    return hops
+
+def _ecmp_edges(dist, preds, src: str, dst: str) -> List[Tuple[str, str, float]]:
+    # hop-by-hop equal split, like router ECMP: every node on the shortest-path DAG
+    # towards dst divides what it receives evenly over its next hops
+    on_dag = {dst}
+    stack = [dst]
+    nexthops: Dict[str, List[str]] = {}
+    while stack:
+        v = stack.pop()
+        for p in preds[v]:
+            nexthops.setdefault(p, []).append(v)
+            if p not in on_dag:
+                on_dag.add(p)
+                stack.append(p)
+    share = {v: 0.0 for v in on_dag}
+    share[src] = 1.0
+    out = []
+    for v in sorted(on_dag, key=dist.__getitem__):
+        if v == dst:
+            continue
+        nh = nexthops[v]
+        part = share[v] / len(nh)
+        for w in nh:
+            share[w] += part
+            out.append((v, w, part))
+    return out
+
+def route_flows(G: nx.Graph, flows: List[Tuple[str, str]], index: Dict[Edge, int],
+                ecmp: bool = False, weight: Optional[str] = None):
+    # COO entries (edge row, flow column, fraction) for routing `flows` over G;
+    # `index` maps edge_key -> row and may cover more edges than G (e.g. a failure view)
+    rows: List[int] = []
+    cols: List[int] = []
+    vals: List[float] = []
+    by_src: Dict[str, List[int]] = {}
+    for j, (src, dst) in enumerate(flows):
+        if src in G and dst in G:
+            by_src.setdefault(src, []).append(j)
+
+    for src, js in by_src.items():
+        if not ecmp and len(js) < SSSP_MIN_FLOWS:
+            for j in js:
+                try:
+                    hops = _nx_path_edges(G, src, flows[j][1], weight)
+                except nx.NetworkXNoPath:
+                    continue
+                for u, v in hops:
+                    rows.append(index[edge_key(u, v)])
+                    cols.append(j)
+                    vals.append(1.0)
+            continue
+        dist, sigma, preds = shortest_path_dag(G, src, weight)
+        for j in js:
+            dst = flows[j][1]
+            if dst not in dist:
+                continue
+            if ecmp:
+                for u, v, part in _ecmp_edges(dist, preds, src, dst):
+                    rows.append(index[edge_key(u, v)])
+                    cols.append(j)
+                    vals.append(part)
+                continue
+            if sigma[dst] == 1:
+                hops = _unique_path_edges(preds, dst)
+            else:
+                # several equal-cost paths: let networkx pick, so results stay
+                # identical to the per-pair nx.shortest_path implementation
+                hops = _nx_path_edges(G, src, dst, weight)
+            for u, v in hops:
+                rows.append(index[edge_key(u, v)])
+                cols.append(j)
+                vals.append(1.0)
+    return rows, cols, vals
+
+class RoutingMatrix:
+    # Sparse edge x flow routing matrix in COO form: flow j puts vals[k] of its demand
+    # on edge rows[k]. Routing is computed once; any demand vector is then a bincount.
+    def __init__(self, edges: List[Edge], flows: List[Tuple[str, str]], rows, cols, vals):
+        self.edges = edges
+        self.flows = flows
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.cols = np.asarray(cols, dtype=np.int64)
+        self.vals = np.asarray(vals, dtype=np.float64)
+
+    @classmethod
+    def build(cls, G: nx.Graph, flows: List[Tuple[str, str]], ecmp: bool = False,
+              weight: Optional[str] = None) -> "RoutingMatrix":
+        edges = [edge_key(u, v) for u, v in G.edges()]
+        index = {e: i for i, e in enumerate(edges)}
+        rows, cols, vals = route_flows(G, flows, index, ecmp=ecmp, weight=weight)
+        return cls(edges, flows, rows, cols, vals)
+
+    def loads(self, demand) -> np.ndarray:
+        demand = np.asarray(demand, dtype=np.float64)
+        return np.bincount(self.rows, weights=self.vals * demand[self.cols], minlength=len(self.edges))
+
+    def loads_many(self, demands, edges: Optional[np.ndarray] = None) -> np.ndarray:
+        # scenarios x flows demand -> scenarios x edges loads (only the `edges` rows, if given),
+        # the routing matrix applied to every demand vector. One bincount per contiguous demand
+        # row: without a sparse BLAS this beats one gathered product over all scenarios.
+        D = np.asarray(demands, dtype=np.float64)
+        out = np.empty((len(D), len(self.edges) if edges is None else len(edges)))
+        for s, d in enumerate(D):
+            loads = np.bincount(self.rows, weights=self.vals * d[self.cols], minlength=len(self.edges))
+            out[s] = loads if edges is None else loads[edges]
+        return out
+
+    def save(self, path: str):
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, format=np.array([ROUTING_FORMAT]), rows=self.rows, cols=self.cols, vals=self.vals)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, G: nx.Graph, flows: List[Tuple[str, str]]) -> Optional["RoutingMatrix"]:
+        # a matrix saved for this G and these flows (the file name says so), or None
+        try:
+            with np.load(path) as z:
+                if int(z["format"][0]) != ROUTING_FORMAT:
+                    return None
+                rows, cols, vals = z["rows"], z["cols"], z["vals"]
+        except (OSError, KeyError, ValueError):
+            return None
+        return cls([edge_key(u, v) for u, v in G.edges()], flows, rows, cols, vals)
+
+def topology_digest(G: nx.Graph, weight: Optional[str] = None) -> str:
+    # routing depends on the adjacency in iteration order (tie-breaks) and the weights
+    h = hashlib.sha256(f"{G.graph.get('mode')}\0{weight}\0".encode())
+    for n, nbrs in G._adj.items():
+        if weight is None:
+            h.update(("\0".join((n, *nbrs)) + "\n").encode())
+        else:
+            h.update(("\0".join([n] + [f"{m}\1{a.get(weight, 1)}" for m, a in nbrs.items()]) + "\n").encode())
+    return h.hexdigest()[:24]
+
+def cached_routing(G: nx.Graph, flows: List[Tuple[str, str]], ecmp: bool = False, weight: Optional[str] = None,
+                   cache_dir: Optional[str] = None, keep: int = ROUTING_CACHE_KEEP) -> Tuple[RoutingMatrix, bool]:
+    # -> (RoutingMatrix.build(G, flows, ecmp, weight), whether it came from cache_dir). Files are
+    # keyed by topology digest, flows and mode; the `keep` most recently used are kept.
+    if not cache_dir:
+        return RoutingMatrix.build(G, flows, ecmp=ecmp, weight=weight), False
+    fh = hashlib.sha256("\n".join(f"{s}\0{d}" for s, d in flows).encode()).hexdigest()[:16]
+    path = os.path.join(cache_dir, f"{topology_digest(G, weight)}-{fh}-{'ecmp' if ecmp else 'sp'}.npz")
+    rm = RoutingMatrix.load(path, G, flows) if os.path.exists(path) else None
+    if rm is not None:
+        os.utime(path)
+        return rm, True
+    rm = RoutingMatrix.build(G, flows, ecmp=ecmp, weight=weight)
+    os.makedirs(cache_dir, exist_ok=True)
+    rm.save(path)
+    old = sorted((e for e in os.scandir(cache_dir) if e.name.endswith(".npz")), key=lambda e: e.stat().st_mtime)
+    for e in old[:-keep] if keep else ():
+        os.unlink(e.path)
+    return rm, False
+
+def aggregate_demands(traffic_pairs: List[Tuple[str, str, float]]):
+    # collapse repeated (src, dst) pairs; flows keep first-seen order
+    index: Dict[Tuple[str, str], int] = {}
+    demand: List[float] = []
+    for src, dst, d in traffic_pairs:
+        j = index.get((src, dst))
+        if j is None:
+            index[(src, dst)] = len(demand)
+            demand.append(d)
+        else:
+            demand[j] += d
+    return list(index), demand
@@ -1,59 +1,319 @@
 from __future__ import annotations
-import argparse, json, os, time
+import argparse, json, os, signal, threading, time
 from typing import List, Tuple
 from rich import print as rprint
 import networkx as nx
 
-from .parser import parse_conf_dir
-from .topology import build_topology, compute_link_loads
-from .validators import validate_all
-from .simulator.core import Simulation
+from .parser import iter_conf_dir, PARSER_VERSION
+from .cache import ParseCache
+from .topology import build_topology, compute_link_loads, compute_class_loads, TOPOLOGY_MODES
+from .validators import run_validation, LOOP_MODES, LOOP_SCOPES, MAX_SAMPLE_CYCLES
+from .ndjson import NDJSONWriter, REPORT_FORMATS, JSON_BACKEND, report_format, write_report
+from .incremental import ValidationState, load_state, save_state
+from .contingency import run_contingency, CONTINGENCY_ORDERS
+from .profiling import Profiler
+from .traffic import read_series, read_traffic, traffic_format, TRAFFIC_FORMATS, MEASURES
+from .scenarios import evaluate_scenarios, DEFAULT_ROUTING_CACHE
+from .service import TopologyService, DEFAULT_HTTP, http_server, unix_server
+from .store import DeviceStore, STORE_KINDS
+from .snapshot import Snapshot, SnapshotCache, load_snapshot, write_snapshot, DEFAULT_SNAPSHOT, STALE_MODES
+from .simulator.core import Simulation, LINK_DELAY, LINK_DEPTH
+from .simulator.des import DESSimulation, save_checkpoint, read_checkpoint, replay_checkpoint
+from .simulator.sharded import ShardedSimulation
+from .simulator.ospf import OSPF_START_MODES
+from .simulator.logsink import LogOptions, LOG_FORMATS, parse_sample
+
+def _open_cache(args):
+    return ParseCache(args.cache, PARSER_VERSION, max_entries=args.cache_max) if args.cache else None
+
+def _load_devices(args, sources=None, cache=None):
+    if getattr(args, "snap", None) is not None:
+        return _load_snapshot(args, args.snap, sources)
+    errors = []
+    cache = cache or _open_cache(args)
+    with args.prof.stage("parse"):
+        parsed = iter_conf_dir(args.conf, jobs=args.jobs, errors=errors, cache=cache, sources=sources)
+        devices = DeviceStore(parsed) if _columnar(args) else dict(parsed)
+    _parse_summary(errors, cache)
+    return devices
+
+def _columnar(args) -> bool:
+    return getattr(args, "store", "dicts") == "columnar"
+
+def _load_snapshot(args, snap: Snapshot, sources=None):
+    # devices from a build snapshot; the graph too (see _build) when --topology matches it
+    with args.prof.stage("check-snapshot"):
+        stale = snap.stale(args.conf)
+    if stale:
+        summary = ", ".join(f"{len(v)} {k}" for k, v in stale.items())
+        if args.snapshot_stale == "error":
+            raise SystemExit(f"snapshot {args.snapshot} is stale ({summary} configs); run build again")
+        if args.snapshot_stale == "rebuild":
+            rprint(f"[yellow]snapshot is stale[/yellow] ({summary} configs), rebuilding it")
+            src = {}
+            cache = SnapshotCache(snap)
+            args.snap = None
+            devices = _load_devices(args, src, cache)
+            with args.prof.stage("build"):
+                G = build_topology(devices, mode=snap.mode)
+            with args.prof.stage("write-snapshot"):
+                write_snapshot(args.snapshot, args.conf, devices, G, src)
+            if sources is not None:
+                sources.update(src)
+            args.snapshot_graph = (lambda: G) if snap.mode == getattr(args, "topology", None) else None
+            return devices
+        rprint(f"[yellow]snapshot is stale[/yellow] ({summary} configs), using it anyway")
+    with args.prof.stage("load-snapshot"):
+        devices = snap.store() if _columnar(args) else snap.devices()
+        if sources is not None:
+            sources.update(snap.sources())
+    args.snapshot_graph = snap.graph if snap.mode == getattr(args, "topology", None) else None
+    return devices
+
+def _load_graph(args):
+    # for commands that only need the graph: from a snapshot of the same --topology mode
+    # it is read directly, without the device dicts
+    snap = args.snap
+    if snap is not None and snap.mode == args.topology:
+        with args.prof.stage("check-snapshot"):
+            stale = snap.stale(args.conf)
+        if not stale:
+            with args.prof.stage("build"):
+                return snap.graph()
+        # stale: _load_snapshot rebuilds, stops or goes on as --snapshot-stale says
+    return _build(args, _load_devices(args))
+
+def _build(args, devices):
+    with args.prof.stage("build"):
+        graph = getattr(args, "snapshot_graph", None)
+        return graph() if graph is not None else build_topology(devices, mode=args.topology)
+
+def _record_rules(prof, res):
+    # run_validation times the index and every rule itself
+    if "index_seconds" in res:
+        prof.record("validate.index", res["index_seconds"])
+    for r in res["rules"]:
+        prof.record(f"validate.{r['rule']}", r["seconds"], findings=r["findings"])
+
+def _parse_summary(errors, cache):
+    for e in errors:
+        rprint(f"[red]Failed to parse[/red] {e['path']}: {e['error']}")
+    if isinstance(cache, SnapshotCache):
+        rprint(f"[dim]{cache.stats['hits']} devices from the snapshot, {cache.stats['misses']} parsed[/dim]")
+    elif cache is not None:
+        st = cache.stats
+        rprint(f"[dim]parse cache: {st['hits']} hits, {st['misses']} misses, "
+               f"{st['invalidated']} invalidated, {st['evicted']} evicted[/dim]")
 
 def cmd_parse(args):
-    devices = parse_conf_dir(args.conf)
+    ndjson = report_format(args.out, args.format) == "ndjson"
+    if ndjson and args.snap is None:
+        # one device per line as it is parsed; nothing accumulates in memory
+        errors = []
+        cache = _open_cache(args)
+        with args.prof.stage("parse"), NDJSONWriter(args.out) as w:  # parse and write interleave
+            for _, dev in iter_conf_dir(args.conf, jobs=args.jobs, errors=errors, cache=cache):
+                w.write("device", dev)
+        _parse_summary(errors, cache)
+        rprint(f"[green]Parsed {w.records} devices. Wrote[/green] {args.out} [dim]({JSON_BACKEND})[/dim]")
+        return
+    devices = _load_devices(args)
+    if ndjson:
+        with args.prof.stage("write"), NDJSONWriter(args.out) as w:
+            w.write_many("device", devices.values())
+        rprint(f"[green]Parsed {len(devices)} devices. Wrote[/green] {args.out} [dim]({JSON_BACKEND})[/dim]")
+        return
     os.makedirs(os.path.dirname(args.out), exist_ok=True)
-    with open(args.out, "w") as f:
+    with args.prof.stage("write"), open(args.out, "w") as f:
         json.dump(devices, f, indent=2)
     rprint(f"[green]Parsed {len(devices)} devices. Wrote[/green] {args.out}")
 
+def cmd_build(args):
+    # unchanged configs are taken from the snapshot already at --out, if any
+    sources = {}
+    prev = load_snapshot(args.out) if not args.cache else None
+    cache = SnapshotCache(prev) if prev is not None else None
+    devices = _load_devices(args, sources, cache)
+    G = _build(args, devices)
+    with args.prof.stage("write"):
+        meta = write_snapshot(args.out, args.conf, devices, G, sources)
+    rprint(f"[green]Snapshot of {meta['devices']} devices, {meta['nodes']} nodes, {meta['edges']} links "
+           f"({meta['mode']}). Wrote[/green] {args.out}")
+
+def _validate_incremental(args, options):
+    # -> (report, state) from the saved state, or (None, None) when a full run is needed
+    state = load_state(args.state)
+    if state is None or not state.matches(args.conf, args.topology, options):
+        if args.changed:
+            raise SystemExit(f"--changed needs a usable state in {args.state}; run once without it")
+        rprint(f"[dim]no matching state in {args.state}, running a full validation[/dim]")
+        return None, None
+    errors = []
+    with args.prof.stage("parse"):
+        changes = state.scan(only=args.changed or None, errors=errors)
+    for e in errors:
+        rprint(f"[red]Failed to parse[/red] {e['path']}: {e['error']} (keeping the previous version)")
+    with args.prof.stage("validate"):
+        res = state.apply(changes)
+    args.prof.record("validate.patch", res["patch_seconds"])
+    _record_rules(args.prof, res)
+    rprint(f"incremental: {len(changes)} changed devices, [red]+{len(res['added'])}[/red] / "
+           f"[green]-{len(res['resolved'])}[/green] findings (graph patch {res['patch_seconds'] * 1000:.1f}ms)")
+    return {"issues": state.issues(), "added": res["added"], "resolved": res["resolved"],
+            "changed_devices": sorted(changes), "rules": res["rules"],
+            "patch_seconds": res["patch_seconds"]}, state
+
+def _loop_options(args):
+    return {"loops": args.loops, "loop_scope": args.loop_scope, "max_cycles": args.max_cycles}
+
 def cmd_validate(args):
-    devices = parse_conf_dir(args.conf)
-    G = build_topology(devices)
-    issues = validate_all(G, devices)
-    os.makedirs(os.path.dirname(args.out), exist_ok=True)
-    with open(args.out, "w") as f:
-        json.dump({"issues": issues}, f, indent=2)
-    rprint(f"[yellow]{len(issues)}[/yellow] findings written to {args.out}")
-    for i in issues[:10]:
+    options = _loop_options(args)
+    if args.changed and not args.state:
+        raise SystemExit("--changed requires --state")
+    ndjson = report_format(args.out, args.format) == "ndjson"
+    if args.state:
+        with args.prof.stage("load-state"):
+            report, state = _validate_incremental(args, options)
+    else:
+        report, state = None, None
+    shown, streamed = [], False
+    if report is None:
+        sources = {}
+        devices = _load_devices(args, sources)
+        if args.state:
+            G = _build(args, devices)
+            with args.prof.stage("index"):
+                state = ValidationState(args.conf, devices, sources, mode=args.topology, options=options, G=G)
+            with args.prof.stage("validate"):
+                res = state.validate(jobs=args.jobs)
+        elif ndjson:
+            # findings go to the file rule by rule instead of being collected
+            G = _build(args, devices)
+            with args.prof.stage("validate"), NDJSONWriter(args.out) as w:
+                def emit(rule, found):
+                    w.write_many("finding", found)
+                    shown.extend(found[:10 - len(shown)])
+                res = run_validation(G, devices, jobs=args.jobs, options=options, on_findings=emit)
+                write_report(w, {"rules": res["rules"], "index_seconds": res["index_seconds"]}, "validate")
+            streamed = True
+        else:
+            G = _build(args, devices)
+            with args.prof.stage("validate"):
+                res = run_validation(G, devices, jobs=args.jobs, options=options)
+        _record_rules(args.prof, res)
+        report = {"issues": res["issues"], "rules": res["rules"], "index_seconds": res["index_seconds"]}
+        rprint("[dim]" + ", ".join(f"{r['rule']} {r['findings']} in {r['seconds'] * 1000:.1f}ms" for r in res["rules"])
+               + f" (index {res['index_seconds'] * 1000:.1f}ms)[/dim]")
+    if state is not None:
+        with args.prof.stage("save-state"):
+            save_state(state, args.state)
+    if not streamed:
+        shown = (report["added"] if "added" in report else report["issues"])[:10]
+        if ndjson:
+            with args.prof.stage("write"), NDJSONWriter(args.out) as w:
+                write_report(w, report, "validate-incremental" if "added" in report else "validate")
+        else:
+            os.makedirs(os.path.dirname(args.out), exist_ok=True)
+            with args.prof.stage("write"), open(args.out, "w") as f:
+                json.dump(report, f, indent=2)
+    rprint(f"[yellow]{sum(r['findings'] for r in report['rules'])}[/yellow] findings written to {args.out}")
+    for i in shown:
         rprint(i)
 
-def _load_traffic(path: str) -> List[Tuple[str,str,int]]:
-    data = json.load(open(path))
-    use_peak = data.get("assumptions",{}).get("use_peak", True)
-    eps = data.get("endpoints", [])
-    # naive: pair endpoints by order
-    pairs: List[Tuple[str,str,int]] = []
-    if len(eps) >= 2:
-        for i in range(0, len(eps), 2):
-            if i+1 < len(eps):
-                a, b = eps[i], eps[i+1]
-                demand = int((a.get("peak_mbps") if use_peak else a.get("avg_mbps", 0)) or 0)
-                pairs.append((a["device"], b["device"], demand))
-    return pairs
+def _read_traffic(args):
+    errors = []
+    with args.prof.stage("traffic"):
+        tm = read_traffic(args.traffic, args.traffic_format, errors=errors)
+    for e in errors:
+        rprint(f"[red]Skipped flow record[/red] {args.traffic}:{e['row']}: {e['error']}")
+    if tm.skipped > len(errors):
+        rprint(f"[red]... and {tm.skipped - len(errors)} more malformed records[/red]")
+    if traffic_format(args.traffic, args.traffic_format) != "json":
+        rprint(f"[dim]{tm.rows} flow records -> {len({k[:2] for k in tm.sums})} device pairs, "
+               f"{len(tm.classes())} classes ({tm.measure(args.demand)})[/dim]")
+    return tm
+
+def _growth(text: str) -> List[float]:
+    try:
+        growth = [float(x) for x in text.split(",") if x.strip()]
+    except ValueError:
+        growth = []
+    if not growth or min(growth) < 0:
+        raise SystemExit(f"--growth takes comma-separated multipliers like 1,1.1,1.25, not {text!r}")
+    return growth
+
+def _plan_scenarios(args, G):
+    # --series / --growth: every interval at every multiplier, over one routing
+    if args.contingency or args.per_class:
+        raise SystemExit("--contingency and --per-class evaluate one demand set; drop --series/--growth")
+    growth = _growth(args.growth) if args.growth else [1.0]
+    try:
+        percentiles = [float(x) for x in args.percentiles.split(",")]
+    except ValueError:
+        raise SystemExit(f"--percentiles takes comma-separated numbers, not {args.percentiles!r}")
+    errors = []
+    with args.prof.stage("traffic"):
+        series = read_series(args.traffic, args.traffic_format, args.demand, args.traffic_class or None,
+                             errors=errors, by_time=args.series)
+    for e in errors:
+        rprint(f"[red]Skipped flow record[/red] {args.traffic}:{e['row']}: {e['error']}")
+    with args.prof.stage("scenarios"):
+        report, loads = evaluate_scenarios(G, series, growth, ecmp=args.ecmp, percentiles=percentiles,
+                                           cache_dir=args.routing_cache or None)
+    rprint(f"{report['scenarios']} scenarios ({report['intervals']} intervals x {len(growth)} growth) over "
+           f"{report['flows']} flows: routing {report['routing_seconds']:.2f}s"
+           + (" (cached)" if report["routing_cached"] else "")
+           + f", evaluation {report['evaluate_seconds']:.2f}s; "
+           f"[yellow]{report['overloaded_scenarios']}[/yellow] scenarios overload a link")
+    return report, loads
 
 def cmd_plan_load(args):
-    devices = parse_conf_dir(args.conf)
-    G = build_topology(devices)
-    pairs = _load_traffic(args.traffic)
-    loads = compute_link_loads(G, pairs)
+    G = _load_graph(args)
+    if args.series or args.growth:
+        report, loads = _plan_scenarios(args, G)
+        with args.prof.stage("write"):
+            _write_load_plan(args, G, loads, None, scenarios=report)
+        rprint(f"Wrote load plan to {args.out} (link loads: peak over all scenarios)")
+        return
+    tm = _read_traffic(args)
+    classes = args.traffic_class or None
+    pairs = tm.pairs(args.demand, classes)
+    class_loads = None
+    with args.prof.stage("routing"):
+        if args.per_class:
+            # one routing for every class; the totals are their sum
+            class_loads = compute_class_loads(G, tm.by_class(args.demand, classes), ecmp=args.ecmp)
+            loads = {}
+            for cl in class_loads.values():
+                for e, load in cl.items():
+                    loads[e] = loads.get(e, 0) + load
+        else:
+            loads = compute_link_loads(G, pairs, ecmp=args.ecmp)
+    contingency = None
+    if args.contingency:
+        with args.prof.stage("contingency"):
+            contingency = run_contingency(G, pairs, mode=args.contingency, jobs=args.jobs, ecmp=args.ecmp)
+        rprint(f"{args.contingency}: [yellow]{len(contingency['overloads'])}[/yellow] failure scenarios "
+               "cause new overloads or unrouted demand")
+    with args.prof.stage("write"):
+        _write_load_plan(args, G, loads, contingency, class_loads)
+    rprint(f"Wrote load plan to {args.out}")
+
+def _write_load_plan(args, G, loads, contingency, class_loads=None, scenarios=None):
+    w = NDJSONWriter(args.out) if report_format(args.out, args.format) == "ndjson" else None
 
     # summarize and recommend
     recs = []
+    link_loads = {}
     for u,v in G.edges():
         e = tuple(sorted((u,v)))
         bw = int(G[u][v].get("bandwidth", 0) or 0) // 1000  # kbps->Mbps if needed
         load = loads.get(e, 0)
         status = "OK" if load <= bw else "OVERLOADED"
+        if w is not None:
+            w.write("link", {"a": u, "b": v, "load_mbps": load})
+        else:
+            link_loads[f"{u}-{v}"] = load
         if load > bw:
             recs.append({
                 "type":"load_balance_recommendation",
@@ -61,90 +321,439 @@ def cmd_plan_load(args):
                 "reason": f"Demand {load} Mbps > capacity {bw} Mbps",
                 "suggestion": "Use secondary path / shift lower-priority flows"
             })
-    out = {"link_loads_mbps": {f"{a}-{b}": loads.get(tuple(sorted((a,b))),0) for a,b in G.edges()}, "recommendations": recs}
-    os.makedirs(os.path.dirname(args.out), exist_ok=True)
-    json.dump(out, open(args.out,"w"), indent=2)
-    rprint(f"Wrote load plan to {args.out}")
+    out = {"link_loads_mbps": link_loads, "recommendations": recs}
+    if class_loads is not None:
+        # per class, only the links that class loads
+        out["class_loads_mbps"] = {}
+        for cls, cl in class_loads.items():
+            row = {}
+            for u, v in G.edges():
+                load = cl.get(tuple(sorted((u, v))), 0)
+                if load:
+                    if w is not None:
+                        w.write("class_link", {"class": cls, "a": u, "b": v, "load_mbps": load})
+                    else:
+                        row[f"{u}-{v}"] = load
+            out["class_loads_mbps"][cls] = row
+    if contingency is not None:
+        out["contingency"] = contingency
+    if scenarios is not None:
+        out["scenarios"] = scenarios
+    if w is not None:
+        del out["link_loads_mbps"]
+        out.pop("class_loads_mbps", None)
+        with w:
+            write_report(w, out, "plan-load")
+    else:
+        os.makedirs(os.path.dirname(args.out), exist_ok=True)
+        json.dump(out, open(args.out,"w"), indent=2)
+
+def cmd_serve(args):
+    options = _loop_options(args)
+    state = None
+    if args.state:
+        with args.prof.stage("load-state"):
+            state = load_state(args.state)
+        if state is not None and not state.matches(args.conf, args.topology, options):
+            rprint(f"[dim]state in {args.state} is for other options, loading the configs[/dim]")
+            state = None
+    if state is None:
+        sources = {}
+        devices = _load_devices(args, sources)
+        G = _build(args, devices)
+        with args.prof.stage("index"):
+            state = ValidationState(args.conf, devices, sources, mode=args.topology, options=options, G=G)
+        with args.prof.stage("validate"):
+            _record_rules(args.prof, state.validate(jobs=args.jobs))
+    traffic = _read_traffic(args).pairs(args.demand, args.traffic_class or None) if args.traffic else None
+    service = TopologyService(state, traffic=traffic, cache_size=args.query_cache)
+    with args.prof.stage("refresh"):
+        res = service.refresh()  # configs changed since the state was saved
+    if res["changed_devices"]:
+        rprint(f"{len(res['changed_devices'])} configs changed since {args.state} was saved")
+
+    servers = []
+    try:
+        if args.http or not args.socket:
+            servers.append((http_server(service, args.http or DEFAULT_HTTP), f"http://{args.http or DEFAULT_HTTP}/"))
+        if args.socket:
+            servers.append((unix_server(service, args.socket), f"unix:{args.socket}"))
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"cannot listen: {e}")
+    for srv, _ in servers:
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+
+    def changed(res):
+        for e in res["errors"]:
+            rprint(f"[red]Failed to parse[/red] {e['path']}: {e['error']} (keeping the previous version)")
+        if res["changed_devices"]:
+            rprint(f"{len(res['changed_devices'])} changed devices, [red]+{res['added']}[/red] / "
+                   f"[green]-{res['resolved']}[/green] findings in {res['seconds'] * 1000:.0f}ms "
+                   f"(version {res['version']})")
+    if args.watch_interval > 0:
+        service.watch(args.watch_interval, on_change=changed)
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    G = state.G
+    rprint(f"[green]Serving {len(state.devices)} devices, {G.number_of_edges()} links[/green] on "
+           + ", ".join(url for _, url in servers)
+           + (f"; watching {args.conf} every {args.watch_interval:g}s" if args.watch_interval > 0 else ""))
+    try:
+        stop.wait()
+    except KeyboardInterrupt:
+        pass
+    service.close()
+    for srv, _ in servers:
+        srv.shutdown()
+        srv.server_close()
+    if args.socket and os.path.exists(args.socket):
+        os.unlink(args.socket)
+    if args.state:
+        with args.prof.stage("save-state"), service.lock:
+            save_state(state, args.state)
+    rprint(f"stopped after {service.queries} queries")
+
+def _log_options(args) -> LogOptions:
+    try:
+        return LogOptions(fmt=args.log_format, quiet=args.quiet, sample=parse_sample(args.log_sample),
+                          ring=args.log_ring)
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+def _make_sim(G, args):
+    log = _log_options(args)
+    full_spf = args.spf == "full"
+    if args.metrics and args.engine != "threads":
+        raise SystemExit("--metrics needs --engine threads (queues and rates are in real time)")
+    if args.engine == "des":
+        return DESSimulation(G, logs_dir="./outputs/reports", seed=args.seed, log=log,
+                             link_delay=(args.link_delay or 0.0) / 1000.0, ospf=args.ospf, full_spf=full_spf)
+    if args.engine == "sharded":
+        if args.ospf:
+            raise SystemExit("--ospf is not supported with --engine sharded")
+        return ShardedSimulation(G, logs_dir="./outputs/reports", workers=args.workers or (os.cpu_count() or 1),
+                                 seed=args.seed, log=log)
+    delay = LINK_DELAY if args.link_delay is None else args.link_delay / 1000.0
+    return Simulation(G, logs_dir="./outputs/reports", log=log, link_delay=delay,
+                      link_depth=args.link_depth, ospf=args.ospf, full_spf=full_spf,
+                      metrics_interval=args.metrics_interval if args.metrics else 0.0, metrics_path=args.metrics)
+
+def _stop_sim(sim, args):
+    if args.checkpoint:
+        with args.prof.stage("checkpoint"):
+            save_checkpoint(sim, args.checkpoint)
+        rprint(f"checkpoint at {sim.now:.3f}s (virtual), {sim.events} events, digest {sim.digest()}: "
+               f"wrote {args.checkpoint}")
+    with args.prof.stage("stop"):
+        sim.stop()
+    if args.metrics:
+        sim.metrics_sampler.write()
+        m = sim.metrics(per_node=False)
+        d = m["inbox_depth"]
+        rprint(f"{m['messages_handled']} messages handled ({m['messages_per_sec']:.0f}/s), "
+               f"[{'red' if m['dropped'] else 'green'}]{m['dropped']} dropped[/], inbox depth "
+               f"p50 {d['p50']} p99 {d['p99']} max {d['max']}"
+               + "".join(f", {p['kind']} reached all nodes in {p['latency_ms']:.1f} ms"
+                         for p in m["pause_resume"] if p["latency_ms"] is not None)
+               + f"; wrote {args.metrics}")
+    counters = getattr(sim, "link_counters", None)
+    if counters:
+        path = "./outputs/reports/link_stats.json"
+        json.dump(counters, open(path, "w"), indent=2)
+        dropped = sum(c["dropped"] for c in counters)
+        worst = max(counters, key=lambda c: c["max_depth"])
+        rprint(f"{len(counters)} link directions, {sum(c['delivered'] for c in counters)} delivered, "
+               f"[{'red' if dropped else 'green'}]{dropped} dropped[/], max queue {worst['max_depth']} "
+               f"({worst['src']}->{worst['dst']}); wrote {path}")
+    if getattr(sim, "ospf_routers", None):
+        path = "./outputs/reports/ospf.json"
+        rep = sim.ospf_report()
+        json.dump(rep, open(path, "w"), indent=2)
+        conv = rep["converged_after_s"]
+        rprint(f"OSPF: {rep['routers']} routers, SPF CPU {rep['spf_cpu_ms']:.1f} ms total, "
+               + ("no link change" if rep["event_time"] is None
+                  else f"converged {conv * 1000:.1f} ms after the last link change" if conv is not None
+                  else "no routing change after the last link change")
+               + f"; wrote {path}")
+
+def _start_sim(args):
+    if (args.checkpoint or args.restore) and args.engine != "des":
+        raise SystemExit("--checkpoint/--restore need --engine des (the other engines run in real time "
+                         "or across processes)")
+    if args.restore:
+        # graph, seed and engine options come from the checkpoint
+        with args.prof.stage("restore"):
+            try:
+                with open(args.restore, "rb") as f:
+                    sim = DESSimulation.restore(f.read(), "./outputs/reports", log=_log_options(args))
+            except (OSError, ValueError) as e:
+                raise SystemExit(f"cannot restore {args.restore}: {e}")
+        rprint(f"restored {args.restore} at {sim.now:.3f}s (virtual), {len(sim.nodes)} nodes")
+        return sim
+    G = _load_graph(args)
+    with args.prof.stage("setup"):
+        sim = _make_sim(G, args)
+        sim.start()
+    return sim
 
 def cmd_simulate(args):
-    devices = parse_conf_dir(args.conf)
-    G = build_topology(devices)
-    sim = Simulation(G, logs_dir="./outputs/reports")
-    sim.start()
-    time.sleep(args.seconds)
-    sim.stop()
+    sim = _start_sim(args)
+    with args.prof.stage("simulate"):
+        sim.run_for(args.seconds)
+    _stop_sim(sim, args)
 
 def cmd_fail_link(args):
-    devices = parse_conf_dir(args.conf)
-    G = build_topology(devices)
-    sim = Simulation(G, logs_dir="./outputs/reports")
-    sim.start()
-    time.sleep(1.0)
-    ok = sim.fail_link(args.a, args.b, down=True)
-    if ok:
-        from rich import print as rprint
-        rprint(f"[red]Link {args.a}<->{args.b} DOWN[/red]")
-    time.sleep(args.seconds)
-    sim.stop()
+    sim = _start_sim(args)
+    with args.prof.stage("simulate"):
+        if not args.restore:
+            sim.run_for(1.0)  # warm-up; a checkpoint is already past it
+        ok = sim.fail_link(args.a, args.b, down=True)
+        if ok:
+            from rich import print as rprint
+            rprint(f"[red]Link {args.a}<->{args.b} DOWN[/red]")
+        sim.run_for(args.seconds)
+    _stop_sim(sim, args)
 
 def cmd_pause_resume(args):
-    devices = parse_conf_dir(args.conf)
-    G = build_topology(devices)
-    sim = Simulation(G, logs_dir="./outputs/reports")
-    sim.start()
-    time.sleep(args.seconds // 2)
-    sim.pause()
-    from rich import print as rprint
-    rprint("[yellow]PAUSED[/yellow]")
-    time.sleep(2)
-    sim.resume()
-    rprint("[green]RESUMED[/green]")
-    time.sleep(args.seconds // 2)
-    sim.stop()
+    sim = _start_sim(args)
+    with args.prof.stage("simulate"):
+        sim.run_for(args.seconds // 2)
+        sim.pause()
+        from rich import print as rprint
+        rprint("[yellow]PAUSED[/yellow]")
+        sim.run_for(2)
+        sim.resume()
+        rprint("[green]RESUMED[/green]")
+        sim.run_for(args.seconds // 2)
+    _stop_sim(sim, args)
+
+def cmd_replay(args):
+    # run a checkpointed simulation again from a cold start and check it ends in the same state
+    try:
+        ck = read_checkpoint(args.checkpoint)
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"cannot read {args.checkpoint}: {e}")
+    old = ck["sim"]
+    if old.journal is None:
+        raise SystemExit(f"{args.checkpoint} has no journal to replay")
+    with args.prof.stage("replay"):
+        sim = replay_checkpoint(ck)
+    digest = sim.digest()
+    same = digest == ck["digest"]
+    rprint(f"replayed {len(old.journal)} actions to {old.now:.3f}s (virtual), {sim.events} events: digest {digest} "
+           + ("[green]matches[/green] the checkpoint" if same else f"[red]differs[/red] from the checkpoint's {ck['digest']}"))
+    if not same:
+        raise SystemExit(1)
+
+def _add_conf_args(sp, snapshot=True, store=True):
+    sp.add_argument("--conf", required=not snapshot, help="config tree (optional with --snapshot)")
+    if store:
+        sp.add_argument("--store", choices=STORE_KINDS, default="columnar",
+                        help="devices in memory: columnar (interface columns, interned strings; a fraction "
+                             "of the memory) or dicts (one dict per interface, as parse writes them)")
+    if snapshot:
+        sp.add_argument("--snapshot", default=None, metavar="DIR",
+                        help="load devices and graph from a build snapshot instead of parsing --conf")
+        sp.add_argument("--snapshot-stale", choices=STALE_MODES, default="rebuild",
+                        help="when configs changed since the snapshot: re-parse only those and rewrite "
+                             "it (rebuild), stop (error), or use it as is (ignore)")
+    sp.add_argument("--jobs", type=int, default=1, help="worker processes for parsing, validation rules and failure analysis (0 = all CPUs)")
+    sp.add_argument("--cache", default=None, help="parse cache file; unchanged configs are not re-parsed")
+    sp.add_argument("--cache-max", type=int, default=100000, help="max cached devices (LRU eviction)")
+
+def _add_format_arg(sp):
+    sp.add_argument("--format", choices=REPORT_FORMATS, default=None,
+                    help="ndjson: stream one record per line as it is produced (default: by --out "
+                         "extension, .ndjson/.jsonl; otherwise indented JSON)")
+
+def _add_profile_args(sp):
+    sp.add_argument("--profile", default=None, metavar="FILE",
+                    help="write wall time and peak RSS per stage (parse, build, validate rules, routing, "
+                         "write, ...) as JSON")
+    sp.add_argument("--cprofile", default=None, metavar="FILE",
+                    help="also dump a cProfile of the whole command (pstats format)")
+
+def _add_topology_args(sp):
+    sp.add_argument("--topology", choices=TOPOLOGY_MODES, default="mesh",
+                    help="segment: model multi-access subnets as one LAN node instead of a full mesh")
+
+def _add_loop_args(sp):
+    sp.add_argument("--loops", choices=LOOP_MODES, default="basis",
+                    help="basis: every cycle of a cycle basis; summary: one finding per looped biconnected "
+                         "component (linear time, for large meshed graphs)")
+    sp.add_argument("--loop-scope", choices=LOOP_SCOPES, default="all",
+                    help="l2: only look for loops over switched links (LAN segments, VLAN-tagged interfaces)")
+    sp.add_argument("--max-cycles", type=int, default=MAX_SAMPLE_CYCLES,
+                    help="example cycles listed per looped component (--loops summary)")
+
+def _add_traffic_args(sp, required=True, help="demand input"):
+    sp.add_argument("--traffic", required=required,
+                    help=f"{help}: traffic.json, or flow records in .csv / .ndjson / .jsonl (optionally .gz) "
+                         "with src, dst, avg, peak and class, summed per device pair as they are read")
+    sp.add_argument("--traffic-format", choices=TRAFFIC_FORMATS, default="auto",
+                    help="auto: by the --traffic file name")
+    sp.add_argument("--demand", choices=MEASURES, default=None,
+                    help="route the peak or the average demand (default peak; traffic.json: its use_peak)")
+    sp.add_argument("--traffic-class", action="append", default=[], metavar="CLASS",
+                    help="only route flow records of this class (repeatable)")
+
+def _add_sim_args(sp):
+    sp.add_argument("--engine", choices=("threads", "des", "sharded"), default="threads",
+                    help="des: single-process discrete-event engine running in virtual time; "
+                         "sharded: the des engine partitioned across worker processes")
+    sp.add_argument("--seed", type=int, default=0, help="random seed for the des/sharded engines")
+    sp.add_argument("--workers", type=int, default=0, help="shard processes for --engine sharded (0 = all CPUs)")
+    sp.add_argument("--link-delay", type=float, default=None, metavar="MS",
+                    help=f"propagation delay per link (default {LINK_DELAY * 1000:g} for threads, 0 for des)")
+    sp.add_argument("--link-depth", type=int, default=LINK_DEPTH,
+                    help="messages queued per link direction before drops (--engine threads)")
+    sp.add_argument("--ospf", nargs="?", const="cold", choices=OSPF_START_MODES,
+                    help="run OSPF (LSA flooding + SPF) on the links covered by each device's network "
+                         "statements; warm: start from converged databases")
+    sp.add_argument("--spf", choices=("incremental", "full"), default="incremental",
+                    help="full: complete Dijkstra on every LSDB change (reference)")
+    sp.add_argument("--quiet", action="store_true", help="do not echo node logs to the console")
+    sp.add_argument("--log-format", choices=LOG_FORMATS, default="text",
+                    help="ndjson: one JSON event per line in <node>.ndjson instead of <node>.log")
+    sp.add_argument("--log-sample", action="append", default=[], metavar="KIND=N",
+                    help="log only 1 in N events of a kind per node, e.g. HELLO=10 (repeatable)")
+    sp.add_argument("--log-ring", type=int, default=0, metavar="N",
+                    help="keep only the last N log records in memory and write them out on stop")
+    sp.add_argument("--metrics", nargs="?", const="./outputs/reports/sim_metrics.json", default=None, metavar="FILE",
+                    help="threads engine: per-node message rates, inbox depth percentiles, drops and "
+                         "pause/resume latency, rewritten every --metrics-interval seconds while running")
+    sp.add_argument("--metrics-interval", type=float, default=1.0, help="seconds between metrics samples")
+    sp.add_argument("--checkpoint", default=None, metavar="FILE",
+                    help="des engine: save the simulation state to FILE at the end of the run")
+    sp.add_argument("--restore", default=None, metavar="FILE",
+                    help="des engine: continue from a --checkpoint FILE instead of starting cold "
+                         "(graph, seed and engine options come from it; fail-link skips its warm-up)")
 
 def build_argparse():
     ap = argparse.ArgumentParser(prog="net-sim")
     sub = ap.add_subparsers(dest="cmd", required=True)
 
+    sb = sub.add_parser("build")
+    _add_conf_args(sb, snapshot=False)
+    _add_profile_args(sb)
+    _add_topology_args(sb)
+    sb.add_argument("--out", default=DEFAULT_SNAPSHOT, help="snapshot directory")
+    sb.set_defaults(func=cmd_build)
+
     sp = sub.add_parser("parse")
-    sp.add_argument("--conf", required=True)
+    _add_conf_args(sp, store=False)
+    _add_profile_args(sp)
     sp.add_argument("--out", required=True)
+    _add_format_arg(sp)
     sp.set_defaults(func=cmd_parse)
 
     sv = sub.add_parser("validate")
-    sv.add_argument("--conf", required=True)
+    _add_conf_args(sv)
+    _add_profile_args(sv)
+    _add_topology_args(sv)
     sv.add_argument("--out", required=True)
+    _add_format_arg(sv)
+    _add_loop_args(sv)
+    sv.add_argument("--state", default=None,
+                    help="keep the run's state in this file; later runs only re-check changed configs "
+                         "and also report added/resolved findings")
+    sv.add_argument("--changed", action="append", default=[], metavar="DEVICE",
+                    help="with --state: only re-read these devices' configs (repeatable)")
     sv.set_defaults(func=cmd_validate)
 
     sl = sub.add_parser("plan-load")
-    sl.add_argument("--conf", required=True)
-    sl.add_argument("--traffic", required=True)
+    _add_conf_args(sl)
+    _add_profile_args(sl)
+    _add_topology_args(sl)
+    _add_traffic_args(sl)
     sl.add_argument("--out", required=True)
+    _add_format_arg(sl)
+    sl.add_argument("--ecmp", action="store_true", help="split demand evenly across equal-cost paths")
+    sl.add_argument("--per-class", action="store_true",
+                    help="also report each traffic class's link loads (class_loads_mbps)")
+    sl.add_argument("--series", action="store_true",
+                    help="flow records with a time column: evaluate every interval as a scenario (with --growth: "
+                         "at every multiplier) and report per-link utilization percentiles and time of peak")
+    sl.add_argument("--growth", default=None, metavar="X,Y,...",
+                    help="demand multipliers to evaluate, e.g. 1,1.1,1.25")
+    sl.add_argument("--percentiles", default="50,95,99", help="utilization percentiles for --series/--growth")
+    sl.add_argument("--routing-cache", default=DEFAULT_ROUTING_CACHE, metavar="DIR",
+                    help="keep --series/--growth routing matrices here, keyed by topology and flows ('' = off)")
+    sl.add_argument("--contingency", choices=sorted(CONTINGENCY_ORDERS), default=None,
+                    help="also evaluate every single (N-1) or pair (N-2) of link failures")
     sl.set_defaults(func=cmd_plan_load)
 
+    se = sub.add_parser("serve")
+    _add_conf_args(se)
+    _add_profile_args(se)
+    _add_topology_args(se)
+    _add_loop_args(se)
+    se.add_argument("--http", default=None, metavar="HOST:PORT",
+                    help=f"answer queries over HTTP (default {DEFAULT_HTTP} unless --socket is given)")
+    se.add_argument("--socket", default=None, metavar="PATH",
+                    help="answer queries on this Unix socket, one JSON object per line")
+    _add_traffic_args(se, required=False, help="default demand set for load and what-if queries")
+    se.add_argument("--watch-interval", type=float, default=2.0, metavar="SECONDS",
+                    help="how often to look for changed configs (0: only on refresh queries)")
+    se.add_argument("--query-cache", type=int, default=256, metavar="N",
+                    help="shortest-path trees kept in the LRU cache (routing models: N/16)")
+    se.add_argument("--state", default=None,
+                    help="start from this validate --state file and save it again on exit")
+    se.set_defaults(func=cmd_serve)
+
     ss = sub.add_parser("simulate")
-    ss.add_argument("--conf", required=True)
+    _add_conf_args(ss)
+    _add_profile_args(ss)
+    _add_topology_args(ss)
+    _add_sim_args(ss)
     ss.add_argument("--seconds", type=int, default=5)
     ss.set_defaults(func=cmd_simulate)
 
     sf = sub.add_parser("fail-link")
-    sf.add_argument("--conf", required=True)
+    _add_conf_args(sf)
+    _add_profile_args(sf)
+    _add_topology_args(sf)
+    _add_sim_args(sf)
     sf.add_argument("--a", required=True)
     sf.add_argument("--b", required=True)
     sf.add_argument("--seconds", type=int, default=5)
     sf.set_defaults(func=cmd_fail_link)
 
     spr = sub.add_parser("pause-resume")
-    spr.add_argument("--conf", required=True)
+    _add_conf_args(spr)
+    _add_profile_args(spr)
+    _add_topology_args(spr)
+    _add_sim_args(spr)
     spr.add_argument("--seconds", type=int, default=6)
     spr.set_defaults(func=cmd_pause_resume)
 
+    sr = sub.add_parser("replay")
+    _add_profile_args(sr)
+    sr.add_argument("--checkpoint", required=True, metavar="FILE",
+                    help="re-run this checkpoint's simulation from a cold start and compare the end states")
+    sr.set_defaults(func=cmd_replay)
+
     return ap
 
 def main():
     ap = build_argparse()
     args = ap.parse_args()
-    args.func(args)
+    args.prof = Profiler(args.cmd, enabled=bool(args.profile), cprofile=args.cprofile)
+    args.snap = None
+    if getattr(args, "snapshot", None):
+        args.snap = load_snapshot(args.snapshot)
+        if args.snap is None:
+            raise SystemExit(f"no snapshot in {args.snapshot} (or one from another version); "
+                             f"create it with: build --conf DIR --out {args.snapshot}")
+        args.conf = args.conf or args.snap.conf_root
+    elif hasattr(args, "conf") and not args.conf and not getattr(args, "restore", None):
+        ap.error("--conf is required (or --snapshot)")
+    with args.prof.running():
+        args.func(args)
+    if args.profile:
+        rep = args.prof.write(args.profile)
+        rprint(f"[dim]profile: {rep['total_seconds']:.2f}s, peak RSS {rep['peak_rss_mb']:.0f} MB; "
+               f"wrote {args.profile}" + (f" and {args.cprofile}" if args.cprofile else "") + "[/dim]")
 
 if __name__ == "__main__":
     main()
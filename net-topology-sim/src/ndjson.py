@@ -0,0 +1,142 @@
+from __future__ import annotations
+import json, os
+from typing import Any, Dict, Iterable, Iterator, Tuple
+
+try:
+    import orjson  # optional: several times faster encoding/decoding
+except ImportError:
+    orjson = None
+
+# Streamed reports: one {"<kind>": value} object per line, written as records are produced.
+# kinds: device (parse); finding, rule, added, resolved (validate); link, class_link, recommendation,
+# contingency, contingency_link, contingency_overload, scenarios, scenario_link (plan-load);
+# meta (scalars of any report)
+REPORT_FORMATS = ("json", "ndjson")
+RECORD_KINDS = ("device", "finding", "rule", "added", "resolved", "link", "class_link", "recommendation",
+                "contingency", "contingency_link", "contingency_overload", "scenarios", "scenario_link", "meta")
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+_encode = json.JSONEncoder(separators=(",", ":")).encode
+_decode = orjson.loads if orjson is not None else json.loads
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            pass  # e.g. non-str dict keys, which the stdlib encoder turns into strings
+    return _encode(obj).encode()
+
+def is_ndjson(path: str) -> bool:
+    return path.endswith((".ndjson", ".jsonl"))
+
+def _sniff_ndjson(path: str) -> bool:
+    # --format ndjson may have been used with any extension: a first line that is one
+    # complete single-record object means NDJSON (the JSON format starts with a lone "{")
+    if is_ndjson(path):
+        return True
+    with open(path, "rb") as f:
+        first = f.readline()
+    try:
+        rec = _decode(first)
+    except ValueError:
+        return False
+    return isinstance(rec, dict) and len(rec) == 1 and next(iter(rec)) in RECORD_KINDS
+
+def report_format(path: str, fmt: str = None) -> str:
+    # explicit --format wins, else by extension
+    return fmt or ("ndjson" if is_ndjson(path) else "json")
+
+class NDJSONWriter:
+    def __init__(self, path: str, buffering: int = 1 << 20):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.f = open(path, "wb", buffering=buffering)
+        self.records = 0
+
+    def write(self, kind: str, value: Any):
+        self.f.write(dumps({kind: value}) + b"\n")
+        self.records += 1
+
+    def write_many(self, kind: str, values: Iterable[Any]):
+        for v in values:
+            self.write(kind, v)
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def iter_records(path: str) -> Iterator[Tuple[str, Any]]:
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                (kind, value), = _decode(line).items()
+                yield kind, value
+
+_LISTS = {"finding": "issues", "rule": "rules", "added": "added", "resolved": "resolved",
+          "recommendation": "recommendations"}
+_CONTINGENCY_LISTS = {"contingency_link": "links", "contingency_overload": "overloads"}
+_KINDS = {key: kind for kind, key in _LISTS.items()}
+
+# list keys each report always has, even when no record of that kind was written
+_REPORT_KEYS = {"validate": ("issues", "rules"), "validate-incremental": ("issues", "rules", "added", "resolved"),
+                "plan-load": ("link_loads_mbps", "recommendations")}
+
+def write_report(w: NDJSONWriter, report: Dict[str, Any], name: str):
+    # a validate/plan-load report dict as records (load_report reads it back); link loads
+    # are written by the caller as "link" records, since "a-b" keys cannot be split safely
+    meta = {"report": name}
+    for key, value in report.items():
+        if key in _KINDS:
+            w.write_many(_KINDS[key], value)
+        elif key == "contingency":
+            w.write("contingency", {k: v for k, v in value.items() if k not in ("links", "overloads")})
+            w.write_many("contingency_link", value.get("links", ()))
+            w.write_many("contingency_overload", value.get("overloads", ()))
+        elif key == "scenarios":
+            w.write("scenarios", {k: v for k, v in value.items() if k != "links"})
+            w.write_many("scenario_link", value.get("links", ()))
+        else:
+            meta[key] = value
+    w.write("meta", meta)
+
+def load_report(path: str) -> Dict[str, Any]:
+    # a parse/validate/plan-load report in either format, as the JSON format's dict
+    # (parse: hostname -> device; tuples come back as lists)
+    if not _sniff_ndjson(path):
+        with open(path) as f:
+            return json.load(f)
+    out: Dict[str, Any] = {}
+    for kind, v in iter_records(path):
+        if kind == "device":
+            out[v["hostname"]] = v
+        elif kind in _LISTS:
+            out.setdefault(_LISTS[kind], []).append(v)
+        elif kind == "link":
+            out.setdefault("link_loads_mbps", {})[f"{v['a']}-{v['b']}"] = v["load_mbps"]
+        elif kind == "class_link":
+            out.setdefault("class_loads_mbps", {}).setdefault(v["class"], {})[f"{v['a']}-{v['b']}"] = v["load_mbps"]
+        elif kind == "contingency":
+            out.setdefault("contingency", {}).update(v)
+        elif kind in _CONTINGENCY_LISTS:
+            out.setdefault("contingency", {}).setdefault(_CONTINGENCY_LISTS[kind], []).append(v)
+        elif kind == "scenarios":
+            out.setdefault("scenarios", {}).update(v)
+        elif kind == "scenario_link":
+            out.setdefault("scenarios", {}).setdefault("links", []).append(v)
+        elif kind == "meta":
+            out.update(v)
+    for key in _REPORT_KEYS.get(out.pop("report", None), ()):
+        out.setdefault(key, {} if key == "link_loads_mbps" else [])
+    if "contingency" in out:
+        out["contingency"].setdefault("links", [])
+        out["contingency"].setdefault("overloads", [])
+    if "scenarios" in out:
+        out["scenarios"].setdefault("links", [])
+    return out
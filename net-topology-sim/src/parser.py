@@ -1,6 +1,7 @@
 from __future__ import annotations
-import os, re, json
-from typing import Dict, Any, List
+import os, re, json, hashlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from .utils import ip_mask_to_network
 
 IFACE_RE = re.compile(r'^\s*interface\s+([\w\/\.]+)', re.I)
@@ -12,8 +13,153 @@ HOST_RE = re.compile(r'^\s*hostname\s+(\S+)', re.I)
 OSPF_RE = re.compile(r'^\s*router\s+ospf\s+(\d+)', re.I)
 BGP_RE = re.compile(r'^\s*router\s+bgp\s+(\d+)', re.I)
 VLAN_RE = re.compile(r'vlan\s+(\d+)|encapsulation\s+dot1q\s+(\d+)|access\s+vlan\s+(\d+)', re.I)
+OSPF_NET_RE = re.compile(r'^\s*network\s+(\d+\.\d+\.\d+\.\d+)\s+(\d+\.\d+\.\d+\.\d+)\s+area\s+(\S+)', re.I)
+
+# Bump PARSER_REVISION when parse logic changes; regex edits change the stamp on their own.
+# Cached parse results with a different stamp are discarded (see cache.ParseCache).
+PARSER_REVISION = 2
+PARSER_VERSION = hashlib.sha1(repr((PARSER_REVISION, [
+    (r.pattern, r.flags) for r in (IFACE_RE, IP_RE, DESC_RE, BW_RE, MTU_RE, HOST_RE, OSPF_RE, BGP_RE, VLAN_RE, OSPF_NET_RE)
+])).encode()).hexdigest()[:12]
+
+READ_BUFFER = 1 << 20
+
+def _new_iface(name: str, parent: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    iface = {
+        "name": name,
+        "description": "",
+        "ip": "",
+        "mask": "",
+        "bandwidth": 0,
+        "mtu": 1500,
+        "vlan": 0,
+        "network": ""
+    }
+    if parent is not None:
+        # subinterfaces inherit bandwidth/mtu from the physical port unless overridden
+        iface["bandwidth"], iface["mtu"] = parent["bandwidth"], parent["mtu"]
+    return iface
+
+def _set_vlan(cur: Dict[str, Any], line: str) -> bool:
+    m = VLAN_RE.search(line)
+    if not m:
+        return False
+    for g in m.groups():
+        if g:
+            cur["vlan"] = int(g)
+    return True
+
+def _if_ip(cur, line):
+    m = IP_RE.match(line)
+    if m:
+        cur["ip"], cur["mask"] = m.group(1), m.group(2)
+        cur["network"] = ip_mask_to_network(cur["ip"], cur["mask"])
+    return m is not None
+
+def _if_desc(cur, line):
+    m = DESC_RE.match(line)
+    if m:
+        cur["description"] = m.group(1).strip()
+    return m is not None
+
+def _if_bw(cur, line):
+    m = BW_RE.match(line)
+    if m:
+        cur["bandwidth"] = int(m.group(1))
+    return m is not None
+
+def _if_mtu(cur, line):
+    m = MTU_RE.match(line)
+    if m:
+        cur["mtu"] = int(m.group(1))
+    return m is not None
+
+# interface sub-commands, dispatched on the first keyword
+IFACE_HANDLERS = {
+    "ip": _if_ip,
+    "description": _if_desc,
+    "bandwidth": _if_bw,
+    "mtu": _if_mtu,
+    "encapsulation": _set_vlan,
+    "switchport": _set_vlan,
+}
+
+def _wildcard_to_mask(wildcard: str) -> str:
+    return ".".join(str(255 - int(o)) for o in wildcard.split("."))
 
 def parse_device_config(path: str) -> Dict[str, Any]:
+    # Single pass over a buffered stream: each line is dispatched on its first keyword
+    # and at most one regex runs against it. Block context ("interface", "router ospf")
+    # lasts until the next non-indented line.
+    device = {
+        "hostname": None,
+        "interfaces": [],
+        "routing": {"ospf": [], "bgp": []},
+    }
+    if not os.path.exists(path):
+        return device
+
+    hostname = None
+    cur = None
+    ospf = None
+    block = None
+    by_name: Dict[str, Dict[str, Any]] = {}
+    with open(path, "r", encoding="utf-8", errors="ignore", buffering=READ_BUFFER) as f:
+        for line in f:
+            head = line.split(None, 1)
+            if not head:
+                continue
+            if line[0] not in " \t":
+                block = None
+            kw = head[0].lower()
+
+            if kw == "interface":
+                mi = IFACE_RE.match(line)
+                if mi:
+                    name = mi.group(1)
+                    cur = _new_iface(name, by_name.get(name.split(".", 1)[0]) if "." in name else None)
+                    device["interfaces"].append(cur)
+                    by_name[name] = cur
+                    block = "interface"
+                    continue
+            elif kw == "hostname":
+                m = HOST_RE.match(line)
+                if m:
+                    hostname = m.group(1)
+                continue
+            elif kw == "router":
+                mo = OSPF_RE.match(line)
+                if mo:
+                    ospf = {"process": int(mo.group(1)), "networks": []}
+                    device["routing"]["ospf"].append(ospf)
+                    block = "ospf"
+                    continue
+                mb = BGP_RE.match(line)
+                if mb:
+                    device["routing"]["bgp"].append({"asn": int(mb.group(1))})
+                    block = "bgp"
+                continue
+
+            if block == "interface":
+                handler = IFACE_HANDLERS.get(kw)
+                if handler is None or not handler(cur, line):
+                    low = line.lower()
+                    if "vlan" in low or "dot1q" in low:
+                        _set_vlan(cur, line)
+            elif block == "ospf" and kw == "network":
+                m = OSPF_NET_RE.match(line)
+                if m:
+                    net = ip_mask_to_network(m.group(1), _wildcard_to_mask(m.group(2)))
+                    ospf["networks"].append({"network": net, "area": m.group(3)})
+
+    if not hostname:
+        # fallback to folder name as hostname
+        hostname = os.path.basename(os.path.dirname(path)) or "UNKNOWN"
+    device["hostname"] = hostname
+    return device
+
+# Original line-by-line regex cascade; kept as the reference for bench/bench_parser.py
+def parse_device_config_regex(path: str) -> Dict[str, Any]:
     device = {
         "hostname": None,
         "interfaces": [],
@@ -91,23 +237,89 @@ def parse_device_config(path: str) -> Dict[str, Any]:
     device["hostname"] = hostname
     return device
 
-def parse_conf_dir(conf_root: str) -> Dict[str, Any]:
-    devices: Dict[str, Any] = {}
+def find_device_configs(conf_root: str) -> List[str]:
+    paths = []
     for name in os.listdir(conf_root):
         d = os.path.join(conf_root, name)
         cfg = os.path.join(d, "config.dump")
         if os.path.isdir(d) and os.path.exists(cfg):
-            dev = parse_device_config(cfg)
-            devices[dev["hostname"]] = dev
-    return devices
+            paths.append(cfg)
+    return paths
+
+def _parse_one(path: str) -> Tuple[str, Optional[Dict[str, Any]], str]:
+    # never raise out of a worker: one bad file must not abort the whole run
+    try:
+        return path, parse_device_config(path), ""
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}"
+
+def _parse_many(paths: List[str], jobs: int = 1, chunksize: int = 0):
+    workers = jobs if jobs > 0 else (os.cpu_count() or 1)
+    if workers == 1 or len(paths) < 2:
+        yield from map(_parse_one, paths)
+        return
+    workers = min(workers, len(paths))
+    # a few chunks per worker keeps IPC overhead low but still balances slow files
+    chunk = chunksize or max(1, len(paths) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        # map() yields in submission order, so the devices dict keeps the serial ordering
+        yield from ex.map(_parse_one, paths, chunksize=chunk)
+
+def iter_conf_dir(conf_root: str, jobs: int = 1, chunksize: int = 0,
+                  errors: Optional[List[Dict[str, str]]] = None, cache=None,
+                  sources: Optional[Dict[str, str]] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    # -> (hostname, device) per config file, in directory order, as soon as it is parsed;
+    # nothing is kept once yielded (except in the cache, if one is given)
+    # jobs: 1 = serial, 0 = one worker per CPU, N = N worker processes
+    # errors: if given, per-file failures are appended here as {"path", "error"}
+    # sources: if given, filled with config path -> hostname for every parsed file
+    # cache: optional cache.ParseCache; only new or changed files are parsed
+    paths = find_device_configs(conf_root)
+    cached: Dict[str, Dict[str, Any]] = {}
+    todo = paths
+    if cache is not None:
+        todo = []
+        for path in paths:
+            dev = cache.get(path)
+            if dev is None:
+                todo.append(path)
+            else:
+                cached[path] = dev
+    parsed = _parse_many(todo, jobs, chunksize)  # same order as `paths`, minus the cached ones
+    try:
+        for path in paths:
+            dev, err = cached.get(path), ""
+            if dev is None:
+                _, dev, err = next(parsed)
+                if cache is not None and not err:
+                    cache.put(path, dev)
+            if err:
+                if errors is None:
+                    raise RuntimeError(f"{path}: {err}")
+                errors.append({"path": path, "error": err})
+                continue
+            if sources is not None:
+                sources[path] = dev["hostname"]
+            yield dev["hostname"], dev
+    finally:
+        parsed.close()
+        if cache is not None:
+            cache.save()
+
+def parse_conf_dir(conf_root: str, jobs: int = 1, chunksize: int = 0,
+                   errors: Optional[List[Dict[str, str]]] = None, cache=None,
+                   sources: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    # all of iter_conf_dir as hostname -> device (a repeated hostname keeps the last file)
+    return dict(iter_conf_dir(conf_root, jobs, chunksize, errors, cache, sources))
 
 def main():
     import argparse
     ap = argparse.ArgumentParser()
     ap.add_argument("--conf", required=True)
     ap.add_argument("--out", required=True)
+    ap.add_argument("--jobs", type=int, default=1)
     args = ap.parse_args()
-    data = parse_conf_dir(args.conf)
+    data = parse_conf_dir(args.conf, jobs=args.jobs)
     with open(args.out, "w") as f:
         json.dump(data, f, indent=2)
     print(f"Wrote {args.out}")
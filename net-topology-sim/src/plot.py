@@ -0,0 +1,315 @@
+from __future__ import annotations
+import os, re
+from collections import Counter
+from typing import Dict, Any, Optional, Tuple
+import networkx as nx
+import numpy as np
+
+from .contingency import link_capacity_mbps
+from .loadengine import edge_key, topology_digest
+from .store import MASK_BITS
+from .topology import SEGMENT_PREFIX
+from .utils import ip_to_int, int_to_ip
+
+# Drawing large topologies (topology_plot.py). The graph is cut down before anything is
+# laid out: to the k-hop neighborhood of a device, then collapsed into groups (site, subnet,
+# or the highest-degree devices with everything else folded into the nearest one) until at
+# most max_nodes remain. Layouts are force-directed in numpy and cached per rendered graph
+# (topology digest); a graph not in the cache starts from the cached layout that shares the
+# most nodes and only moves the new ones. Link utilization from a load plan and finding
+# counts from a validate report can be drawn on top. matplotlib is only needed by render(),
+# which uses the Agg backend and writes a file.
+
+GROUPINGS = ("auto", "none", "site", "subnet", "degree")
+DEFAULT_PLOT = "./outputs/graphs/topology.png"
+DEFAULT_LAYOUT_CACHE = "./outputs/cache/layout"
+MAX_NODES = 300  # auto grouping above this
+LABELS_MAX = 150  # node labels are drawn up to this many nodes ...
+EDGE_LABELS_MAX = 60  # ... and networks on links up to this many links
+LAYOUT_CACHE_KEEP = 32
+
+def site_of(name: str, pattern: Optional[str] = None) -> str:
+    # "nyc1-leaf-03" -> "nyc1" (a name without a separator is its own site); or group 1 of `pattern`
+    if pattern:
+        m = re.match(pattern, name)
+        return m.group(1) if m and m.groups() else name
+    return re.split(r"[-_.]", name, 1)[0]
+
+def _supernet(net: str, prefix: int) -> str:
+    ip, _, plen = net.partition("/")
+    n = ip_to_int(ip)
+    if n < 0:
+        return "(none)"
+    p = min(prefix, int(plen or 32))
+    return f"{int_to_ip(n & MASK_BITS[p])}/{p}"
+
+def neighborhood(G: nx.Graph, device: str, hops: int) -> nx.Graph:
+    if device not in G:
+        raise ValueError(f"unknown device {device}")
+    # in G's node and adjacency order (a subgraph view would follow set order, which changes from
+    # run to run and with it the layout cache key)
+    keep = nx.single_source_shortest_path_length(G, device, cutoff=hops)
+    H = nx.Graph(**G.graph)
+    H.add_nodes_from((n, G.nodes[n]) for n in G if n in keep)
+    H.add_edges_from((u, v, a) for u in H for v, a in G[u].items() if v in keep)
+    return H
+
+def group_nodes(G: nx.Graph, by: str, max_nodes: int = MAX_NODES, pattern: Optional[str] = None,
+                subnet_prefix: int = 16) -> Dict[str, str]:
+    # node -> group name
+    if by == "none":
+        return {n: n for n in G}
+    if by == "site":
+        groups = {n: site_of(n, pattern) for n in G if not n.startswith(SEGMENT_PREFIX)}
+    elif by == "subnet":
+        groups = {}
+        for n in G:
+            nets = sorted(a.get("network", "") for a in G[n].values() if a.get("network"))
+            groups[n] = _supernet(nets[0], subnet_prefix) if nets else "(none)"
+    elif by == "degree":
+        # the max_nodes best-connected devices stay; every other node joins the nearest of them
+        core = sorted(G, key=lambda n: (-G.degree(n), n))[:max_nodes]
+        groups = {n: n for n in core}
+        frontier = list(core)
+        while frontier:
+            nxt = []
+            for v in frontier:
+                for w in G[v]:
+                    if w not in groups:
+                        groups[w] = groups[v]
+                        nxt.append(w)
+            frontier = nxt
+        for n in G:  # components without a core device
+            groups.setdefault(n, n)
+        return groups
+    else:
+        raise ValueError(f"unknown grouping {by}; one of {', '.join(GROUPINGS)}")
+    for n in G:  # LAN segments go with their first device
+        if n not in groups:
+            groups[n] = next((groups[m] for m in G[n] if m in groups), n)
+    return groups
+
+def auto_grouping(G: nx.Graph, max_nodes: int = MAX_NODES, pattern: Optional[str] = None) -> str:
+    if G.number_of_nodes() <= max_nodes:
+        return "none"
+    sites = len(set(group_nodes(G, "site", pattern=pattern).values()))
+    return "site" if 1 < sites <= max_nodes else "degree"
+
+def collapse(G: nx.Graph, groups: Dict[str, str], utilization: Optional[Dict[Tuple[str, str], float]] = None,
+             findings: Optional[Counter] = None) -> nx.Graph:
+    # the quotient graph: a node per group (size: devices in it, findings: summed), an edge per
+    # pair of groups with links between them (links: count, capacity_mbps: summed,
+    # utilization: the highest of its links)
+    H = nx.Graph(mode=G.graph.get("mode"))
+    for n, g in groups.items():
+        if g not in H:
+            H.add_node(g, size=0, findings=0, segment=n.startswith(SEGMENT_PREFIX) and g == n)
+        H.nodes[g]["size"] += 0 if n.startswith(SEGMENT_PREFIX) else 1
+        H.nodes[g]["findings"] += findings.get(n, 0) if findings else 0
+    for u, v, a in G.edges(data=True):
+        gu, gv = groups[u], groups[v]
+        if gu == gv:
+            continue
+        util = utilization.get(edge_key(u, v)) if utilization else None
+        if H.has_edge(gu, gv):
+            e = H[gu][gv]
+            e["links"] += 1
+            e["capacity_mbps"] += link_capacity_mbps(G, u, v)
+            e["network"] = ""
+            if util is not None:
+                e["utilization"] = max(e["utilization"] or 0.0, util)
+        else:
+            H.add_edge(gu, gv, links=1, capacity_mbps=link_capacity_mbps(G, u, v),
+                       network=a.get("network", ""), utilization=util)
+    return H
+
+def link_utilization(G: nx.Graph, loadplan: Dict[str, Any]) -> Dict[Tuple[str, str], float]:
+    # edge_key -> load / capacity from a plan-load report ("u-v" keys in G's edge orientation);
+    # of a --series/--growth report, the worst scenario of each link
+    out = {}
+    if "scenarios" in loadplan:
+        for l in loadplan["scenarios"].get("links", ()):
+            if G.has_edge(l["a"], l["b"]) and l.get("max_utilization") is not None:
+                out[edge_key(l["a"], l["b"])] = l["max_utilization"]
+        return out
+    loads = loadplan.get("link_loads_mbps", {})
+    for u, v in G.edges():
+        load = loads.get(f"{u}-{v}", loads.get(f"{v}-{u}"))
+        cap = link_capacity_mbps(G, u, v)
+        if load is not None:
+            out[edge_key(u, v)] = load / cap if cap else (1.0 if load else 0.0)
+    return out
+
+def device_findings(G: nx.Graph, report: Dict[str, Any]) -> Counter:
+    # device -> number of findings (of a validate report) that name it
+    count: Counter = Counter()
+    for f in report.get("issues", ()):
+        names = set()
+        stack = [f]
+        while stack:
+            x = stack.pop()
+            if isinstance(x, str):
+                if x in G:
+                    names.add(x)
+            elif isinstance(x, dict):
+                stack.extend(x.values())
+            elif isinstance(x, (list, tuple)):
+                stack.extend(x)
+        count.update(names)
+    return count
+
+def force_layout(G: nx.Graph, pos: Optional[np.ndarray] = None, fixed: Optional[np.ndarray] = None,
+                 iterations: int = 50, seed: int = 42, block: int = 1024) -> np.ndarray:
+    # Fruchterman-Reingold on arrays (node i = i-th node of G), repulsion in row blocks so that
+    # memory stays block x n; `fixed` nodes keep their `pos`
+    n = G.number_of_nodes()
+    rnd = np.random.default_rng(seed)
+    if pos is None:
+        pos = rnd.random((n, 2))
+    pos = np.array(pos, dtype=np.float64)
+    if n <= 1:
+        return pos
+    index = {v: i for i, v in enumerate(G)}
+    eu = np.array([index[u] for u, _ in G.edges()], dtype=np.int64)
+    ev = np.array([index[v] for _, v in G.edges()], dtype=np.int64)
+    movable = np.ones(n, dtype=bool) if fixed is None else ~fixed
+    rows = np.flatnonzero(movable)
+    k = np.sqrt(1.0 / n)
+    span = np.ptp(pos, axis=0).max() or 1.0
+    t = 0.1 * span
+    dt = t / (iterations + 1)
+    for _ in range(iterations):
+        disp = np.zeros((n, 2))
+        for s in range(0, len(rows), block):
+            r = rows[s:s + block]  # only the nodes that move need their repulsion
+            delta = pos[r, None, :] - pos[None, :, :]
+            d2 = np.maximum((delta ** 2).sum(axis=2), 1e-6)
+            disp[r] = (delta * (k * k / d2)[:, :, None]).sum(axis=1)
+        delta = pos[eu] - pos[ev]
+        d = np.maximum(np.sqrt((delta ** 2).sum(axis=1)), 1e-3)
+        pull = delta * (d / k)[:, None]
+        np.add.at(disp, eu, -pull)
+        np.add.at(disp, ev, pull)
+        length = np.maximum(np.sqrt((disp ** 2).sum(axis=1)), 1e-9)
+        step = disp * (np.minimum(length, t) / length)[:, None]
+        pos[movable] += step[movable]
+        t -= dt
+    return pos
+
+def _place_new(G: nx.Graph, pos: np.ndarray, known: np.ndarray, seed: int) -> np.ndarray:
+    # new nodes start at the middle of their already placed neighbors (or at random)
+    rnd = np.random.default_rng(seed)
+    index = {v: i for i, v in enumerate(G)}
+    lo, hi = (pos[known].min(axis=0), pos[known].max(axis=0)) if known.any() else (np.zeros(2), np.ones(2))
+    placed = known.copy()
+    jitter = 0.02 * (np.ptp(pos[known], axis=0).max() if known.any() else 1.0)
+    for v in G:
+        i = index[v]
+        if placed[i]:
+            continue
+        nb = [index[w] for w in G[v] if placed[index[w]]]
+        pos[i] = pos[nb].mean(axis=0) + rnd.normal(0, jitter, 2) if nb else lo + rnd.random(2) * (hi - lo)
+        placed[i] = True
+    return pos
+
+def cached_layout(G: nx.Graph, cache_dir: Optional[str] = None, iterations: int = 50,
+                  seed: int = 42) -> Tuple[Dict[str, Tuple[float, float]], str]:
+    # -> (node -> (x, y), "cached" | "incremental" | "full")
+    nodes = list(G)
+    path = os.path.join(cache_dir, topology_digest(G) + ".npz") if cache_dir else None
+    if path and os.path.exists(path):
+        with np.load(path) as z:
+            names, xy = z["nodes"].tolist(), z["xy"]
+        if names == nodes:
+            os.utime(path)
+            return {v: tuple(p) for v, p in zip(nodes, xy.tolist())}, "cached"
+    status = "full"
+    pos = None
+    fixed = None
+    if cache_dir and os.path.isdir(cache_dir):
+        # the cached layout sharing the most nodes, if the two share at least half of all their
+        # nodes (a small change to the same view, not a neighborhood cut out of a bigger one)
+        index = {v: i for i, v in enumerate(nodes)}
+        best, best_n = None, 0
+        for e in sorted(os.scandir(cache_dir), key=lambda e: -e.stat().st_mtime)[:LAYOUT_CACHE_KEEP]:
+            if not e.name.endswith(".npz"):
+                continue
+            with np.load(e.path) as z:
+                names, xy = z["nodes"].tolist(), z["xy"]
+            shared = sum(1 for v in names if v in index)
+            if shared > best_n and 2 * shared >= len(set(names) | index.keys()):
+                best, best_n = (names, xy), shared
+        if best is not None:
+            pos = np.zeros((len(nodes), 2))
+            fixed = np.zeros(len(nodes), dtype=bool)
+            for v, p in zip(*best):
+                i = index.get(v)
+                if i is not None:
+                    pos[i] = p
+                    fixed[i] = True
+            pos = _place_new(G, pos, fixed, seed)
+            status = "incremental"
+    if status == "incremental":
+        # only the new nodes move, from next to their neighbors
+        xy = force_layout(G, pos, fixed=fixed, iterations=max(iterations // 2, 1), seed=seed)
+    else:
+        xy = force_layout(G, iterations=iterations, seed=seed)
+    if path:
+        os.makedirs(cache_dir, exist_ok=True)
+        np.savez(path, nodes=np.array(nodes, dtype=str), xy=xy)
+        old = sorted((e for e in os.scandir(cache_dir) if e.name.endswith(".npz")), key=lambda e: e.stat().st_mtime)
+        for e in old[:-LAYOUT_CACHE_KEEP]:
+            os.unlink(e.path)
+    return {v: tuple(p) for v, p in zip(nodes, xy.tolist())}, status
+
+def render(H: nx.Graph, pos: Dict[str, Tuple[float, float]], out: str, title: str = "Network topology",
+           overlay: bool = False, dpi: int = 150) -> str:
+    import matplotlib
+    matplotlib.use("Agg")  # headless: render to a file, never open a window
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+
+    n, m = H.number_of_nodes(), H.number_of_edges()
+    side = min(8 + np.sqrt(n) * 0.8, 40)
+    fig, ax = plt.subplots(figsize=(side, side))
+    ax.set_axis_off()
+    ax.set_title(title, fontsize=14)
+    edges = list(H.edges(data=True))
+    segs = [(pos[u], pos[v]) for u, v, _ in edges]
+    widths = [0.6 + np.log2(a.get("links", 1)) for _, _, a in edges]
+    if overlay:
+        cmap = plt.get_cmap("RdYlGn_r")
+        util = [a.get("utilization") for _, _, a in edges]
+        colors = [cmap(min(u, 1.0)) if u is not None else (0.75, 0.75, 0.75, 0.6) for u in util]
+        sm = plt.cm.ScalarMappable(cmap=cmap, norm=plt.Normalize(0, 1))
+        fig.colorbar(sm, ax=ax, shrink=0.5, label="link utilization (max over grouped links)")
+    else:
+        colors = [(0.45, 0.45, 0.45, 0.7)] * len(edges)
+    ax.add_collection(LineCollection(segs, colors=colors, linewidths=widths, zorder=1))
+
+    xy = np.array([pos[v] for v in H]) if n else np.zeros((0, 2))
+    size = np.array([H.nodes[v].get("size", 1) or 1 for v in H], dtype=float)
+    found = np.array([H.nodes[v].get("findings", 0) for v in H])
+    node_size = (3000 / max(np.sqrt(n), 1)) * np.sqrt(size / max(size.max(initial=1), 1)) + 10
+    face = np.where(found[:, None] > 0, [[0.93, 0.35, 0.3]], [[0.55, 0.75, 0.95]]) if n else []
+    ax.scatter(xy[:, 0], xy[:, 1], s=node_size, c=face, edgecolors="#333333", linewidths=0.5, zorder=2)
+    if n <= LABELS_MAX:
+        for v, (x, y) in zip(H, xy):
+            a = H.nodes[v]
+            label = v if a.get("size", 1) <= 1 else f"{v} ({a['size']})"
+            if a.get("findings"):
+                label += f" !{a['findings']}"
+            ax.annotate(label, (x, y), fontsize=max(5, 11 - n // 25), ha="center", va="center", zorder=3)
+    if m <= EDGE_LABELS_MAX:
+        for u, v, a in edges:
+            text = a.get("network", "")
+            if a.get("utilization") is not None:
+                text = f"{text} {a['utilization']:.0%}".strip()
+            if text:
+                (x1, y1), (x2, y2) = pos[u], pos[v]
+                ax.annotate(text, ((x1 + x2) / 2, (y1 + y2) / 2), fontsize=6, color="#444444", ha="center")
+    ax.autoscale_view()
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    fig.savefig(out, dpi=dpi, bbox_inches="tight")
+    plt.close(fig)
+    return out
@@ -0,0 +1,116 @@
+from __future__ import annotations
+import cProfile, json, os, resource, threading, time
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+# --profile: wall time and peak RSS per pipeline stage (parse, build, validate and its
+# rules, routing, simulate, write), written as JSON; --cprofile adds a cProfile dump
+# of the whole command (pstats format: python -m pstats FILE, snakeviz, ...).
+
+class RSSSampler:
+    # peak resident set size since the last reset(), sampled from /proc every few ms
+    # (falls back to the process-wide ru_maxrss where /proc is not available)
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._statm = "/proc/self/statm" if os.path.exists("/proc/self/statm") else None
+        self._page = os.sysconf("SC_PAGE_SIZE") if self._statm else 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def rss_mb(self) -> float:
+        if self._statm is None:
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        with open(self._statm) as f:
+            return int(f.read().split()[1]) * self._page / 2**20
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.rss_mb())
+
+    def reset(self):
+        self.peak = self.rss_mb()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+class Profiler:
+    # stage() is a no-op unless enabled, so commands can mark their stages unconditionally
+    def __init__(self, command: str, enabled: bool = False, cprofile: Optional[str] = None):
+        self.command = command
+        self.enabled = enabled or cprofile is not None
+        self.cprofile_path = cprofile
+        self.stages: List[Dict[str, Any]] = []
+        self.sampler: Optional[RSSSampler] = None
+        self.t0 = time.perf_counter()
+        self.total: Optional[float] = None
+        self._depth = 0
+        self._peak = 0.0
+
+    @contextmanager
+    def stage(self, name: str):
+        # peak_mb: highest RSS while the stage ran (an outer stage's includes its nested ones)
+        if not self.enabled:
+            yield
+            return
+        if self.sampler is None:
+            self.sampler = RSSSampler()
+        outer = self.sampler.peak if self._depth else 0.0
+        self.sampler.reset()
+        self._depth += 1
+        entry = {"stage": name}
+        self.stages.append(entry)  # in start order, ahead of its nested stages
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            dt = time.perf_counter() - t0
+            self._depth -= 1
+            peak = max(self.sampler.peak, self.sampler.rss_mb())
+            self._peak = max(self._peak, peak)
+            entry.update(seconds=round(dt, 6), peak_mb=round(peak, 1))
+            self.sampler.peak = max(outer, peak)
+
+    def record(self, name: str, seconds: float, **extra):
+        # a stage timed elsewhere, e.g. one validation rule from run_validation's report
+        if self.enabled:
+            self.stages.append({"stage": name, "seconds": round(seconds, 6), **extra})
+
+    @contextmanager
+    def running(self):
+        # wraps the whole command; collects the cProfile dump when asked for
+        prof = cProfile.Profile() if self.cprofile_path else None
+        self.t0 = time.perf_counter()
+        if prof is not None:
+            prof.enable()
+        try:
+            yield self
+        finally:
+            if prof is not None:
+                prof.disable()
+                d = os.path.dirname(self.cprofile_path)
+                if d:
+                    os.makedirs(d, exist_ok=True)
+                prof.dump_stats(self.cprofile_path)
+            self.total = time.perf_counter() - self.t0
+            if self.sampler is not None:
+                self.sampler.stop()
+
+    def report(self) -> Dict[str, Any]:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        total = self.total if self.total is not None else time.perf_counter() - self.t0
+        return {"command": self.command, "total_seconds": round(total, 6),
+                "peak_rss_mb": round(max(self._peak, usage.ru_maxrss / 1024), 1),
+                "cpu_seconds": round(usage.ru_utime + usage.ru_stime, 3),
+                "stages": self.stages, "cprofile": self.cprofile_path}
+
+    def write(self, path: str) -> Dict[str, Any]:
+        rep = self.report()
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(rep, f, indent=2)
+        return rep
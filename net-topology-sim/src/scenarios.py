@@ -0,0 +1,78 @@
+from __future__ import annotations
+import time
+from typing import Dict, Any, List, Sequence, Tuple, Optional
+import networkx as nx
+import numpy as np
+
+from .contingency import link_capacity_mbps
+from .loadengine import cached_routing
+from .topology import path_weight
+from .traffic import DemandSeries
+
+# Many demand sets over one routing (plan-load --series / --growth): every interval of a
+# DemandSeries at every growth multiplier is a scenario. The flows are routed once, or the
+# routing matrix is read from the on-disk cache for this topology and these flows; each
+# scenario is then one pass over the matrix. Per link: utilization percentiles over all
+# scenarios, the peak load and the scenario it happens in.
+
+DEFAULT_ROUTING_CACHE = "./outputs/cache/routing"
+PERCENTILES = (50, 95, 99)
+
+def scenario_labels(series: DemandSeries, growth: Sequence[float]) -> List[str]:
+    if list(growth) == [1.0]:
+        return list(series.labels)
+    return [f"{t} x{g:g}" for g in growth for t in series.labels]
+
+def _whole(x: np.ndarray):
+    # whole-number loads as ints, like compute_link_loads gives for integer demands
+    return x.round().astype(int).tolist() if np.array_equal(x, x.round()) else np.round(x, 6).tolist()
+
+def evaluate_scenarios(G: nx.Graph, series: DemandSeries, growth: Sequence[float] = (1.0,), ecmp: bool = False,
+                       percentiles: Sequence[float] = PERCENTILES,
+                       cache_dir: Optional[str] = None) -> Tuple[Dict[str, Any], Dict[Tuple[str, str], Any]]:
+    # -> (report, edge_key -> peak load over all scenarios)
+    t0 = time.perf_counter()
+    rm, cached = cached_routing(G, series.flows, ecmp=ecmp, weight=path_weight(G), cache_dir=cache_dir)
+    t_route = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    labels = scenario_labels(series, growth)
+    base = np.ascontiguousarray(series.demand.T)  # intervals x flows
+    D = np.concatenate([base * g for g in growth]) if list(growth) != [1.0] else base
+    loaded = np.unique(rm.rows)  # links no flow crosses stay at 0 in every scenario
+    L = rm.loads_many(D, loaded)  # scenarios x loaded links
+    cap = np.array([link_capacity_mbps(G, *rm.edges[i]) for i in loaded], dtype=np.float64)
+    util = np.divide(L, cap, out=np.zeros_like(L), where=cap > 0)
+    over = L > cap
+    peak_at = L.argmax(axis=0) if len(L) else np.zeros(len(loaded), dtype=int)
+    peak = L.max(axis=0) if len(L) else np.zeros(len(loaded))
+    pct = np.percentile(util, percentiles, axis=0) if len(L) else np.zeros((len(percentiles), len(loaded)))
+    per_scenario = over.sum(axis=1)
+    t_eval = time.perf_counter() - t0
+
+    links = []
+    peaks = _whole(peak)
+    for k, i in enumerate(loaded.tolist()):
+        if not peak[k]:
+            continue
+        a, b = rm.edges[i]
+        links.append({"a": a, "b": b, "capacity_mbps": int(cap[k]), "peak_mbps": peaks[k],
+                      "peak_scenario": labels[peak_at[k]],
+                      "utilization": {f"p{q:g}": round(float(pct[j, k]), 4) if cap[k] else None
+                                      for j, q in enumerate(percentiles)},
+                      "max_utilization": round(float(util[peak_at[k], k]), 4) if cap[k] else None,
+                      "overloaded_scenarios": int(over[:, k].sum())})
+    links.sort(key=lambda l: (-(l["max_utilization"] or 0), -l["peak_mbps"]))
+    report: Dict[str, Any] = {
+        "scenarios": len(labels), "intervals": len(series.labels), "growth": list(growth),
+        "flows": len(series.flows), "percentiles": list(percentiles),
+        "routing_cached": cached, "routing_seconds": round(t_route, 6), "evaluate_seconds": round(t_eval, 6),
+        "overloaded_scenarios": int((per_scenario > 0).sum()),
+    }
+    if len(L):
+        busiest = int(np.lexsort((util.max(axis=1), per_scenario))[-1])
+        report["busiest_scenario"] = {"scenario": labels[busiest], "overloaded_links": int(per_scenario[busiest]),
+                                      "max_utilization": round(float(util[busiest].max(initial=0)), 4),
+                                      "demand_mbps": round(float(D[busiest].sum()), 6)}
+    report["links"] = links
+    return report, {rm.edges[i]: peaks[k] for k, i in enumerate(loaded.tolist())}
@@ -0,0 +1,422 @@
+from __future__ import annotations
+import os, socket, socketserver, threading, time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qsl
+import networkx as nx
+import numpy as np
+
+from .contingency import ContingencyModel, _without_edges, link_capacity_mbps
+from .incremental import ValidationState
+from .loadengine import aggregate_demands, edge_key, shortest_path_dag, _nx_path_edges, _unique_path_edges
+from .ndjson import dumps, _decode
+from .topology import path_weight
+from .validators import RULES
+
+# Long-running query service (the serve command): the topology is loaded once as a
+# ValidationState and kept current by re-scanning the config tree every few seconds and
+# applying changed configs incrementally. Queries are answered from it:
+#   path      src, dst[, fail]        the path plan-load routes src -> dst on
+#   load      [demands, ecmp, limit]  per-link load and overloads for a demand set
+#   findings  [rule, type, device, limit]
+#   what-if   fail[, demands, ecmp, paths]   a link failure's effect on loads and paths
+#   status, refresh [devices]
+# Shortest-path trees (per source) and routing models (per demand set) are kept in LRU
+# caches that are dropped whenever a config change touches the graph.
+# Transports: localhost HTTP (GET /path?src=..&dst=.., POST /<query> with a JSON body) and a
+# Unix socket taking one JSON object per line ({"q": "path", ...}) and answering one per line.
+
+QUERIES = ("path", "load", "findings", "what-if", "status", "refresh")
+DEFAULT_HTTP = "127.0.0.1:8470"
+FINDINGS_LIMIT = 1000
+
+class QueryError(ValueError):
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+class LRUCache:
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.data: "OrderedDict[Any, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, make):
+        v = self.data.get(key)
+        if v is not None:
+            self.hits += 1
+            self.data.move_to_end(key)
+            return v
+        self.misses += 1
+        v = self.data[key] = make()
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+        return v
+
+    def clear(self):
+        self.data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self.data), "max": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+def _pairs(pairs, what: str) -> List[Tuple[str, str]]:
+    # None, [[a, b], ...] or "a,b;c,d" (query strings) -> [(a, b), ...]
+    if pairs is None:
+        return []
+    if isinstance(pairs, str):
+        pairs = [p.split(",") for p in pairs.split(";") if p]
+    if not isinstance(pairs, list):
+        raise QueryError(f"{what} is a list of [a, b] pairs, not {pairs!r}")
+    for p in pairs:
+        if not isinstance(p, (list, tuple)) or len(p) != 2 or not all(isinstance(x, str) for x in p):
+            raise QueryError(f"{what} is a list of [a, b] pairs of names, not {p!r}")
+    return [tuple(p) for p in pairs]
+
+def _links(G: nx.Graph, fail) -> List[Tuple[str, str]]:
+    # fail (see _pairs) -> edge keys of G's links
+    out = []
+    for a, b in _pairs(fail, "fail"):
+        if not G.has_edge(a, b):
+            raise QueryError(f"no link {a}-{b}", 404)
+        out.append(edge_key(a, b))
+    return out
+
+def _devices(devices) -> Optional[List[str]]:
+    # None, [name, ...] or "a,b" (query strings)
+    if devices is None:
+        return None
+    if isinstance(devices, str):
+        devices = [d for d in devices.split(",") if d]
+    if not isinstance(devices, list) or not all(isinstance(d, str) for d in devices):
+        raise QueryError(f"devices is a list of device names, not {devices!r}")
+    return devices
+
+def _demands(q: Dict[str, Any], default) -> Tuple[Tuple[Tuple[str, str, float], ...], bool]:
+    demands = q.get("demands")
+    if demands is None:
+        if default is None:
+            raise QueryError("no demands given and the service was started without --traffic")
+        demands = default
+    elif not isinstance(demands, list):
+        raise QueryError(f"demands is a list of [src, dst, mbps], not {demands!r}")
+    out = []
+    for d in demands:
+        if isinstance(d, dict):
+            d = (d.get("src"), d.get("dst"), d.get("mbps"))
+        if (not isinstance(d, (list, tuple)) or len(d) != 3 or not isinstance(d[0], str)
+                or not isinstance(d[1], str) or isinstance(d[2], bool) or not isinstance(d[2], (int, float))):
+            raise QueryError(f"a demand is [src, dst, mbps] or {{src, dst, mbps}}, not {d!r}")
+        out.append((d[0], d[1], d[2]))
+    return tuple(out), _flag(q.get("ecmp", False))
+
+def _flag(v) -> bool:
+    return v in (True, 1, "1", "true", "yes")
+
+def _int(q: Dict[str, Any], key: str, default: Optional[int]) -> Optional[int]:
+    v = q.get(key, default)
+    try:
+        return None if v is None else int(v)
+    except (TypeError, ValueError):
+        raise QueryError(f"{key} must be an integer")
+
+def _mentions(x, device: str) -> bool:
+    if isinstance(x, str):
+        return x == device
+    if isinstance(x, dict):
+        return any(_mentions(v, device) for v in x.values())
+    if isinstance(x, (list, tuple)):
+        return any(_mentions(v, device) for v in x)
+    return False
+
+class TopologyService:
+    def __init__(self, state: ValidationState, traffic=None, cache_size: int = 256):
+        self.state = state
+        self.traffic = traffic  # default demand set for load / what-if
+        self.lock = threading.RLock()  # queries read G while refresh patches it
+        self.scanning = threading.Lock()
+        self.version = 1
+        self.trees = LRUCache(cache_size)  # src -> shortest_path_dag
+        self.models = LRUCache(max(cache_size // 16, 4))  # (demands, ecmp) -> ContingencyModel
+        self.loads = LRUCache(max(cache_size // 16, 4))  # (demands, ecmp) -> load answer
+        self.started = time.time()
+        self.refreshed: Optional[float] = None
+        self.queries = 0
+        self.errors: List[Dict[str, str]] = []  # configs that failed to parse on the last refresh
+        self._halt = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    @property
+    def G(self) -> nx.Graph:
+        return self.state.G
+
+    def refresh(self, only: Optional[List[str]] = None) -> Dict[str, Any]:
+        # re-read changed configs; the lock is only held while they are applied
+        with self.scanning:
+            t0 = time.perf_counter()
+            errors = []
+            changes = self.state.scan(only=only, errors=errors)
+            self.errors = errors
+            out = {"changed_devices": sorted(changes), "added": 0, "resolved": 0, "version": self.version}
+            if changes:
+                with self.lock:
+                    res = self.state.apply(changes)
+                    self.version += 1
+                    if res["graph_changed"]:
+                        for c in (self.trees, self.models, self.loads):
+                            c.clear()
+                out.update(added=len(res["added"]), resolved=len(res["resolved"]), version=self.version,
+                           graph_changed=res["graph_changed"])
+            self.refreshed = time.time()
+            out["seconds"] = round(time.perf_counter() - t0, 6)
+            out["errors"] = errors
+            return out
+
+    def watch(self, interval: float, on_change=None):
+        # poll the config tree every `interval` seconds in a daemon thread
+        def run():
+            while not self._halt.wait(interval):
+                try:
+                    res = self.refresh()
+                except Exception as e:  # keep serving the last good topology
+                    res = {"changed_devices": [], "errors": [{"path": self.state.conf_root, "error": repr(e)}]}
+                if on_change is not None and (res["changed_devices"] or res["errors"]):
+                    on_change(res)
+        self._watcher = threading.Thread(target=run, name="conf-watch", daemon=True)
+        self._watcher.start()
+
+    def close(self):
+        self._halt.set()
+        if self._watcher is not None:
+            self._watcher.join()
+
+    def _node(self, name) -> str:
+        if not isinstance(name, str) or not name:
+            raise QueryError("src and dst are device names")
+        if name not in self.G:
+            raise QueryError(f"unknown device {name}", 404)
+        return name
+
+    def _tree(self, src: str):
+        return self.trees.get(src, lambda: shortest_path_dag(self.G, src, path_weight(self.G)))
+
+    def _model(self, demands, ecmp: bool) -> ContingencyModel:
+        def make():
+            flows, demand = aggregate_demands(demands)
+            return ContingencyModel(self.G, flows, demand, ecmp=ecmp)
+        return self.models.get((demands, ecmp), make)
+
+    def _path(self, G: nx.Graph, src: str, dst: str, tree) -> Dict[str, Any]:
+        # the path plan-load (without --ecmp) sends src -> dst over
+        dist, sigma, preds = tree
+        if dst not in dist:
+            return {"src": src, "dst": dst, "reachable": False}
+        if sigma[dst] == 1:
+            hops = _unique_path_edges(preds, dst)[::-1]
+        else:
+            hops = _nx_path_edges(G, src, dst, path_weight(G))
+        return {"src": src, "dst": dst, "reachable": True, "path": [src] + [v for _, v in hops],
+                "cost": dist[dst], "equal_cost_paths": sigma[dst],
+                "links": [{"a": u, "b": v, "network": G[u][v].get("network", ""),
+                           "capacity_mbps": link_capacity_mbps(G, u, v)} for u, v in hops]}
+
+    def path(self, q: Dict[str, Any]) -> Dict[str, Any]:
+        src, dst = self._node(q.get("src")), self._node(q.get("dst"))
+        failed = _links(self.G, q.get("fail"))
+        if not failed:
+            return self._path(self.G, src, dst, self._tree(src))
+        with _without_edges(self.G, failed) as H:
+            return dict(self._path(H, src, dst, shortest_path_dag(H, src, path_weight(H))),
+                        failed=[list(e) for e in failed])
+
+    def load(self, q: Dict[str, Any]) -> Dict[str, Any]:
+        demands, ecmp = _demands(q, self.traffic)
+        limit = _int(q, "limit", None)
+        res = self.loads.get((demands, ecmp), lambda: self._load(self._model(demands, ecmp)))
+        return dict(res, links=res["links"][:limit]) if limit is not None else res
+
+    def _load(self, m: ContingencyModel) -> Dict[str, Any]:
+        cap = m.capacity
+        util = np.divide(m.base, cap, out=np.zeros_like(m.base), where=cap > 0)
+        links = [{"a": a, "b": b, "load_mbps": round(float(m.base[i]), 6), "capacity_mbps": int(cap[i]),
+                  "utilization": round(float(util[i]), 4) if cap[i] else None}
+                 for i, (a, b) in enumerate(m.rm.edges) if m.base[i] > 0]
+        links.sort(key=lambda l: -(l["utilization"] if l["utilization"] is not None else l["load_mbps"]))
+        routed = np.bincount(m.rm.cols, minlength=len(m.flows)) > 0
+        return {"flows": len(m.flows), "demand_mbps": float(m.demand.sum()), "ecmp": m.ecmp,
+                "loaded_links": len(links), "overloaded": [l for l in links if l["load_mbps"] > l["capacity_mbps"]],
+                "unrouted": [[s, d, float(m.demand[j])] for j, (s, d) in enumerate(m.flows)
+                             if not routed[j] and s != d],
+                "links": links}
+
+    def what_if(self, q: Dict[str, Any]) -> Dict[str, Any]:
+        failed = _links(self.G, q.get("fail"))
+        if not failed:
+            raise QueryError("what-if needs fail: [[a, b], ...]")
+        out: Dict[str, Any] = {"failed": [list(e) for e in failed]}
+        G = self.G
+        with _without_edges(G, failed) as H:
+            split = []
+            for a, b in failed:
+                if not nx.has_path(H, a, b):
+                    side = min(nx.node_connected_component(H, a), nx.node_connected_component(H, b), key=len)
+                    split.append({"link": [a, b], "isolated": sorted(side)})
+            out["partitions"] = split
+            paths = _pairs(q.get("paths"), "paths")
+            if paths:
+                out["paths"] = []
+                for p in paths:
+                    src, dst = self._node(p[0]), self._node(p[1])
+                    after = self._path(H, src, dst, shortest_path_dag(H, src, path_weight(H)))
+                    out["paths"].append({"src": src, "dst": dst, "after": after})
+        for p in out.get("paths", ()):
+            p["before"] = self._path(G, p["src"], p["dst"], self._tree(p["src"]))
+        if q.get("demands") is not None or self.traffic is not None:
+            demands, ecmp = _demands(q, self.traffic)
+            m = self._model(demands, ecmp)
+            rows, new, lost = m.scenario(tuple(sorted(m.index[e] for e in failed)))
+            changed, overloads = [], []
+            for i, load in zip(rows.tolist(), new.tolist()):
+                base, cap = float(m.base[i]), float(m.capacity[i])
+                if round(load, 6) == round(base, 6):
+                    continue
+                (a, b) = m.rm.edges[i]
+                link = {"a": a, "b": b, "before_mbps": round(base, 6), "after_mbps": round(load, 6),
+                        "capacity_mbps": int(cap)}
+                changed.append(link)
+                if load > cap >= base:
+                    overloads.append(link)
+            changed.sort(key=lambda l: -abs(l["after_mbps"] - l["before_mbps"]))
+            out.update(ecmp=ecmp, changed_links=changed, new_overloads=overloads, unrouted_mbps=lost)
+        return out
+
+    def findings(self, q: Dict[str, Any]) -> Dict[str, Any]:
+        rule, kind, device = q.get("rule"), q.get("type"), q.get("device")
+        limit = _int(q, "limit", FINDINGS_LIMIT)
+        if rule is not None and rule not in RULES:
+            raise QueryError(f"unknown rule {rule}; one of {', '.join(RULES)}")
+        found = [f for name in ([rule] if rule else RULES) for f in self.state.findings.get(name, ())
+                 if (kind is None or f.get("type") == kind) and (device is None or _mentions(f, device))]
+        return {"total": len(found), "findings": found[:limit]}
+
+    def status(self, q: Dict[str, Any]) -> Dict[str, Any]:
+        G = self.G
+        return {"version": self.version, "conf": self.state.conf_root, "mode": self.state.mode,
+                "devices": len(self.state.devices), "nodes": G.number_of_nodes(), "links": G.number_of_edges(),
+                "findings": sum(len(f) for f in self.state.findings.values()),
+                "uptime_seconds": round(time.time() - self.started, 3), "refreshed": self.refreshed,
+                "queries": self.queries, "parse_errors": self.errors,
+                "caches": {"trees": self.trees.stats(), "models": self.models.stats(), "loads": self.loads.stats()}}
+
+    def handle(self, q: Dict[str, Any]) -> Dict[str, Any]:
+        if not isinstance(q, dict):
+            raise QueryError("a query is a JSON object")
+        name = q.get("q")
+        if name == "refresh":
+            return self.refresh(only=_devices(q.get("devices")))
+        fn = {"path": self.path, "load": self.load, "findings": self.findings,
+              "what-if": self.what_if, "status": self.status}.get(name)
+        if fn is None:
+            raise QueryError(f"unknown query {name!r}; one of {', '.join(QUERIES)}", 404)
+        with self.lock:
+            self.queries += 1
+            return fn(q)
+
+    def respond(self, q) -> Tuple[int, bytes]:
+        # -> (HTTP status, JSON body)
+        try:
+            return 200, dumps(self.handle(q))
+        except QueryError as e:
+            return e.status, dumps({"error": str(e)})
+        except Exception as e:
+            return 500, dumps({"error": repr(e)})
+
+class _HTTPHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so clients can reuse one connection
+    disable_nagle_algorithm = True  # headers and body go out as two writes
+
+    def _send(self, status: int, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        self._send(*self.server.service.respond(dict(parse_qsl(url.query), q=url.path.strip("/"))))
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        try:
+            q = _decode(body) if body.strip() else {}
+        except ValueError as e:
+            self._send(400, dumps({"error": f"bad JSON: {e}"}))
+            return
+        self._send(*self.server.service.respond(dict(q, q=url.path.strip("/")) if isinstance(q, dict) else q))
+
+    def log_message(self, format, *args):
+        pass  # thousands of queries a minute
+
+class _LineHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        service = self.server.service
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                q = _decode(line)
+            except ValueError as e:
+                body = dumps({"error": f"bad JSON: {e}"})
+            else:
+                body = service.respond(q)[1]
+            self.wfile.write(body + b"\n")
+            self.wfile.flush()
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+def http_server(service: TopologyService, address: str = DEFAULT_HTTP) -> ThreadingHTTPServer:
+    host, _, port = address.rpartition(":")
+    try:
+        srv = _HTTPServer((host or "127.0.0.1", int(port)), _HTTPHandler)
+    except ValueError:
+        raise ValueError(f"--http takes HOST:PORT, not {address!r}")
+    srv.service = service
+    return srv
+
+def unix_server(service: TopologyService, path: str) -> socketserver.BaseServer:
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX)
+        try:
+            probe.connect(path)
+        except OSError:
+            os.unlink(path)  # left over from a service that is gone
+        else:
+            raise ValueError(f"{path} is in use by a running service")
+        finally:
+            probe.close()
+    srv = _UnixServer(path, _LineHandler)
+    srv.service = service
+    return srv
+
+class SocketClient:
+    # one persistent connection to the Unix socket; query() is one round trip
+    def __init__(self, path: str):
+        self.sock = socket.socket(socket.AF_UNIX)
+        self.sock.connect(path)
+        self.f = self.sock.makefile("rwb")
+
+    def query(self, q: Dict[str, Any]) -> Dict[str, Any]:
+        self.f.write(dumps(q) + b"\n")
+        self.f.flush()
+        return _decode(self.f.readline())
+
+    def close(self):
+        self.f.close()
+        self.sock.close()
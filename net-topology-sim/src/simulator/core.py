@@ -1,112 +1,355 @@
 from __future__ import annotations
 import threading, queue, time, random, json
-from typing import Dict, Any, Tuple
+from collections import deque
+from typing import Dict, Any, List, Tuple, Optional
 import networkx as nx
 from .messages import Message
+from .logsink import LogOptions, SimLogger, make_logger
+from .ospf import OSPFArea, OSPFRouter, ospf_report
+from .metrics import MetricsSampler, snapshot
+from ..topology import is_segment
 
-class Node(threading.Thread):
-    def __init__(self, name: str, inbox: "queue.Queue[Message]", links: Dict[str, "queue.Queue[Message]"], pause_evt: threading.Event, log_path: str):
+LINK_DELAY = 0.001          # propagation delay per link, seconds
+LINK_DEPTH = 1000           # messages queued per link direction before drops
+LINK_BATCH = 64             # messages a receiver takes from one link per round
+DEFAULT_BANDWIDTH = 1000000 # kbps, for edges without a bandwidth attribute
+DEFAULT_MTU = 1500
+FRAGMENT_HEADER_BYTES = 20
+
+class Link:
+    # One direction of an edge. The sending node computes when the message is fully
+    # serialized (size / bandwidth, after whatever is still being sent) plus the
+    # propagation delay, and appends it; the receiving node takes due messages in
+    # batches. One sender and one receiver per link, so the deque needs no lock.
+    __slots__ = ("src", "dst", "bandwidth", "mtu", "delay", "depth", "queue", "wake", "busy_until",
+                 "enqueued", "delivered", "dropped", "max_depth", "bytes", "fragmented")
+
+    def __init__(self, src: str, dst: str, wake: threading.Event, bandwidth: int = 0, mtu: int = 0,
+                 delay: float = LINK_DELAY, depth: int = LINK_DEPTH):
+        self.src = src
+        self.dst = dst
+        self.bandwidth = int(bandwidth or DEFAULT_BANDWIDTH)  # kbps, as on the graph edges
+        self.mtu = int(mtu or DEFAULT_MTU)
+        self.delay = delay
+        self.depth = depth
+        self.queue: deque = deque()  # (arrival time, message)
+        self.wake = wake             # receiver's wake-up event
+        self.busy_until = 0.0
+        self.enqueued = self.delivered = self.dropped = self.max_depth = self.bytes = self.fragmented = 0
+
+    def put_nowait(self, message: Message):
+        n = len(self.queue)
+        if n >= self.depth:
+            self.dropped += 1
+            raise queue.Full
+        size = message.size
+        if size > self.mtu:
+            frags = -(-size // self.mtu)
+            size += (frags - 1) * FRAGMENT_HEADER_BYTES
+            self.fragmented += 1
+        now = time.time()
+        self.busy_until = max(now, self.busy_until) + size * 8 / (self.bandwidth * 1000.0)
+        self.queue.append((self.busy_until + self.delay, message))
+        self.enqueued += 1
+        self.bytes += size
+        if n + 1 > self.max_depth:
+            self.max_depth = n + 1
+        if not self.wake.is_set():
+            self.wake.set()
+
+    def take(self, now: float, limit: int) -> List[Message]:
+        q = self.queue
+        out = []
+        while q and q[0][0] <= now and len(out) < limit:
+            out.append(q.popleft()[1])
+        self.delivered += len(out)
+        return out
+
+    def next_arrival(self) -> Optional[float]:
+        q = self.queue
+        return q[0][0] if q else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"src": self.src, "dst": self.dst, "bandwidth_kbps": self.bandwidth, "mtu": self.mtu,
+                "enqueued": self.enqueued, "delivered": self.delivered, "dropped": self.dropped,
+                "max_depth": self.max_depth, "bytes": self.bytes, "fragmented": self.fragmented,
+                "in_flight": len(self.queue)}
+
+class Segment:
+    # Shared LAN (segment node from build_topology(mode="segment")): whatever one member
+    # puts on the wire is copied onto the segment's link to every other member.
+    def __init__(self, name: str):
+        self.name = name
+        self.members: Dict[str, Link] = {}
+        self.dropped = 0
+        self.lock = threading.Lock()  # every member sends here; Links expect a single sender
+
+    def put_nowait(self, message: Message):
+        if message.dst != self.name:  # receivers tell the arrival link by dst (OSPF flooding)
+            message = Message(message.kind, message.src, self.name, message.payload, message.size)
+        full = False
+        with self.lock:
+            for m, link in list(self.members.items()):
+                if m == message.src:
+                    continue
+                try:
+                    link.put_nowait(message)
+                except queue.Full:
+                    self.dropped += 1
+                    full = True
+        if full:
+            raise queue.Full
+
+class NodeBehavior:
+    # protocol logic shared by the threaded Node and the discrete-event DESNode;
+    # subclasses provide name, log(text, kind) and broadcast_neighbors(), and for OSPF
+    # send(neighbor, msg), clock() and schedule_spf(delay)
+    ospf: Optional[OSPFRouter] = None
+
+    def hello(self):
+        self.broadcast_neighbors(Message(kind="HELLO", src=self.name, dst="*", payload="hi"))
+
+    def handle(self, msg: Message):
+        if msg.kind == "HELLO":
+            self.log(f"HELLO from {msg.src}", "HELLO")
+        elif msg.kind == "PAUSE":
+            self.log("Received PAUSE", "PAUSE")
+        elif msg.kind == "RESUME":
+            self.log("Received RESUME", "RESUME")
+        elif msg.kind == "ARP":
+            self.log(f"ARP from {msg.src}: who-has {msg.payload}", "ARP")
+        elif msg.kind == "LSU" and self.ospf is not None:
+            self.ospf.receive(msg)
+        elif msg.kind == "SPF" and self.ospf is not None:
+            self.ospf.run_spf()
+        else:
+            self.log(f"Got {msg.kind} from {msg.src}", msg.kind)
+
+class Node(NodeBehavior, threading.Thread):
+    def __init__(self, name: str, links: Dict[str, Any], pause_evt: threading.Event, logger: Optional[SimLogger],
+                 batch: int = LINK_BATCH, pause_events: Optional[List[Dict[str, Any]]] = None):
         super().__init__(daemon=True)
         self.name = name
-        self.inbox = inbox
-        self.links = links
+        self.links = links            # neighbor -> outgoing Link (or Segment)
+        self.inbound: List[Link] = []  # links towards this node, fixed after Simulation.__init__
+        self.wake = threading.Event()
+        self.batch = batch
         self.pause_evt = pause_evt
         self.running = True
-        self.log_path = log_path
+        self.logger = logger
+        self.control: deque = deque()  # (OSPF call, args) for link changes, run by the node thread
+        self.spf_due: Optional[float] = None
+        self.handled = 0       # messages taken off inbound links
+        self.dropped = 0       # sends refused by a full link (send() also runs on the main thread)
+        self.drop_lock = threading.Lock()
+        self.pause_events = pause_events if pause_events is not None else []  # the simulation's requests
+        self.acted: Dict[int, float] = {}  # index into pause_events -> when this thread acted on it
+        self.acked = 0  # pause_events before this index are in acted
 
-    def log(self, msg: str):
-        line = f"[{time.strftime('%H:%M:%S')}] {self.name}: {msg}"
-        print(line)
-        with open(self.log_path, "a") as f:
-            f.write(line + "\n")
+    def clock(self) -> float:
+        return time.time()
+
+    def schedule_spf(self, delay: float):
+        if self.spf_due is None:
+            self.spf_due = time.time() + delay
+
+    def log(self, msg: str, kind: str = "NODE"):
+        if self.logger is not None:
+            self.logger.log(time.time(), self.name, kind, msg)
 
     def send(self, neighbor: str, message: Message):
         if neighbor in self.links:
             try:
                 self.links[neighbor].put_nowait(message)
             except queue.Full:
-                self.log(f"LINK QUEUE FULL to {neighbor}, dropping {message.kind}")
+                with self.drop_lock:
+                    self.dropped += 1
+                self.log(f"LINK QUEUE FULL to {neighbor}, dropping {message.kind}", "DROP")
+
+    def ack(self, kind: str):
+        # this thread now acts on the latest `kind` request; requests it missed in between
+        # (a pause and resume while it was busy) count as handled now too
+        ev, now = self.pause_events, time.time()
+        last = max((j for j in range(self.acked, len(ev)) if ev[j]["kind"] == kind), default=None)
+        if last is None:
+            return
+        for j in range(self.acked, last + 1):
+            self.acted[j] = now
+        self.acked = last + 1
 
     def broadcast_neighbors(self, message: Message):
         for n in list(self.links.keys()):
             self.send(n, message)
 
+    def receive(self, now: float) -> float:
+        # round-robin over inbound links, at most `batch` messages from each per round, so
+        # one chatty neighbor cannot starve the others; returns the next arrival time
+        busy = True
+        while busy:
+            busy = False
+            for link in self.inbound:
+                msgs = link.take(now, self.batch)
+                self.handled += len(msgs)
+                for msg in msgs:
+                    self.handle(msg)
+                if len(msgs) == self.batch:
+                    busy = True
+        nxt = [t for t in (link.next_arrival() for link in self.inbound) if t is not None]
+        return min(nxt) if nxt else now + 0.1
+
     def run(self):
         self.log("Node started")
+        if self.ospf is not None:
+            self.ospf.start()
         hello_timer = time.time()
         while self.running:
             # Pause support
-            while self.pause_evt.is_set():
-                time.sleep(0.05)
+            if self.pause_evt.is_set():
+                self.ack("pause")
+                while self.pause_evt.is_set() and self.running:
+                    time.sleep(0.05)
+                self.ack("resume")
+
+            # Link changes and SPF timer (OSPF)
+            while self.control:
+                fn, args = self.control.popleft()
+                fn(*args)
+            if self.spf_due is not None and time.time() >= self.spf_due:
+                self.spf_due = None
+                self.ospf.run_spf()
 
             # Periodic HELLO (discovery)
             if time.time() - hello_timer >= 1.0:
-                self.broadcast_neighbors(Message(kind="HELLO", src=self.name, dst="*", payload="hi"))
+                self.hello()
                 hello_timer = time.time()
 
-            # Process inbox
-            try:
-                msg: Message = self.inbox.get(timeout=0.1)
-                if msg.kind == "HELLO":
-                    self.log(f"HELLO from {msg.src}")
-                elif msg.kind == "PAUSE":
-                    self.log("Received PAUSE")
-                elif msg.kind == "RESUME":
-                    self.log("Received RESUME")
-                elif msg.kind == "ARP":
-                    self.log(f"ARP from {msg.src}: who-has {msg.payload}")
-                else:
-                    self.log(f"Got {msg.kind} from {msg.src}")
-            except queue.Empty:
-                pass
+            # Process due messages, then sleep until the next arrival, HELLO or new traffic
+            self.wake.clear()
+            now = time.time()
+            nxt = min(self.receive(now), hello_timer + 1.0, now + 0.1, self.spf_due or now + 0.1)
+            if nxt > now:
+                self.wake.wait(nxt - now)
 
         self.log("Node stopped")
 
 class Simulation:
-    def __init__(self, G: nx.Graph, logs_dir: str):
+    def __init__(self, G: nx.Graph, logs_dir: Optional[str], log: Optional[LogOptions] = None,
+                 link_delay: float = LINK_DELAY, link_depth: int = LINK_DEPTH, link_batch: int = LINK_BATCH,
+                 ospf: Optional[str] = None, full_spf: bool = False, metrics_interval: float = 0.0,
+                 metrics_path: Optional[str] = None):
+        # metrics_interval > 0: sample inbox depths and message rates that often (and
+        # rewrite metrics_path with the snapshot); metrics() works without it too
         self.G = G.copy()
-        self.logs_dir = logs_dir
+        self.logs_dir = logs_dir  # None disables per-node log files
+        self.logger = make_logger(logs_dir, log)
         self.pause_evt = threading.Event()
-        self.queues: Dict[str, queue.Queue] = {}
         self.nodes: Dict[str, Node] = {}
+        self.segments: Dict[str, Segment] = {}
         self.links: Dict[tuple, bool] = {}  # link up/down
+        self.wires: Dict[tuple, Link] = {}  # (src, dst) -> Link, both directions of every edge
+        self.link_counters: List[Dict[str, Any]] = []  # filled by stop()
+        self.ospf_routers: Dict[str, OSPFRouter] = {}
+        self.topology_event: Optional[float] = None  # time of the last fail_link/restore
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self.pause_events: List[Dict[str, Any]] = []  # {"kind": "pause"/"resume", "at"}
+        self.metrics_sampler = MetricsSampler(self, metrics_interval, metrics_path) if metrics_interval > 0 else None
 
-        # Create per-node inbox and Node thread
+        # Node threads (segments are passive fan-out, no thread)
         for n in self.G.nodes():
-            inbox = queue.Queue(maxsize=1000)
-            self.queues[n] = inbox
+            if is_segment(self.G, n):
+                self.segments[n] = Segment(n)
+                continue
             self.nodes[n] = Node(
                 name=n,
-                inbox=inbox,
                 links={},  # filled later
                 pause_evt=self.pause_evt,
-                log_path=f"{self.logs_dir}/{n}.log"
+                logger=self.logger,
+                batch=link_batch,
+                pause_events=self.pause_events
             )
 
-        # Create link FIFOs (two directed queues for each undirected edge)
+        # One Link per direction, carrying the edge's bandwidth and mtu; a segment only
+        # has links towards its members (it copies onto them, see Segment)
         for u,v in self.G.edges():
+            d = self.G[u][v]
+            for a, b in ((u, v), (v, u)):
+                if b in self.nodes:
+                    link = Link(a, b, self.nodes[b].wake, d.get("bandwidth", 0), d.get("mtu", 0),
+                                delay=link_delay, depth=link_depth)
+                    self.wires[(a, b)] = link
+                    self.nodes[b].inbound.append(link)
             self.links[tuple(sorted((u,v)))] = True  # up
-            # link uses receiver's inbox
-            self.nodes[u].links[v] = self.queues[v]
-            self.nodes[v].links[u] = self.queues[u]
+            self._connect(u, v)
+
+        # ospf: "cold" floods from empty databases once the nodes start, "warm" starts converged
+        if ospf:
+            self.area = OSPFArea(self.G)
+            for n in self.area.names:
+                if n in self.nodes:
+                    self.nodes[n].ospf = self.ospf_routers[n] = OSPFRouter(self.nodes[n], self.area, full_spf)
+            if ospf == "warm":
+                self.area.converge(self.ospf_routers)
+
+    def _connect(self, u: str, v: str):
+        # sender uses its Link towards the receiver, or the segment when one side is a LAN
+        if u in self.segments:
+            u, v = v, u
+        if v in self.segments:
+            self.nodes[u].links[v] = self.segments[v]
+            self.segments[v].members[u] = self.wires[(v, u)]
+        else:
+            self.nodes[u].links[v] = self.wires[(u, v)]
+            self.nodes[v].links[u] = self.wires[(v, u)]
+
+    def _disconnect(self, u: str, v: str):
+        for a, b in ((u, v), (v, u)):
+            if a in self.nodes:
+                self.nodes[a].links.pop(b, None)
+            if a in self.segments:
+                self.segments[a].members.pop(b, None)
 
     def start(self):
+        self.started_at = time.time()
         for n in self.nodes.values():
             n.start()
+        if self.metrics_sampler is not None:
+            self.metrics_sampler.start()
+
+    def run_for(self, seconds: float):
+        # real time: the node threads do the work
+        time.sleep(seconds)
 
     def stop(self):
         for n in self.nodes.values():
             n.running = False
+            n.wake.set()
         for n in self.nodes.values():
-            n.join(timeout=1.0)
+            n.join()
+        self.stopped_at = time.time()
+        if self.metrics_sampler is not None:
+            self.metrics_sampler.stop()
+        self.link_counters = self.link_stats()
+        # after the joins no node can log any more; write out everything still queued
+        if self.logger is not None:
+            self.logger.close()
+
+    def link_stats(self) -> List[Dict[str, Any]]:
+        return [l.stats() for l in self.wires.values()]
+
+    def metrics(self, per_node: bool = True) -> Dict[str, Any]:
+        # safe to call from another thread while the simulation runs
+        return snapshot(self, self.metrics_sampler, per_node)
 
     def pause(self):
+        self.pause_events.append({"kind": "pause", "at": time.time()})
         self.pause_evt.set()
         # also send PAUSE messages (optional)
         for n in self.nodes.values():
             n.send("*", Message(kind="PAUSE", src="SIM", dst="*"))
 
     def resume(self):
+        self.pause_events.append({"kind": "resume", "at": time.time()})
         self.pause_evt.clear()
         for n in self.nodes.values():
             n.send("*", Message(kind="RESUME", src="SIM", dst="*"))
@@ -117,11 +360,23 @@ class Simulation:
             return False
         # Simulate by disconnecting send maps
         if down:
-            if b in self.nodes[a].links: del self.nodes[a].links[b]
-            if a in self.nodes[b].links: del self.nodes[b].links[a]
+            self._disconnect(a, b)
         else:
             # restore
-            self.nodes[a].links[b] = self.queues[b]
-            self.nodes[b].links[a] = self.queues[a]
+            self._connect(a, b)
         self.links[key] = not down
+        self.topology_event = time.time()
+        for x, y in ((a, b), (b, a)):
+            if x in self.ospf_routers:
+                self.nodes[x].control.append((self.ospf_routers[x].link_changed, (y, not down)))
+                self.nodes[x].wake.set()
+            if x in self.segments and self.ospf_routers and x in self.area.segments:
+                attached = list(self.segments[x].members)
+                dr = self.area.dr(x, attached, y)
+                if dr is not None:
+                    self.nodes[dr].control.append((self.ospf_routers[dr].segment_changed, (x, attached, not down)))
+                    self.nodes[dr].wake.set()
         return True
+
+    def ospf_report(self, routes: bool = True) -> Dict[str, Any]:
+        return ospf_report(self.ospf_routers, self.topology_event, routes)
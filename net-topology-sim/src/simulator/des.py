@@ -0,0 +1,382 @@
+from __future__ import annotations
+import hashlib, heapq, os, pickle, random
+from collections import deque
+from dataclasses import replace
+from typing import Dict, Any, List, Optional
+import networkx as nx
+from .messages import Message
+from .core import NodeBehavior
+from .logsink import LogOptions, make_logger
+from .ospf import OSPFArea, OSPFRouter, ospf_report
+from ..topology import is_segment
+
+# Single-process discrete-event engine: one priority queue of (virtual time, seq, event),
+# no threads, no polling. Runs as fast as the events can be processed.
+# Runs are deterministic: the seed fixes the HELLO stagger and events at the same instant run
+# in the order they were scheduled. checkpoint() saves everything but the logger (nodes and
+# OSPF state, the heap with its timers and in-flight deliveries, the clock, the RNG) and
+# restore() continues from it, any number of times. The external actions (fail_link,
+# pause, resume, inject) are kept in a journal with their times, so replay() from a cold
+# start reproduces a checkpoint; digest() compares the two.
+
+HELLO_INTERVAL = 1.0
+TICK_RESOLUTION = 0.001  # HELLO timers are quantized to this; nodes sharing a slot fire as one event
+TICK, DELIVER = 0, 1
+LOG_FLUSH_LINES = 100000  # records buffered before the logger writes a batch
+CHECKPOINT_FORMAT = 1
+
+def vtime(t: float) -> str:
+    m, s = divmod(t, 60.0)
+    h, m = divmod(int(m), 60)
+    return f"{h:02d}:{m:02d}:{s:06.3f}"
+
+def _no_log(msg: str, kind: str = "NODE"):
+    pass
+
+class DESNode(NodeBehavior):
+    def __init__(self, name: str, sim: "DESSimulation"):
+        self.name = name
+        self.sim = sim
+        self.links: Dict[str, str] = {}  # neighbor -> neighbor (device or segment name)
+        self.receivers: Optional[List[str]] = None  # broadcast fan-out, rebuilt on link changes
+        if not sim.logging:
+            self.log = _no_log  # skip formatting entirely on the hot path
+
+    def log(self, msg: str, kind: str = "NODE"):
+        self.sim.logger.log(self.sim.now, self.name, kind, msg)
+
+    def send(self, neighbor: str, message: Message):
+        if neighbor in self.links:
+            self.sim._transmit(self.name, neighbor, message)
+
+    def broadcast_neighbors(self, message: Message):
+        if self.receivers is None:
+            self.receivers = self.sim._fanout(self.name)
+        sim = self.sim
+        if sim.link_delay:
+            for r in self.receivers:
+                sim._push(sim.now + sim.link_delay, DELIVER, r, message)
+            return
+        ready = sim.ready
+        for r in self.receivers:
+            ready.append((r, message))
+
+    def clock(self) -> float:
+        return self.sim.now
+
+    def schedule_spf(self, delay: float):
+        self.sim._push(self.sim.now + delay, DELIVER, self.name, Message("SPF", self.name, self.name))
+
+class DESSimulation:
+    # Same surface as core.Simulation (start/stop/pause/resume/fail_link/run_for),
+    # but time is virtual: run_for(60) simulates a minute as fast as possible.
+    def __init__(self, G: nx.Graph, logs_dir: Optional[str], seed: int = 0,
+                 hello_interval: float = HELLO_INTERVAL, echo: bool = True,
+                 tick_resolution: float = TICK_RESOLUTION, local_nodes=None, log: Optional[LogOptions] = None,
+                 link_delay: float = 0.0, ospf: Optional[str] = None, full_spf: bool = False):
+        # local_nodes: run only these devices (one shard of a ShardedSimulation); messages
+        # for every other device are collected in self.outbox as (name, msg, send time)
+        self.G = G.copy()
+        self._set_logger(logs_dir, log or LogOptions(quiet=not echo))
+        # what replay() needs to rebuild this simulation from the graph
+        self.params = {"seed": seed, "hello_interval": hello_interval, "tick_resolution": tick_resolution,
+                       "link_delay": link_delay, "ospf": ospf, "full_spf": full_spf}
+        self.hello_interval = hello_interval
+        self.tick_resolution = tick_resolution
+        self.slots: List[List[str]] = []  # timer slot -> nodes whose HELLO fires in it
+        self.rng = random.Random(seed)
+        self.now = 0.0
+        self.paused = False
+        self.started = False
+        self.heap: List[tuple] = []
+        self.seq = 0
+        self.ready: deque = deque()  # zero-delay deliveries at the current instant
+        self.events = 0
+        self.nodes: Dict[str, DESNode] = {}
+        self.segments: Dict[str, Dict[str, bool]] = {}  # segment -> ordered member set
+        self.links: Dict[tuple, bool] = {}  # link up/down
+        self.outbox: List[tuple] = []
+        self.link_delay = link_delay  # 0: deliveries happen at the sending instant
+        self.topology_event: Optional[float] = None  # time of the last fail_link/restore
+        self.ospf_routers: Dict[str, OSPFRouter] = {}
+        # (time, action, args) of the external actions; shards get their input from the controller
+        self.journal: Optional[List[tuple]] = [] if local_nodes is None else None
+
+        for n in self.G.nodes():
+            if is_segment(self.G, n):
+                self.segments[n] = {}
+            elif local_nodes is None or n in local_nodes:
+                self.nodes[n] = DESNode(n, self)
+        for u, v in self.G.edges():
+            self.links[tuple(sorted((u, v)))] = True
+            self._connect(u, v)
+        # ospf: "cold" floods from empty databases on start(), "warm" starts converged
+        if ospf:
+            self.area = OSPFArea(self.G)
+            for n in self.area.names:
+                if n in self.nodes:
+                    self.nodes[n].ospf = self.ospf_routers[n] = OSPFRouter(self.nodes[n], self.area, full_spf)
+            if ospf == "warm":
+                self.area.converge(self.ospf_routers)
+
+    def _set_logger(self, logs_dir: Optional[str], log: LogOptions):
+        self.logs_dir = logs_dir  # None disables per-node log files
+        # single-threaded, so no writer thread: the logger flushes every LOG_FLUSH_LINES records
+        log = replace(log, flush_lines=max(log.flush_lines, LOG_FLUSH_LINES))
+        self.logger = make_logger(logs_dir, log, stamp=vtime, background=False)
+        self.logging = self.logger is not None
+
+    def _record(self, action: str, *args):
+        if self.journal is not None:
+            self.journal.append((self.now, action, args))
+
+    def _fanout(self, name: str) -> List[str]:
+        out = []
+        for n in self.nodes[name].links:
+            if n in self.segments:
+                out.extend(m for m in self.segments[n] if m != name)
+            else:
+                out.append(n)
+        return out
+
+    def _touch(self, u: str, v: str):
+        # drop cached fan-outs that may include the changed link
+        for n in (u, v):
+            for m in (self.segments[n] if n in self.segments else (n,)):
+                if m in self.nodes:
+                    self.nodes[m].receivers = None
+
+    def _connect(self, u: str, v: str):
+        self._touch(u, v)
+        if u in self.segments:
+            u, v = v, u
+        if v in self.segments:
+            if u in self.nodes:
+                self.nodes[u].links[v] = v
+            self.segments[v][u] = True
+        else:
+            if u in self.nodes:
+                self.nodes[u].links[v] = v
+            if v in self.nodes:
+                self.nodes[v].links[u] = u
+
+    def _disconnect(self, u: str, v: str):
+        self._touch(u, v)
+        for a, b in ((u, v), (v, u)):
+            if a in self.nodes:
+                self.nodes[a].links.pop(b, None)
+            if a in self.segments:
+                self.segments[a].pop(b, None)
+
+    # --- event plumbing -------------------------------------------------
+    def _push(self, t: float, kind: int, name, msg: Optional[Message] = None):
+        # TICK events carry a timer slot index instead of a node name
+        self.seq += 1
+        heapq.heappush(self.heap, (t, self.seq, kind, name, msg))
+
+    def _transmit(self, src: str, neighbor: str, msg: Message):
+        dst = (neighbor,)
+        if neighbor in self.segments:
+            dst = [m for m in self.segments[neighbor] if m != src]
+            if msg.dst != neighbor:  # receivers tell the arrival link by dst (OSPF flooding)
+                msg = Message(msg.kind, msg.src, neighbor, msg.payload, msg.size)
+        if self.link_delay:
+            for m in dst:
+                self._push(self.now + self.link_delay, DELIVER, m, msg)
+        else:
+            self.ready.extend((m, msg) for m in dst)
+
+    def _drain(self):
+        ready, nodes = self.ready, self.nodes
+        popleft = ready.popleft
+        n = 0
+        while ready:
+            name, msg = popleft()
+            node = nodes.get(name)
+            if node is None:
+                self.outbox.append((name, msg, self.now))
+                continue
+            node.handle(msg)
+            n += 1
+        self.events += n
+
+    # --- public API ------------------------------------------------------
+    def start(self):
+        self.started = True
+        slots: Dict[int, List[str]] = {}
+        nslots = max(1, int(round(self.hello_interval / self.tick_resolution)))
+        for name, node in self.nodes.items():
+            node.log("Node started")
+            # stagger the first HELLO so nodes do not all fire at the same instant
+            slots.setdefault(self.rng.randrange(nslots), []).append(name)
+        for k in sorted(slots):
+            self.slots.append(slots[k])
+            self._push(self.now + (k + 1) * self.hello_interval / nslots, TICK, len(self.slots) - 1)
+        for r in self.ospf_routers.values():
+            r.start()
+        self._drain()
+
+    def run_until(self, t_end: float):
+        if self.paused:
+            # nothing runs while paused; overdue timers fire on resume
+            self.now = max(self.now, t_end)
+            return
+        heap, nodes = self.heap, self.nodes
+        while heap and heap[0][0] <= t_end:
+            t, _, kind, name, msg = heapq.heappop(heap)
+            if t > self.now:
+                self.now = t
+            if kind == TICK:
+                self.events += len(self.slots[name])
+                for n in self.slots[name]:
+                    nodes[n].hello()
+                self._push(self.now + self.hello_interval, TICK, name)
+            else:
+                node = nodes.get(name)
+                if node is None:
+                    self.outbox.append((name, msg, t))
+                    continue
+                self.events += 1
+                node.handle(msg)
+            self._drain()
+        self.now = max(self.now, t_end)
+
+    def run_for(self, seconds: float):
+        self.run_until(self.now + seconds)
+
+    def inject(self, dst: str, message: Message, at: Optional[float] = None):
+        # deliver an arbitrary message (e.g. an ARP) to a node, by default at the current instant
+        self._record("inject", dst, message, at)
+        self._push(self.now if at is None else max(at, self.now), DELIVER, dst, message)
+
+    def stop(self):
+        if not self.started:
+            return
+        self.started = False
+        for node in self.nodes.values():
+            node.log("Node stopped")
+        if self.logger is not None:
+            self.logger.close()
+
+    def pause(self):
+        self._record("pause")
+        for node in self.nodes.values():
+            node.handle(Message(kind="PAUSE", src="SIM", dst="*"))
+        self.paused = True
+
+    def resume(self):
+        self._record("resume")
+        self.paused = False
+        for node in self.nodes.values():
+            node.handle(Message(kind="RESUME", src="SIM", dst="*"))
+        # catch up on everything that fell due during the pause, at the resume instant
+        self.run_until(self.now)
+
+    def fail_link(self, a: str, b: str, down: bool = True):
+        key = tuple(sorted((a, b)))
+        if key not in self.links:
+            return False
+        self._record("fail_link", a, b, down)
+        if down:
+            self._disconnect(a, b)
+        else:
+            self._connect(a, b)
+        self.links[key] = not down
+        self.topology_event = self.now
+        for x, y in ((a, b), (b, a)):
+            if x in self.ospf_routers:
+                self.ospf_routers[x].link_changed(y, not down)
+            if x in self.segments and self.ospf_routers and x in self.area.segments:
+                dr = self.area.dr(x, self.segments[x], y)
+                if dr in self.ospf_routers:  # sharded: the shard that owns the DR
+                    self.ospf_routers[dr].segment_changed(x, self.segments[x], not down)
+        self._drain()
+        return True
+
+    def ospf_report(self, routes: bool = True) -> Dict[str, Any]:
+        return ospf_report(self.ospf_routers, self.topology_event, routes)
+
+    # --- checkpoints and replay ---------------------------------------------
+    def __getstate__(self):
+        # the logger holds open files and is not simulation state; restore() attaches a new one
+        state = self.__dict__.copy()
+        state["log_counts"] = dict(self.logger.counts) if self.logger is not None else {}
+        state["logger"] = None
+        state["logs_dir"] = None
+        return state
+
+    def checkpoint(self) -> bytes:
+        if not self.started:
+            raise ValueError("checkpoint needs a started simulation")
+        return pickle.dumps({"format": CHECKPOINT_FORMAT, "sim": self, "digest": self.digest()},
+                            protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def restore(cls, data: bytes, logs_dir: Optional[str], log: Optional[LogOptions] = None,
+                echo: bool = True) -> "DESSimulation":
+        # a running simulation at the checkpoint's time; every restore of the same bytes is
+        # independent, so one warm-up can be forked into any number of experiments
+        sim = load_checkpoint(data)["sim"]
+        counts = sim.__dict__.pop("log_counts", {})
+        sim._set_logger(logs_dir, log or LogOptions(quiet=not echo))
+        if sim.logger is not None:
+            sim.logger.counts.update(counts)  # sampling goes on where it was
+        for node in sim.nodes.values():
+            if sim.logging:
+                node.__dict__.pop("log", None)
+            else:
+                node.log = _no_log
+        return sim
+
+    def replay(self, journal: List[tuple], until: float):
+        # re-apply recorded actions at their times, on a simulation started like the original
+        for t, action, args in journal:
+            self.run_until(t)
+            getattr(self, action)(*args)
+        self.run_until(until)
+
+    def digest(self) -> str:
+        # hash of the simulation state, without wall-clock figures (SPF CPU time) or logs
+        h = hashlib.sha256(repr((self.now, self.seq, self.events, self.paused, self.started,
+                                 self.rng.getstate(), self.slots, list(self.links.items()),
+                                 self.topology_event)).encode())
+        for t, seq, kind, name, msg in sorted(self.heap, key=lambda e: e[1]):
+            m = (msg.kind, msg.src, msg.dst, msg.size) if msg is not None else None
+            h.update(repr((t, seq, kind, name, m)).encode())
+        for name, r in self.ospf_routers.items():
+            h.update(repr((name, r.seq, list(r.up), r.lsas_in, r.lsas_out, r.spf_runs, r.spf_pending,
+                           r.last_change, [None if l is None else l.seq for l in r.lsdb])).encode())
+            h.update(r.dist.tobytes())
+            h.update(r.parent.tobytes())
+        return h.hexdigest()[:24]
+
+def save_checkpoint(sim: DESSimulation, path: str):
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(sim.checkpoint())
+    os.replace(tmp, path)
+
+def load_checkpoint(data: bytes) -> Dict[str, Any]:
+    try:
+        ck = pickle.loads(data)
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, IndexError, KeyError, TypeError):
+        ck = None
+    if not isinstance(ck, dict) or ck.get("format") != CHECKPOINT_FORMAT:
+        raise ValueError("not a simulation checkpoint (or one from another version)")
+    return ck
+
+def read_checkpoint(path: str) -> Dict[str, Any]:
+    # the checkpoint without attaching a logger: {"sim", "digest"}
+    with open(path, "rb") as f:
+        return load_checkpoint(f.read())
+
+def replay_checkpoint(ck: Dict[str, Any]) -> DESSimulation:
+    # the checkpointed run again from a cold start: same graph and options, same journal
+    old = ck["sim"]
+    sim = DESSimulation(old.G, None, echo=False, **old.params)
+    sim.start()
+    sim.replay(old.journal or [], old.now)
+    return sim
@@ -0,0 +1,195 @@
+from __future__ import annotations
+import os, sys, threading, time
+from collections import OrderedDict, deque
+from json.encoder import encode_basestring as quote
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+# Simulation logging: nodes hand (time, node, kind, text) records to a SimLogger, which
+# applies per-kind sampling and passes batches to sinks (console, per-node files, ring
+# buffer). With background=True a writer thread drains the queue, so node threads only
+# append to a deque. Records of one node keep their order in every sink.
+
+LOG_FORMATS = ("text", "ndjson")
+MAX_OPEN_FILES = 256  # per-node files kept open at once (least recently written are closed)
+
+@lru_cache(maxsize=4096)
+def _stamp_second(s: int) -> str:
+    return time.strftime("%H:%M:%S", time.localtime(s))
+
+def wall_stamp(t: float) -> str:
+    return _stamp_second(int(t))
+
+@dataclass
+class LogOptions:
+    fmt: str = "text"                     # text: "[stamp] node: msg" lines in <node>.log; ndjson: <node>.ndjson
+    quiet: bool = False                   # no console output
+    sample: Dict[str, int] = field(default_factory=dict)  # kind -> keep 1 in N per node
+    ring: int = 0                         # >0: keep only the last N records, written out on close
+    flush_lines: int = 10000
+    flush_interval: float = 0.5
+
+class ConsoleSink:
+    def __init__(self, stamp: Callable[[float], str] = wall_stamp):
+        self.stamp = stamp
+
+    def write(self, batch: List[tuple]):
+        stamp = self.stamp
+        sys.stdout.write("".join(f"[{stamp(t)}] {n}: {x}\n" for t, n, _, x in batch))
+
+    def close(self):
+        sys.stdout.flush()
+
+class FileSink:
+    # one file per node, opened once and kept open; each batch is one write per node
+    def __init__(self, logs_dir: str, fmt: str = "text", stamp: Callable[[float], str] = wall_stamp,
+                 max_open: int = MAX_OPEN_FILES):
+        if fmt not in LOG_FORMATS:
+            raise ValueError(f"unknown log format {fmt!r}")
+        self.logs_dir = logs_dir
+        self.fmt = fmt
+        self.stamp = stamp
+        self.max_open = max_open
+        self.files: "OrderedDict[str, object]" = OrderedDict()
+
+    def _lines(self, batch: List[tuple]) -> Dict[str, List[str]]:
+        by_node: Dict[str, List[str]] = {}
+        if self.fmt == "ndjson":
+            for t, n, k, x in batch:
+                by_node.setdefault(n, []).append(
+                    f'{{"t":{round(t, 6)},"node":{quote(n)},"kind":{quote(k)},"msg":{quote(x)}}}\n')
+            return by_node
+        stamps: Dict[float, str] = {}  # many records share a timestamp
+        stamp = self.stamp
+        for t, n, _, x in batch:
+            s = stamps.get(t)
+            if s is None:
+                s = stamps[t] = stamp(t)
+            by_node.setdefault(n, []).append(f"[{s}] {n}: {x}\n")
+        return by_node
+
+    def _file(self, node: str):
+        f = self.files.get(node)
+        if f is not None:
+            self.files.move_to_end(node)
+            return f
+        if len(self.files) >= self.max_open:
+            self.files.popitem(last=False)[1].close()
+        ext = "ndjson" if self.fmt == "ndjson" else "log"
+        f = self.files[node] = open(os.path.join(self.logs_dir, f"{node}.{ext}"), "a", buffering=1 << 16)
+        return f
+
+    def write(self, batch: List[tuple]):
+        for n, lines in self._lines(batch).items():
+            self._file(n).write("".join(lines))
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files.clear()
+
+class RingSink:
+    # bounded in-memory buffer; on close the retained records go to the `then` sinks
+    def __init__(self, capacity: int, then: Optional[List] = None):
+        self.buf: deque = deque(maxlen=capacity)
+        self.then = then or []
+
+    def write(self, batch: List[tuple]):
+        self.buf.extend(batch)
+
+    def records(self) -> List[tuple]:
+        return list(self.buf)
+
+    def close(self):
+        batch = list(self.buf)
+        for s in self.then:
+            if batch:
+                s.write(batch)
+            s.close()
+
+class SimLogger:
+    def __init__(self, sinks: List, sample: Optional[Dict[str, int]] = None, background: bool = True,
+                 flush_lines: int = 10000, flush_interval: float = 0.5):
+        self.sinks = sinks
+        self.sample = {k: n for k, n in (sample or {}).items() if n > 1}
+        self.counts: Dict[tuple, int] = {}
+        self.pending: deque = deque()  # append/popleft are thread-safe
+        self.flush_lines = flush_lines
+        self.flush_interval = flush_interval
+        self.records = 0
+        self.sampled_out = 0
+        self.closed = False
+        self.wake = threading.Event()
+        self.writer: Optional[threading.Thread] = None
+        if background:
+            self.writer = threading.Thread(target=self._run, name="sim-log-writer", daemon=True)
+            self.writer.start()
+
+    def log(self, t: float, node: str, kind: str, text: str):
+        n = self.sample.get(kind)
+        if n:
+            key = (node, kind)  # each node thread only touches its own counters
+            c = self.counts.get(key, 0)
+            self.counts[key] = c + 1
+            if c % n:
+                self.sampled_out += 1
+                return
+        self.pending.append((t, node, kind, text))
+        if len(self.pending) >= self.flush_lines:
+            if self.writer is None:
+                self.flush()
+            else:
+                self.wake.set()
+
+    def flush(self):
+        pending = self.pending
+        batch = [pending.popleft() for _ in range(len(pending))]
+        if batch:
+            self.records += len(batch)
+            for s in self.sinks:
+                s.write(batch)
+
+    def _run(self):
+        while not self.closed:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush()
+
+    def close(self):
+        # drain everything still queued, then close the sinks
+        if self.closed:
+            return
+        self.closed = True
+        if self.writer is not None:
+            self.wake.set()
+            self.writer.join()
+        self.flush()
+        for s in self.sinks:
+            s.close()
+
+def make_logger(logs_dir: Optional[str], opts: Optional[LogOptions] = None,
+                stamp: Callable[[float], str] = wall_stamp, background: bool = True) -> Optional[SimLogger]:
+    # None when nothing would be written (quiet and no logs_dir)
+    opts = opts or LogOptions()
+    sinks: List = []
+    if not opts.quiet:
+        sinks.append(ConsoleSink(stamp))
+    if logs_dir is not None:
+        sinks.append(FileSink(logs_dir, opts.fmt, stamp))
+    if not sinks:
+        return None
+    if opts.ring > 0:
+        sinks = [RingSink(opts.ring, then=sinks)]
+    return SimLogger(sinks, sample=opts.sample, background=background,
+                     flush_lines=opts.flush_lines, flush_interval=opts.flush_interval)
+
+def parse_sample(specs: List[str]) -> Dict[str, int]:
+    # ["HELLO=10", "ARP=2"] -> {"HELLO": 10, "ARP": 2}
+    out: Dict[str, int] = {}
+    for spec in specs or []:
+        kind, _, n = spec.partition("=")
+        if not kind or not n.isdigit() or int(n) < 1:
+            raise ValueError(f"bad --log-sample {spec!r}, expected KIND=N")
+        out[kind.upper()] = int(n)
+    return out
@@ -1,10 +1,22 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import Any
+from typing import Any, Optional
+
+HEADER_BYTES = 64  # size of a message without payload (L2 + protocol header)
 
-@dataclass
 class Message:
-    kind: str            # "HELLO", "ARP", etc.
-    src: str
-    dst: str             # neighbor or broadcast '*'
-    payload: Any = None
+    __slots__ = ("kind", "src", "dst", "payload", "size")
+
+    def __init__(self, kind: str, src: str, dst: str, payload: Any = None, size: Optional[int] = None):
+        self.kind = kind          # "HELLO", "ARP", etc.
+        self.src = src
+        self.dst = dst            # neighbor or broadcast '*'
+        self.payload = payload
+        self.size = size if size is not None else HEADER_BYTES + (len(str(payload)) if payload is not None else 0)
+
+    def __repr__(self):
+        return f"Message(kind={self.kind!r}, src={self.src!r}, dst={self.dst!r}, payload={self.payload!r}, size={self.size})"
+
+    def __eq__(self, other):
+        if not isinstance(other, Message):
+            return NotImplemented
+        return all(getattr(self, a) == getattr(other, a) for a in self.__slots__)
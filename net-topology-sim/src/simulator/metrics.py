@@ -0,0 +1,115 @@
+from __future__ import annotations
+import json, os, threading, time
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+
+# Live metrics of the threaded Simulation: messages handled per node (over the last
+# sampling interval and since start), inbox depth (messages queued on a node's inbound
+# links) percentiles, drops on full links, and how long pause()/resume() took to reach
+# every node. The counters live on the nodes; MetricsSampler samples the inbox depths
+# and rewrites a JSON snapshot every interval, so it can be read while the run goes on.
+
+QUANTILES = (50, 90, 99)
+TOP_NODES = 10  # busiest / most dropping nodes listed in the summary
+
+def percentiles(hist: Counter, qs: Tuple[int, ...] = QUANTILES) -> Dict[str, int]:
+    # hist: value -> count
+    out = {f"p{q}": 0 for q in qs}
+    out["max"] = max(hist) if hist else 0
+    total = sum(hist.values())
+    if not total:
+        return out
+    keys = sorted(hist)
+    seen, i = 0, 0
+    for q in qs:
+        need = q / 100.0 * total
+        while i < len(keys) and seen + hist[keys[i]] < need:
+            seen += hist[keys[i]]
+            i += 1
+        out[f"p{q}"] = keys[min(i, len(keys) - 1)]
+    return out
+
+def inbox_depth(node) -> int:
+    return sum(len(link.queue) for link in node.inbound)
+
+def _latency(events: List[Dict[str, Any]], nodes) -> List[Dict[str, Any]]:
+    # per pause/resume request: how long until every node had acted on it (None while pending)
+    out = []
+    for i, ev in enumerate(events):
+        done = [t - ev["at"] for t in (n.acted.get(i) for n in nodes) if t is not None]
+        out.append({"kind": ev["kind"], "at_s": round(ev["at"] - ev["start"], 3), "nodes_done": len(done),
+                    "latency_ms": round(max(done) * 1000, 2) if done and len(done) == len(nodes) else None,
+                    "median_ms": round(sorted(done)[len(done) // 2] * 1000, 2) if done else None})
+    return out
+
+class MetricsSampler(threading.Thread):
+    def __init__(self, sim, interval: float = 1.0, path: Optional[str] = None):
+        super().__init__(daemon=True)
+        self.sim = sim
+        self.interval = interval
+        self.path = path
+        self.depths: Counter = Counter()  # inbox depth -> samples, over all nodes
+        self.node_max: Dict[str, int] = {}
+        self.rates: Dict[str, float] = {}  # node -> messages/s over the last interval
+        self._last: Dict[str, int] = {}
+        self._last_t = time.time()
+        self._halt = threading.Event()
+
+    def sample(self):
+        now = time.time()
+        dt = max(now - self._last_t, 1e-9)
+        for name, node in self.sim.nodes.items():
+            d = inbox_depth(node)
+            self.depths[d] += 1
+            if d > self.node_max.get(name, 0):
+                self.node_max[name] = d
+            self.rates[name] = (node.handled - self._last.get(name, 0)) / dt
+            self._last[name] = node.handled
+        self._last_t = now
+
+    def write(self, path: Optional[str] = None):
+        path = path or self.path
+        if not path:
+            return
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.sim.metrics(), f, indent=2)
+        os.replace(tmp, path)  # readers never see a half-written snapshot
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            self.sample()
+            self.write()
+
+    def stop(self):
+        self._halt.set()
+        self.join()
+
+def snapshot(sim, sampler: Optional[MetricsSampler] = None, per_node: bool = True) -> Dict[str, Any]:
+    now = sim.stopped_at or time.time()
+    start = sim.started_at or now
+    elapsed = max(now - start, 1e-9)
+    nodes = sim.nodes
+    if sampler is not None and sampler.depths:
+        depths, node_max, rates = sampler.depths, sampler.node_max, sampler.rates
+    else:
+        # no sampler: one look at the queues as they are now
+        depths = Counter(inbox_depth(n) for n in nodes.values())
+        node_max = {name: inbox_depth(n) for name, n in nodes.items()}
+        rates = {name: n.handled / elapsed for name, n in nodes.items()}
+    handled = sum(n.handled for n in nodes.values())
+    dropped = sum(n.dropped for n in nodes.values())
+    rep = {"elapsed_s": round(elapsed, 3), "running": sim.started_at is not None and sim.stopped_at is None,
+           "nodes": len(nodes), "messages_handled": handled, "messages_per_sec": round(handled / elapsed, 1),
+           "dropped": dropped, "inbox_depth": dict(percentiles(depths), samples=sum(depths.values())),
+           "busiest": [{"node": name, "handled": n.handled, "avg_msgs_per_sec": round(n.handled / elapsed, 1)}
+                       for name, n in sorted(nodes.items(), key=lambda x: -x[1].handled)[:TOP_NODES]],
+           "most_dropped": [{"node": name, "dropped": n.dropped}
+                            for name, n in sorted(nodes.items(), key=lambda x: -x[1].dropped)[:TOP_NODES] if n.dropped],
+           "pause_resume": _latency([dict(ev, start=start) for ev in sim.pause_events], list(nodes.values()))}
+    if per_node:
+        rep["per_node"] = {name: {"handled": n.handled, "msgs_per_sec": round(rates.get(name, 0.0), 1),
+                                  "avg_msgs_per_sec": round(n.handled / elapsed, 1), "dropped": n.dropped,
+                                  "inbox_depth": inbox_depth(n), "inbox_max": node_max.get(name, 0)}
+                           for name, n in nodes.items()}
+    return rep
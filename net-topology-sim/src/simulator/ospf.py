@@ -0,0 +1,456 @@
+from __future__ import annotations
+import heapq, time
+from array import array
+from typing import Dict, Any, List, Optional
+import networkx as nx
+import numpy as np
+from .messages import Message
+from ..topology import is_segment
+from ..utils import ip_to_int
+
+# Link-state routing between simulated nodes, modeled on a single OSPF area.
+# Each router originates a router LSA (its up OSPF neighbors and their costs), floods
+# LSAs it has not seen, keeps a link-state database and computes a shortest-path tree.
+# After the first full SPF, LSDB changes only re-run Dijkstra on the part of the tree
+# they can affect (incremental SPF). Segments are pseudonodes whose network LSA lists the
+# attached members at cost 0. When a member's link to a segment goes down or up, the
+# segment's DR (the highest-named other attached member) re-originates that LSA, so the
+# member drops out of (or rejoins) the tree even if the segment was its only link.
+
+OSPF_REFERENCE_KBPS = 100000  # auto-cost reference bandwidth (100 Mbps, the IOS default)
+OSPF_START_MODES = ("cold", "warm")  # cold: flood from empty LSDBs; warm: start converged
+SPF_DELAY = 0.05   # wait this long after an LSDB change before running SPF (batches LSAs)
+LSU_HEADER_BYTES = 24
+LSA_HEADER_BYTES = 20
+LSA_LINK_BYTES = 12
+INF = float("inf")
+
+def ospf_cost(bandwidth_kbps) -> int:
+    bw = int(bandwidth_kbps or 0)
+    return max(1, OSPF_REFERENCE_KBPS // bw) if bw > 0 else 1
+
+def _prefix(net: str):
+    # "10.0.12.0/30" -> (int address, prefix length); None if unparsable
+    addr, _, plen = (net or "").partition("/")
+    n = ip_to_int(addr)
+    if n < 0 or not plen.isdigit():
+        return None
+    return n, int(plen)
+
+def _covered(statements: List[str], net: str) -> bool:
+    # an interface runs OSPF if a `network ... area` statement covers its subnet;
+    # 0.0.0.0/0 covers everything, including links without an address
+    p = _prefix(net)
+    for s in statements:
+        q = _prefix(s)
+        if q is None:
+            continue
+        if q[1] == 0:
+            return True
+        if p is not None and p[1] >= q[1]:
+            mask = (0xFFFFFFFF << (32 - q[1])) & 0xFFFFFFFF
+            if p[0] & mask == q[0] & mask:
+                return True
+    return False
+
+def ospf_adjacency(G: nx.Graph) -> Dict[str, Dict[str, int]]:
+    # node -> {neighbor: cost} for every edge both ends run OSPF on (segments: cost 0 towards members)
+    def stmts(n):
+        return G.nodes[n].get("ospf") or []
+    adj: Dict[str, Dict[str, int]] = {}
+    for u, v, d in G.edges(data=True):
+        if is_segment(G, u):
+            u, v = v, u
+        net = d.get("network", "")
+        if is_segment(G, v):
+            if not _covered(stmts(u), net):
+                continue
+            adj.setdefault(u, {})[v] = ospf_cost(d.get("bandwidth"))
+            adj.setdefault(v, {})[u] = 0
+        elif _covered(stmts(u), net) and _covered(stmts(v), net):
+            c = ospf_cost(d.get("bandwidth"))
+            adj.setdefault(u, {})[v] = c
+            adj.setdefault(v, {})[u] = c
+    return adj
+
+class LSA:
+    # immutable once flooded; every router's LSDB holds references to the same objects
+    __slots__ = ("origin", "seq", "links", "size")
+
+    def __init__(self, origin: int, seq: int, links: Dict[int, int]):
+        self.origin = origin
+        self.seq = seq
+        self.links = links  # neighbor index -> cost
+        self.size = LSA_HEADER_BYTES + LSA_LINK_BYTES * len(links)
+
+class OSPFArea:
+    # what all routers share: the index of area members and the configured adjacencies
+    def __init__(self, G: nx.Graph):
+        self.adj = ospf_adjacency(G)
+        self.names: List[str] = sorted(self.adj)
+        self.index = {n: i for i, n in enumerate(self.names)}
+        self.segments = {n for n in self.names if is_segment(G, n)}
+        # network LSAs with every member attached, present in every LSDB from the start
+        self.network_lsas = [self.network_lsa(s, self.adj[s], 1) for s in sorted(self.segments)]
+
+    def network_lsa(self, seg: str, attached, seq: int) -> LSA:
+        return LSA(self.index[seg], seq, {self.index[m]: 0 for m in self.adj[seg] if m in attached})
+
+    def dr(self, seg: str, attached, changed: str) -> Optional[str]:
+        # the member that re-originates seg's network LSA after `changed` went down/up:
+        # the highest-named one attached; `changed` itself only if it is alone (a returning
+        # member's copy of the LSA may be out of date)
+        members = [m for m in self.adj[seg] if m in attached]
+        return max((m for m in members if m != changed), default=changed if changed in members else None)
+
+    def lsdb(self) -> List[Optional[LSA]]:
+        db: List[Optional[LSA]] = [None] * len(self.names)
+        for lsa in self.network_lsas:
+            db[lsa.origin] = lsa
+        return db
+
+    def converge(self, routers: Dict[str, "OSPFRouter"]):
+        # warm start: every router gets the fully flooded LSDB and a full SPF, as if the
+        # area had been up for a while (avoids flooding N^2 LSAs just to reach the start line)
+        db = self.lsdb()
+        for r in routers.values():
+            r.seq = 1
+            db[r.idx] = r.own_lsa()
+        for r in routers.values():
+            r.lsdb = list(db)
+        view = [[] for _ in self.names]
+        for v, lsa in enumerate(db):
+            if lsa is None:
+                continue
+            for w, c in lsa.links.items():
+                lw = db[w]
+                if lw is not None and v in lw.links:
+                    view[v].append((w, c))
+        for r in routers.values():
+            t0 = time.perf_counter()
+            r._full(view)
+            r.spf_cpu += time.perf_counter() - t0
+            r.spf_runs = r.spf_full = 1
+            r.started = True
+
+class OSPFRouter:
+    # Protocol state of one node. The node provides send(neighbor, msg), clock() and
+    # schedule_spf(delay), and calls link_changed() when one of its links goes down/up.
+    def __init__(self, node, area: OSPFArea, full_spf: bool = False):
+        self.node = node
+        self.area = area
+        self.idx = area.index[node.name]
+        self.neighbors = dict(area.adj[node.name])  # configured OSPF neighbors -> cost
+        self.up = dict.fromkeys(self.neighbors)  # ordered, so flooding order is reproducible
+        self.full_spf = full_spf  # reference mode: full Dijkstra on every change
+        self.seq = 0
+        self.lsdb: List[Optional[LSA]] = area.lsdb()
+        self.changed: Dict[int, Optional[LSA]] = {}  # origin -> LSA before the pending SPF
+        n = len(area.names)
+        self.dist = array("d", [INF]) * n
+        self.parent = array("i", [-1]) * n
+        self.parent_np = np.frombuffer(self.parent, dtype=np.int32)
+        self.mask = np.zeros(n + 1, dtype=bool)  # scratch for subtree marking; mask[-1] stays False
+        self.started = False
+        self.spf_pending = False
+        self.spf_runs = self.spf_full = self.spf_incremental = 0
+        self.spf_cpu = 0.0
+        self.rescanned = 0
+        self.lsas_in = self.lsas_out = 0
+        self.last_change: Optional[float] = None
+
+    def __getstate__(self):
+        # parent_np is a view of parent; pickled it would become a copy
+        state = self.__dict__.copy()
+        del state["parent_np"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.parent_np = np.frombuffer(self.parent, dtype=np.int32)
+
+    # --- LSAs and flooding ------------------------------------------------
+    def own_lsa(self) -> LSA:
+        index = self.area.index
+        return LSA(self.idx, self.seq, {index[n]: c for n, c in self.neighbors.items() if n in self.up})
+
+    def _install(self, lsa: LSA) -> bool:
+        cur = self.lsdb[lsa.origin]
+        if cur is not None and cur.seq >= lsa.seq:
+            return False
+        if lsa.origin not in self.changed:
+            self.changed[lsa.origin] = cur
+        self.lsdb[lsa.origin] = lsa
+        return True
+
+    def _flood(self, lsas: List[LSA], exclude: Optional[str] = None):
+        # exclude: the link the LSAs arrived over (a neighbor, or a segment: every member has them)
+        size = LSU_HEADER_BYTES + sum(l.size for l in lsas)
+        for n in self.up:
+            if n == exclude:
+                continue
+            self.node.send(n, Message("LSU", self.node.name, n, lsas, size))
+            self.lsas_out += len(lsas)
+
+    def _originate(self):
+        self.seq += 1
+        lsa = self.own_lsa()
+        self._install(lsa)
+        self._flood([lsa])
+        self._schedule()
+
+    def _schedule(self):
+        if not self.spf_pending:
+            self.spf_pending = True
+            self.node.schedule_spf(SPF_DELAY)
+
+    def start(self):
+        if not self.started:
+            self.started = True
+            self._originate()
+
+    def receive(self, msg: Message):
+        self.lsas_in += len(msg.payload)
+        new = [lsa for lsa in msg.payload if lsa.origin != self.idx and self._install(lsa)]
+        if new:
+            # segment fan-out delivers with the segment as dst; otherwise it came from msg.src
+            self._flood(new, exclude=msg.dst if msg.dst in self.area.segments else msg.src)
+            self._schedule()
+
+    def link_changed(self, neighbor: str, up: bool):
+        if neighbor not in self.neighbors:
+            return
+        if up:
+            self.up[neighbor] = None
+        else:
+            self.up.pop(neighbor, None)
+        self._originate()
+        if up:
+            # database exchange with the returning neighbor (both sides may have missed LSAs)
+            self._send_db(neighbor)
+
+    def _send_db(self, neighbor: str):
+        db = [l for l in self.lsdb if l is not None]
+        self.node.send(neighbor, Message("LSU", self.node.name, neighbor, db,
+                                         LSU_HEADER_BYTES + sum(l.size for l in db)))
+        self.lsas_out += len(db)
+
+    def segment_changed(self, seg: str, attached, up: bool):
+        # DR role (see OSPFArea.dr): a member of seg went down or up, list the attached ones
+        old = self.lsdb[self.area.index[seg]]
+        lsa = self.area.network_lsa(seg, attached, (old.seq if old is not None else 0) + 1)
+        self._install(lsa)
+        if up:
+            # the returning member gets the whole database (this LSA included) over the LAN
+            self._flood([lsa], exclude=seg)
+            self._send_db(seg)
+        else:
+            self._flood([lsa])
+        self._schedule()
+
+    # --- SPF -------------------------------------------------------------
+    def run_spf(self):
+        self.spf_pending = False
+        if not self.changed and self.spf_runs:
+            return
+        full = self.full_spf or not self.spf_runs
+        t0 = time.perf_counter()
+        if full:
+            before = (self.dist.tobytes(), self.parent.tobytes())
+            self._full()
+            moved = before != (self.dist.tobytes(), self.parent.tobytes())
+            self.spf_full += 1
+        else:
+            moved = self._incremental()
+            self.spf_incremental += 1
+        self.changed = {}
+        dt = time.perf_counter() - t0
+        self.spf_cpu += dt
+        self.spf_runs += 1
+        if moved:
+            self.last_change = self.node.clock()
+        self.node.log(f"SPF {'full' if full else 'incremental'} {dt * 1000:.2f} ms, "
+                      f"{'routes changed' if moved else 'no change'}", "SPF")
+
+    def _full(self, view=None):
+        # plain Dijkstra over the LSDB (two-way checked); converge() passes a prebuilt
+        # neighbor list instead, since every router shares the same database there
+        lsdb = self.lsdb
+        n = len(lsdb)
+        dist, parent = self.dist, self.parent
+        dist[:] = array("d", [INF]) * n
+        parent[:] = array("i", [-1]) * n
+        dist[self.idx] = 0.0
+        heap = [(0.0, self.idx)]
+        pop, push = heapq.heappop, heapq.heappush
+        while heap:
+            d, v = pop(heap)
+            if d > dist[v]:
+                continue
+            if view is not None:
+                for w, c in view[v]:
+                    nd = d + c
+                    if nd < dist[w]:
+                        dist[w] = nd
+                        parent[w] = v
+                        push(heap, (nd, w))
+                continue
+            lv = lsdb[v]
+            if lv is None:
+                continue
+            for w, c in lv.links.items():
+                nd = d + c
+                if nd < dist[w]:
+                    lw = lsdb[w]
+                    if lw is None or v not in lw.links:
+                        continue
+                    dist[w] = nd
+                    parent[w] = v
+                    push(heap, (nd, w))
+        self.rescanned += n
+
+    def _subtree(self, roots: List[int]) -> List[int]:
+        mask, par = self.mask, self.parent_np
+        mask[:] = False
+        mask[roots] = True
+        n = len(par)
+        while True:
+            new = mask[par] & ~mask[:n]
+            if not new.any():
+                break
+            mask[:n] |= new
+        return np.nonzero(mask[:n])[0].tolist()
+
+    def _incremental(self) -> bool:
+        lsdb, dist, parent, changed = self.lsdb, self.dist, self.parent, self.changed
+
+        def cost(u, v, old):
+            # cost of u->v under the two-way check, in the LSDB before (old) or after this batch
+            lu = changed.get(u, lsdb[u]) if old else lsdb[u]
+            lv = changed.get(v, lsdb[v]) if old else lsdb[v]
+            if lu is None or lv is None or u not in lv.links:
+                return None
+            return lu.links.get(v)
+
+        edges: Dict[tuple, None] = {}
+        for o, prev in changed.items():
+            cur = lsdb[o]
+            for n in list(prev.links if prev else ()) + list(cur.links if cur else ()):
+                edges[(o, n)] = None
+                edges[(n, o)] = None
+        worse, better = [], []
+        for u, v in edges:
+            oc, nc = cost(u, v, True), cost(u, v, False)
+            if oc == nc:
+                continue
+            if oc is not None and (nc is None or nc > oc) and parent[v] == u:
+                worse.append(v)
+            if nc is not None and (oc is None or nc < oc):
+                better.append((u, v, nc))
+
+        # everything below a tree edge that got worse loses its distance and is re-attached
+        # from its cheapest neighbor outside that subtree
+        heap = []
+        affected = self._subtree(worse) if worse else []
+        for a in affected:
+            dist[a] = INF
+            parent[a] = -1
+        for a in affected:
+            la = lsdb[a]
+            if la is None:
+                continue
+            best, bp = INF, -1
+            for w in la.links:
+                lw = lsdb[w]
+                c = lw.links.get(a) if lw is not None else None
+                if c is not None and dist[w] + c < best:
+                    best, bp = dist[w] + c, w
+            if bp >= 0:
+                dist[a] = best
+                parent[a] = bp
+                heap.append((best, a))
+        for u, v, c in better:
+            if dist[u] + c < dist[v]:
+                dist[v] = dist[u] + c
+                parent[v] = u
+                heap.append((dist[v], v))
+        heapq.heapify(heap)
+        pop, push = heapq.heappop, heapq.heappush
+        moved = len(affected) + len(heap)
+        scanned = 0
+        while heap:
+            d, v = pop(heap)
+            if d > dist[v]:
+                continue
+            scanned += 1
+            lv = lsdb[v]
+            if lv is None:
+                continue
+            for w, c in lv.links.items():
+                nd = d + c
+                if nd < dist[w]:
+                    lw = lsdb[w]
+                    if lw is None or v not in lw.links:
+                        continue
+                    dist[w] = nd
+                    parent[w] = v
+                    push(heap, (nd, w))
+                    moved += 1
+        self.rescanned += scanned + len(affected)
+        return moved > 0
+
+    # --- results ---------------------------------------------------------
+    def routes(self) -> Dict[str, Dict[str, Any]]:
+        # destination router -> next hop and cost (segments are transit only)
+        names, parent, dist, root = self.area.names, self.parent, self.dist, self.idx
+        segs = {self.area.index[s] for s in self.area.segments}
+        first: Dict[int, int] = {root: root}
+
+        def hop(v):
+            path = []
+            while v not in first:
+                path.append(v)
+                v = parent[v]
+                if v < 0:
+                    return -1
+            h = first[v]
+            for x in reversed(path):
+                h = x if h == root or h in segs else h  # next hop is a router, not a LAN
+                first[x] = h
+            return h
+
+        out = {}
+        for v, name in enumerate(names):
+            if v == root or name in self.area.segments or dist[v] == INF:
+                continue
+            h = hop(v)
+            if h >= 0:
+                out[name] = {"next_hop": names[h], "cost": dist[v]}
+        return out
+
+    def stats(self, since: Optional[float] = None) -> Dict[str, Any]:
+        # without a fail_link/restore there is nothing to converge from (the clock may be wall time)
+        converged = None
+        if since is not None and self.last_change is not None and self.last_change >= since:
+            converged = round(self.last_change - since, 6)
+        return {"spf_runs": self.spf_runs, "spf_full": self.spf_full, "spf_incremental": self.spf_incremental,
+                "spf_cpu_ms": round(self.spf_cpu * 1000, 3), "nodes_rescanned": self.rescanned,
+                "lsas_in": self.lsas_in, "lsas_out": self.lsas_out, "converged_after_s": converged}
+
+def ospf_report(routers: Dict[str, OSPFRouter], since: Optional[float], routes: bool = True) -> Dict[str, Any]:
+    # per-router convergence and SPF cost; converged_after_s is measured from `since`
+    # (the last fail_link/restore) to the router's last routing change, None if it had none
+    # or there was no link change
+    per = {}
+    for name, r in routers.items():
+        per[name] = r.stats(since)
+        if routes:
+            per[name]["routes"] = r.routes()
+    conv = [s["converged_after_s"] for s in per.values() if s["converged_after_s"] is not None]
+    return {
+        "routers": len(routers),
+        "event_time": since,
+        "converged_after_s": max(conv) if conv else None,
+        "spf_cpu_ms": round(sum(r.spf_cpu for r in routers.values()) * 1000, 3),
+        "per_router": per,
+    }
@@ -0,0 +1,306 @@
+from __future__ import annotations
+import json, os, shutil, time
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import numpy as np
+import networkx as nx
+
+from .parser import PARSER_VERSION
+from .topology import DEVICE_KIND
+from .store import DeviceStore, MASKS, network
+from .utils import int_to_ip
+
+# Topology snapshot (build --out DIR): the parsed devices and the graph built from them as
+# a directory of .npy arrays plus meta.json. Arrays are memory-mapped on load, so reading
+# one costs little more than the files actually touched.
+#   strings.npy        every string (names, IPs, networks, descriptions), "\0"-separated UTF-8
+#   node_*             graph nodes in G's order: name, kind (0 device, 1 segment), network
+#   adj_off, adj_edge  per node, its edges in G's neighbor order (CSR), so the rebuilt graph
+#                      iterates exactly like the original
+#   edge_*             u, v, network, bandwidth, mtu, weight (NaN: no weight attribute)
+#   dev_*              devices in parse order: name, and offsets into the tables below
+#   if_*               interface table: name, description, ip, mask, bandwidth, mtu, vlan, network
+#   ospf_*, ospfnet_*  router ospf processes and their network statements; bgp_asn
+#   file_*             config path (relative to conf_root), mtime_ns, size, device (-1: failed)
+
+SNAPSHOT_FORMAT = 1
+DEFAULT_SNAPSHOT = "./outputs/snapshot"
+STALE_MODES = ("rebuild", "error", "ignore")
+IFACE_STR = ("name", "description", "ip", "mask")  # then bandwidth, mtu, vlan, network
+
+class _Strings:
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+
+    def __call__(self, s: str) -> int:
+        i = self.ids.get(s)
+        if i is None:
+            i = self.ids[s] = len(self.ids)
+        return i
+
+    def array(self) -> np.ndarray:
+        return np.frombuffer("\0".join(self.ids).encode(), dtype=np.uint8)
+
+def write_snapshot(path: str, conf_root: str, devices: Dict[str, Any], G: nx.Graph,
+                   sources: Dict[str, str]) -> Dict[str, Any]:
+    # sources: config path -> hostname, as filled in by parse_conf_dir; -> meta
+    conf_root = os.path.abspath(conf_root)
+    s = _Strings()
+    a: Dict[str, List] = {k: [] for k in (
+        "node_name", "node_kind", "node_network", "adj_off", "adj_edge",
+        "edge_u", "edge_v", "edge_network", "edge_bandwidth", "edge_mtu", "edge_weight",
+        "dev_name", "dev_if", "dev_ospf", "dev_bgp", "if_device", "if_name", "if_description", "if_ip",
+        "if_mask", "if_bandwidth", "if_mtu", "if_vlan", "if_network", "ospf_process", "ospf_net",
+        "ospfnet_network", "ospfnet_area", "bgp_asn", "file_path", "file_mtime_ns", "file_size", "file_device")}
+
+    node_ix = {n: i for i, n in enumerate(G.nodes)}
+    for n, attrs in G.nodes(data=True):
+        seg = attrs.get("kind") == "segment"
+        a["node_name"].append(s(n))
+        a["node_kind"].append(1 if seg else 0)
+        a["node_network"].append(s(attrs.get("network", "")) if seg else -1)
+    edge_ix: Dict[frozenset, int] = {}
+    for u, v, d in G.edges(data=True):
+        edge_ix[frozenset((u, v))] = len(a["edge_u"])
+        a["edge_u"].append(node_ix[u])
+        a["edge_v"].append(node_ix[v])
+        a["edge_network"].append(s(d.get("network", "")))
+        a["edge_bandwidth"].append(d.get("bandwidth", 0))
+        a["edge_mtu"].append(d.get("mtu", 1500))
+        a["edge_weight"].append(d.get("weight", np.nan))
+    for n in G.nodes:
+        a["adj_off"].append(len(a["adj_edge"]))
+        a["adj_edge"].extend(edge_ix[frozenset((n, m))] for m in G[n])
+    a["adj_off"].append(len(a["adj_edge"]))
+
+    dev_ix = {}
+    span = ({d: (start, end) for d, start, end in devices.spans()}
+            if isinstance(devices, DeviceStore) and devices.regular else None)
+    for d, dev in devices.items():
+        dev_ix[d] = len(a["dev_name"])
+        a["dev_name"].append(s(d))
+        a["dev_if"].append(len(a["if_name"]))
+        a["dev_ospf"].append(len(a["ospf_process"]))
+        a["dev_bgp"].append(len(a["bgp_asn"]))
+        if span is not None:
+            _store_ifaces(a, s, devices, dev_ix[d], *span[d])
+        else:
+            for i in dev.get("interfaces", []):
+                a["if_device"].append(dev_ix[d])
+                for k in IFACE_STR:
+                    a["if_" + k].append(s(i.get(k, "")))
+                a["if_bandwidth"].append(i.get("bandwidth", 0) or 0)
+                a["if_mtu"].append(i.get("mtu", 1500))
+                a["if_vlan"].append(i.get("vlan", 0) or 0)
+                a["if_network"].append(s(i.get("network", "")))
+        for p in dev.get("routing", {}).get("ospf", []):
+            a["ospf_process"].append(p["process"])
+            a["ospf_net"].append(len(a["ospfnet_network"]))
+            for net in p.get("networks", []):
+                a["ospfnet_network"].append(s(net["network"]))
+                a["ospfnet_area"].append(s(net["area"]))
+        a["bgp_asn"].extend(b["asn"] for b in dev.get("routing", {}).get("bgp", []))
+    for k in ("dev_if", "dev_ospf", "dev_bgp"):
+        a[k].append(len(a[{"dev_if": "if_name", "dev_ospf": "ospf_process", "dev_bgp": "bgp_asn"}[k]]))
+    a["ospf_net"].append(len(a["ospfnet_network"]))
+
+    for p in sorted(sources):
+        st = os.stat(p)
+        a["file_path"].append(s(os.path.relpath(os.path.abspath(p), conf_root)))
+        a["file_mtime_ns"].append(st.st_mtime_ns)
+        a["file_size"].append(st.st_size)
+        a["file_device"].append(dev_ix.get(sources[p], -1))
+
+    dtypes = {"node_kind": np.int8, "edge_weight": np.float64, "edge_bandwidth": np.int64, "if_bandwidth": np.int64,
+              "bgp_asn": np.int64, "file_mtime_ns": np.int64, "file_size": np.int64}
+    meta = {"format": SNAPSHOT_FORMAT, "parser_version": PARSER_VERSION, "conf_root": conf_root,
+            "mode": G.graph.get("mode", "mesh"), "created": time.time(), "devices": len(devices),
+            "nodes": G.number_of_nodes(), "edges": G.number_of_edges(), "interfaces": len(a["if_name"]),
+            "files": len(a["file_path"])}
+    tmp = path.rstrip("/") + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    np.save(os.path.join(tmp, "strings.npy"), s.array())
+    for k, v in a.items():
+        np.save(os.path.join(tmp, k + ".npy"), np.asarray(v, dtype=dtypes.get(k, np.int32)))
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    # swap directories: a reader sees the old snapshot or the new one, never half of either
+    old = path.rstrip("/") + ".old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, old)
+    os.rename(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+    return meta
+
+def _store_ifaces(a: Dict[str, List], s: _Strings, store: DeviceStore, dev: int, start: int, end: int):
+    # one device's interface rows, read from the store's columns rather than through views
+    strings = store.strings
+    for r in range(start, end):
+        ip, plen = store.if_ip[r], store.if_plen[r]
+        a["if_device"].append(dev)
+        a["if_name"].append(s(strings[store.if_name[r]]))
+        a["if_description"].append(s(strings[store.if_desc[r]]))
+        a["if_ip"].append(s(int_to_ip(ip) if plen >= 0 else ""))
+        a["if_mask"].append(s(MASKS[plen] if plen >= 0 else ""))
+        a["if_bandwidth"].append(store.if_bw[r])
+        a["if_mtu"].append(store.if_mtu[r])
+        a["if_vlan"].append(store.if_vlan[r])
+        a["if_network"].append(s(network(ip, plen)))
+
+class Snapshot:
+    def __init__(self, path: str, meta: Dict[str, Any]):
+        self.path = path
+        self.meta = meta
+        self.conf_root = meta["conf_root"]
+        self.mode = meta["mode"]
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._strings: Optional[List[str]] = None
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        arr = self._arrays.get(name)
+        if arr is None:
+            arr = self._arrays[name] = np.load(os.path.join(self.path, name + ".npy"), mmap_mode="r")
+        return arr
+
+    @property
+    def strings(self) -> List[str]:
+        if self._strings is None:
+            self._strings = self["strings"].tobytes().decode().split("\0")
+        return self._strings
+
+    def _col(self, name: str) -> List[str]:
+        s = self.strings
+        return [s[i] for i in self[name].tolist()]
+
+    def files(self) -> Dict[str, Dict[str, int]]:
+        # abs config path -> {"mtime_ns", "size", "device"}
+        return {os.path.join(self.conf_root, p): {"mtime_ns": m, "size": z, "device": d}
+                for p, m, z, d in zip(self._col("file_path"), self["file_mtime_ns"].tolist(),
+                                      self["file_size"].tolist(), self["file_device"].tolist())}
+
+    def sources(self) -> Dict[str, str]:
+        names = self._col("dev_name")
+        return {p: names[f["device"]] for p, f in self.files().items() if f["device"] >= 0}
+
+    def stale(self, conf_root: Optional[str] = None) -> Dict[str, List[str]]:
+        # -> {"changed", "added", "removed"} config paths ({} when up to date); a snapshot
+        # from another parser version or another conf tree is stale as a whole
+        root = os.path.abspath(conf_root or self.conf_root)
+        files = self.files()
+        if self.meta["parser_version"] != PARSER_VERSION or root != self.conf_root:
+            return {"changed": sorted(files), "added": [], "removed": []}
+        seen = set()
+        changed, added = [], []
+        # the files find_device_configs would list, with one stat per config
+        for entry in os.scandir(root):
+            if not entry.is_dir():
+                continue
+            p = os.path.join(root, entry.name, "config.dump")
+            try:
+                st = os.stat(p)
+            except FileNotFoundError:
+                continue
+            seen.add(p)
+            f = files.get(p)
+            if f is None:
+                added.append(p)
+            elif (st.st_mtime_ns, st.st_size) != (f["mtime_ns"], f["size"]):
+                changed.append(p)
+        removed = sorted(set(files) - seen)
+        return {k: v for k, v in (("changed", changed), ("added", added), ("removed", removed)) if v}
+
+    def iter_devices(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        # -> (hostname, device) in parse order, one device dict at a time
+        s = self.strings
+        names = self._col("dev_name")
+        cols = [self._col("if_" + k) for k in IFACE_STR]
+        ibw, imtu, ivlan = self["if_bandwidth"].tolist(), self["if_mtu"].tolist(), self["if_vlan"].tolist()
+        inet = self._col("if_network")
+        onet, oarea = self["ospfnet_network"].tolist(), self["ospfnet_area"].tolist()
+        ooff, oproc = self["ospf_net"].tolist(), self["ospf_process"].tolist()
+        asn = self["bgp_asn"].tolist()
+        doff, dospf, dbgp = self["dev_if"].tolist(), self["dev_ospf"].tolist(), self["dev_bgp"].tolist()
+        for k, d in enumerate(names):
+            ifaces = [{"name": n, "description": de, "ip": ip, "mask": m, "bandwidth": b, "mtu": mt, "vlan": v,
+                       "network": net}
+                      for n, de, ip, m, b, mt, v, net in zip(*(c[doff[k]:doff[k + 1]] for c in cols),
+                                                             ibw[doff[k]:doff[k + 1]], imtu[doff[k]:doff[k + 1]],
+                                                             ivlan[doff[k]:doff[k + 1]], inet[doff[k]:doff[k + 1]])]
+            ospf = [{"process": oproc[p], "networks": [{"network": s[onet[j]], "area": s[oarea[j]]}
+                                                        for j in range(ooff[p], ooff[p + 1])]}
+                    for p in range(dospf[k], dospf[k + 1])]
+            yield d, {"hostname": d, "interfaces": ifaces,
+                      "routing": {"ospf": ospf, "bgp": [{"asn": x} for x in asn[dbgp[k]:dbgp[k + 1]]]}}
+
+    def devices(self) -> Dict[str, Any]:
+        return dict(self.iter_devices())
+
+    def store(self) -> DeviceStore:
+        # the devices as a columnar DeviceStore, without holding every device dict at once
+        return DeviceStore(self.iter_devices())
+
+    def graph(self) -> nx.Graph:
+        # the graph build_topology made, with the same node and neighbor order; needs no
+        # device dicts (a device node's "ospf" networks come from the ospf tables)
+        s = self.strings
+        names = self._col("node_name")
+        onet, ooff, dospf = self["ospfnet_network"].tolist(), self["ospf_net"].tolist(), self["dev_ospf"].tolist()
+        ospf = {d: [s[j] for j in onet[ooff[dospf[k]]:ooff[dospf[k + 1]]]] for k, d in enumerate(self._col("dev_name"))}
+        G = nx.Graph(mode=self.mode)
+        for n, kind, net in zip(names, self["node_kind"].tolist(), self["node_network"].tolist()):
+            if kind == 1:
+                G.add_node(n, kind="segment", network=s[net])
+            else:
+                G.add_node(n, kind=DEVICE_KIND, ospf=ospf[n])
+        enet, ebw, emtu = self["edge_network"].tolist(), self["edge_bandwidth"].tolist(), self["edge_mtu"].tolist()
+        ew = self["edge_weight"].tolist()
+        attrs = [{"network": s[net], "bandwidth": bw, "mtu": mtu} if w != w else
+                 {"network": s[net], "bandwidth": bw, "mtu": mtu, "weight": w}
+                 for net, bw, mtu, w in zip(enet, ebw, emtu, ew)]
+        eu, ev = self["edge_u"].tolist(), self["edge_v"].tolist()
+        off, adj_edge = self["adj_off"].tolist(), self["adj_edge"].tolist()
+        # filled directly rather than through add_edge, which cannot reproduce each node's
+        # neighbor order (path ties, and so loads, depend on it); both ends share one dict
+        adj = G._adj
+        for i, n in enumerate(names):
+            row = adj[n]
+            for e in adj_edge[off[i]:off[i + 1]]:
+                row[names[ev[e] if eu[e] == i else eu[e]]] = attrs[e]
+        return G
+
+def load_snapshot(path: str) -> Optional[Snapshot]:
+    # None if missing or written in another snapshot format
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("format") != SNAPSHOT_FORMAT:
+        return None
+    return Snapshot(path, meta)
+
+class SnapshotCache:
+    # iter_conf_dir's cache interface over a snapshot: configs whose mtime and size match
+    # the snapshot come from it, the rest are parsed
+    def __init__(self, snap: Snapshot):
+        self.files = snap.files()
+        self.devices = snap.devices() if snap.meta["parser_version"] == PARSER_VERSION else {}
+        self.names = list(self.devices)
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, cfg_path: str) -> Optional[Dict[str, Any]]:
+        f = self.files.get(os.path.abspath(cfg_path))
+        if f is not None and f["device"] >= 0 and self.devices:
+            st = os.stat(cfg_path)
+            if (st.st_mtime_ns, st.st_size) == (f["mtime_ns"], f["size"]):
+                self.stats["hits"] += 1
+                return self.devices[self.names[f["device"]]]
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, cfg_path: str, device: Dict[str, Any]):
+        pass
+
+    def save(self):
+        pass
@@ -0,0 +1,269 @@
+from __future__ import annotations
+from array import array
+from collections.abc import Mapping, MutableMapping, Sequence
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import numpy as np
+
+from .utils import ip_to_int, int_to_ip, mask_prefixlen
+
+# Columnar device store: the parsed devices as one set of interface columns instead of a
+# dict per interface. Interface names and descriptions are interned once per distinct
+# value; an address is a uint32 plus a prefix length, which also gives the mask and the
+# network (network id: network address << 6 | prefix length). Reading a device gives a
+# DeviceView, whose "interfaces" are IfaceViews: read-only mappings with the parser's
+# keys, so code written against the device dicts works unchanged, while build_topology
+# and the validators read the columns directly.
+#   if_device   device row        if_ip     address as uint32 (0 when there is none)
+#   if_name     string id         if_plen   prefix length, -1: no address (nor network)
+#   if_desc     string id         if_bw, if_mtu, if_vlan
+# Interfaces that do not fit the columns (extra or missing keys, an address, mask or
+# network the parser would not have produced, non-int numbers) are kept as they are in `odd`.
+# Replacing or deleting a device leaves its rows behind (`dead`) until compact().
+
+STORE_KINDS = ("columnar", "dicts")
+IFACE_KEYS = ("name", "description", "ip", "mask", "bandwidth", "mtu", "vlan", "network")
+MASK_BITS = [(0xFFFFFFFF << (32 - p)) & 0xFFFFFFFF for p in range(33)]
+MASKS = [int_to_ip(m) for m in MASK_BITS]
+_INT32 = 1 << 31
+
+def _int32(x) -> bool:
+    return type(x) is int and -_INT32 <= x < _INT32
+
+def network(ip: int, plen: int) -> str:
+    return f"{int_to_ip(ip & MASK_BITS[plen])}/{plen}" if plen >= 0 else ""
+
+def id_network(net: int) -> str:
+    return network(net >> 6, net & 63) if net >= 0 else ""
+
+class IfaceView(Mapping):
+    __slots__ = ("_s", "_r")
+
+    def __init__(self, store: "DeviceStore", row: int):
+        self._s = store
+        self._r = row
+
+    def __getitem__(self, key: str):
+        s, r = self._s, self._r
+        odd = s.odd.get(r)
+        if odd is not None:
+            return odd[key]
+        if key == "name":
+            return s.strings[s.if_name[r]]
+        if key == "description":
+            return s.strings[s.if_desc[r]]
+        if key == "ip":
+            return int_to_ip(s.if_ip[r]) if s.if_plen[r] >= 0 else ""
+        if key == "mask":
+            return MASKS[s.if_plen[r]] if s.if_plen[r] >= 0 else ""
+        if key == "bandwidth":
+            return s.if_bw[r]
+        if key == "mtu":
+            return s.if_mtu[r]
+        if key == "vlan":
+            return s.if_vlan[r]
+        if key == "network":
+            return network(s.if_ip[r], s.if_plen[r])
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        odd = self._s.odd.get(self._r)
+        return iter(odd if odd is not None else IFACE_KEYS)
+
+    def __len__(self) -> int:
+        odd = self._s.odd.get(self._r)
+        return len(odd if odd is not None else IFACE_KEYS)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: self[k] for k in self}
+
+    def __repr__(self):
+        return f"IfaceView({self.to_dict()!r})"
+
+class IfaceList(Sequence):
+    # a device's interfaces; indexing does not materialize the others
+    __slots__ = ("_s", "_start", "_end")
+
+    def __init__(self, store: "DeviceStore", start: int, end: int):
+        self._s = store
+        self._start = start
+        self._end = end
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return [IfaceView(self._s, r) for r in range(self._start, self._end)[k]]
+        n = self._end - self._start
+        if not -n <= k < n:
+            raise IndexError("interface index out of range")
+        return IfaceView(self._s, self._start + k % n)
+
+    def __iter__(self) -> Iterator[IfaceView]:
+        s = self._s
+        return (IfaceView(s, r) for r in range(self._start, self._end))
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self):
+        return repr([i.to_dict() for i in self])
+
+class DeviceView(Mapping):
+    __slots__ = ("_s", "_d")
+
+    def __init__(self, store: "DeviceStore", row: int):
+        self._s = store
+        self._d = row
+
+    def __getitem__(self, key: str):
+        if key == "interfaces":
+            s = self._s
+            if key not in s.dev_rest[self._d]:
+                raise KeyError(key)
+            return IfaceList(s, s.dev_if[self._d], s.dev_end[self._d])
+        return self._s.dev_rest[self._d][key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._s.dev_rest[self._d])
+
+    def __len__(self) -> int:
+        return len(self._s.dev_rest[self._d])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: [i.to_dict() for i in v] if k == "interfaces" else v for k, v in self.items()}
+
+    def __repr__(self):
+        return f"DeviceView({self.to_dict()!r})"
+
+class DeviceStore(MutableMapping):
+    # hostname -> DeviceView, in insertion order like the devices dict; built the same way,
+    # e.g. DeviceStore(iter_conf_dir(conf)) never holds more than one parsed device dict
+    def __init__(self, devices=None):
+        self.strings: List[str] = [""]  # id -> string; id 0 is ""
+        self._sid: Dict[str, int] = {"": 0}
+        self._dev: Dict[str, int] = {}  # hostname -> device row
+        self.dev_rest: List[Dict[str, Any]] = []  # per row: the device minus its interfaces
+        self.dev_if = array("i")  # per row: first interface row ...
+        self.dev_end = array("i")  # ... and one past the last
+        self.if_device = array("i")
+        self.if_name = array("i")
+        self.if_desc = array("i")
+        self.if_ip = array("I")
+        self.if_plen = array("b")
+        self.if_bw = array("q")
+        self.if_mtu = array("i")
+        self.if_vlan = array("i")
+        self.odd: Dict[int, Dict[str, Any]] = {}
+        self.dead = 0  # interface rows of replaced or deleted devices
+        if devices is not None:
+            self.update(devices)
+
+    def intern(self, s: str) -> int:
+        i = self._sid.get(s)
+        if i is None:
+            i = self._sid[s] = len(self.strings)
+            self.strings.append(s)
+        return i
+
+    def _append(self, dev_row: int, i) -> None:
+        name, desc, ip, mask = i.get("name"), i.get("description"), i.get("ip"), i.get("mask")
+        bw, mtu, vlan, net = i.get("bandwidth"), i.get("mtu"), i.get("vlan"), i.get("network")
+        fits = (tuple(i) == IFACE_KEYS and type(name) is str and type(desc) is str and type(net) is str
+                and type(bw) is int and -(1 << 63) <= bw < 1 << 63 and _int32(mtu) and _int32(vlan))
+        n, plen = 0, -1
+        if fits and (ip or mask):
+            n, plen = ip_to_int(ip) if type(ip) is str else -1, mask_prefixlen(mask) if type(mask) is str else -1
+            fits = n >= 0 and plen >= 0 and int_to_ip(n) == ip and MASKS[plen] == mask and network(n, plen) == net
+        elif fits:
+            fits = ip == "" and mask == "" and net == ""
+        if not fits:
+            self.odd[len(self.if_device)] = dict(i)
+            name = desc = ""
+            n, plen, bw, mtu, vlan = 0, -1, 0, 0, 0
+        self.if_device.append(dev_row)
+        self.if_name.append(self.intern(name))
+        self.if_desc.append(self.intern(desc))
+        self.if_ip.append(max(n, 0))
+        self.if_plen.append(plen)
+        self.if_bw.append(bw)
+        self.if_mtu.append(mtu)
+        self.if_vlan.append(vlan)
+
+    def __setitem__(self, d: str, dev) -> None:
+        old = self._dev.get(d)
+        if old is not None:
+            self.dead += self.dev_end[old] - self.dev_if[old]
+        row = len(self.dev_rest)
+        self.dev_rest.append({k: None if k == "interfaces" else v for k, v in dev.items()})
+        self.dev_if.append(len(self.if_device))
+        for i in dev.get("interfaces", ()):
+            self._append(row, i)
+        self.dev_end.append(len(self.if_device))
+        self._dev[d] = row
+
+    def __getitem__(self, d: str) -> DeviceView:
+        return DeviceView(self, self._dev[d])
+
+    def __delitem__(self, d: str) -> None:
+        row = self._dev.pop(d)
+        self.dead += self.dev_end[row] - self.dev_if[row]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._dev)
+
+    def __len__(self) -> int:
+        return len(self._dev)
+
+    def __contains__(self, d) -> bool:
+        return d in self._dev
+
+    @property
+    def interfaces(self) -> int:
+        return len(self.if_device) - self.dead
+
+    @property
+    def regular(self) -> bool:
+        # every interface is in the columns, so the columnar fast paths apply
+        return not self.odd
+
+    def compact(self) -> None:
+        # drop dead rows and unused strings; views taken before are no longer valid
+        fresh = DeviceStore((d, DeviceView(self, row)) for d, row in self._dev.items())
+        self.__dict__.update(fresh.__dict__)
+
+    def rows(self) -> np.ndarray:
+        # live interface rows in devices order
+        if not self.dead:
+            return np.arange(len(self.if_device))
+        return np.concatenate([np.arange(self.dev_if[r], self.dev_end[r]) for r in self._dev.values()]
+                              or [np.arange(0)])
+
+    def column(self, name: str) -> np.ndarray:
+        # a copy, so that the store can still grow (a live buffer export would block appends)
+        col = getattr(self, name)
+        return np.array(col, dtype=col.typecode)
+
+    def network_ids(self) -> np.ndarray:
+        # per interface row: network address << 6 | prefix length, -1 without an address
+        plen = self.column("if_plen").astype(np.int64)
+        mask = np.array(MASK_BITS, dtype=np.int64)[np.maximum(plen, 0)]
+        return np.where(plen >= 0, (self.column("if_ip").astype(np.int64) & mask) << 6 | plen, -1)
+
+    def owners(self) -> List[Optional[str]]:
+        # device row -> hostname (None for replaced or deleted rows)
+        out: List[Optional[str]] = [None] * len(self.dev_rest)
+        for d, row in self._dev.items():
+            out[row] = d
+        return out
+
+    def spans(self) -> Iterator[Tuple[str, int, int]]:
+        # (hostname, first interface row, end) in devices order
+        dev_if, dev_end = self.dev_if, self.dev_end
+        for d, row in self._dev.items():
+            yield d, dev_if[row], dev_end[row]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {d: dev.to_dict() for d, dev in self.items()}
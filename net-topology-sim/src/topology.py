@@ -1,8 +1,12 @@
 from __future__ import annotations
 import networkx as nx
-from typing import Dict, Any, Tuple, List
-import itertools, re
+from typing import Dict, Any, Tuple, List, Optional
+from collections import defaultdict
+import bisect, itertools, re
+import numpy as np
 from .utils import same_subnet
+from .store import DeviceStore, network, id_network
+from .loadengine import RoutingMatrix, aggregate_demands
 
 def _neighbor_from_desc(desc: str) -> str:
     # naive: look for 'to <NAME>'
@@ -11,10 +15,42 @@ def _neighbor_from_desc(desc: str) -> str:
         return m.group(1)
     return ""
 
-def build_topology(devices: Dict[str, Any]) -> nx.Graph:
-    G = nx.Graph()
+SEGMENT_PREFIX = "seg:"
+TOPOLOGY_MODES = ("mesh", "segment")
+DEVICE_KIND = "router-or-switch"
+
+def is_segment(G: nx.Graph, n: str) -> bool:
+    return G.nodes[n].get("kind") == "segment"
+
+def _node_attrs(dev: Dict[str, Any]) -> Dict[str, Any]:
+    # OSPF network statements, used by the simulator's link-state routing
+    ospf = [n["network"] for p in dev.get("routing", {}).get("ospf", []) for n in p.get("networks", [])]
+    return {"kind": DEVICE_KIND, "ospf": ospf}
+
+def _link_attrs(net: str, ia: Dict[str, Any], ib: Dict[str, Any]) -> Dict[str, Any]:
+    return {"network": net, "bandwidth": min(ia.get("bandwidth", 0) or 0, ib.get("bandwidth", 0) or 0),
+            "mtu": min(ia.get("mtu", 1500), ib.get("mtu", 1500))}
+
+def _star_attrs(net: str, ia: Dict[str, Any]) -> Dict[str, Any]:
+    return {"network": net, "bandwidth": ia.get("bandwidth", 0) or 0, "mtu": ia.get("mtu", 1500), "weight": 0.5}
+
+def _desc_attrs(iface: Dict[str, Any]) -> Dict[str, Any]:
+    return {"network": iface.get("network", ""), "bandwidth": iface.get("bandwidth", 0) or 0,
+            "mtu": iface.get("mtu", 1500)}
+
+def build_topology(devices: Dict[str, Any], mode: str = "mesh") -> nx.Graph:
+    # mode "mesh": every pair of devices on a subnet gets an edge (k*(k-1)/2 edges per LAN)
+    # mode "segment": subnets with more than two attachments become one "seg:<network>" node
+    #   with a star edge per attachment, like an OSPF pseudonode (k edges per LAN).
+    #   Star edges weigh 0.5 so device->segment->device costs the same as a direct link.
+    if mode not in TOPOLOGY_MODES:
+        raise ValueError(f"unknown topology mode {mode!r}")
+    G = nx.Graph(mode=mode)
     for dname, dev in devices.items():
-        G.add_node(dname, kind="router-or-switch")
+        G.add_node(dname, **_node_attrs(dev))
+    if isinstance(devices, DeviceStore) and devices.regular:
+        _store_edges(G, devices, mode)
+        return G
 
     # edges: by description and by same subnet
     # index subnets
@@ -26,32 +62,252 @@ def build_topology(devices: Dict[str, Any]) -> nx.Graph:
                 subnet_map.setdefault(net, []).append((dname, iface))
 
     # connect by same subnet
+    lans = {}  # device -> set of segment nodes it attaches to
     for net, lst in subnet_map.items():
-        if len(lst) >= 2:
+        if mode == "segment" and len(lst) > 2:
+            seg = SEGMENT_PREFIX + net
+            G.add_node(seg, kind="segment", network=net)
+            for a, ia in lst:
+                G.add_edge(a, seg, **_star_attrs(net, ia))
+                lans.setdefault(a, set()).add(seg)
+        elif len(lst) >= 2:
             for (a, ia), (b, ib) in itertools.combinations(lst, 2):
-                bw = min(ia.get("bandwidth", 0) or 0, ib.get("bandwidth", 0) or 0)
-                mtu = min(ia.get("mtu", 1500), ib.get("mtu", 1500))
-                G.add_edge(a, b, network=net, bandwidth=bw, mtu=mtu)
+                G.add_edge(a, b, **_link_attrs(net, ia, ib))
 
-    # connect by description hints (if not already connected)
+    # connect by description hints (if not already connected, directly or via a segment)
     for dname, dev in devices.items():
         for iface in dev.get("interfaces", []):
             n = _neighbor_from_desc(iface.get("description", ""))
-            if n and n in devices and not G.has_edge(dname, n):
-                bw = iface.get("bandwidth", 0) or 0
-                mtu = iface.get("mtu", 1500)
-                G.add_edge(dname, n, network=iface.get("network", ""), bandwidth=bw, mtu=mtu)
+            if n and n in devices and not G.has_edge(dname, n) and not (lans.get(dname, set()) & lans.get(n, set())):
+                G.add_edge(dname, n, **_desc_attrs(iface))
 
     return G
 
-def compute_link_loads(G: nx.Graph, traffic_pairs: List[Tuple[str,str,int]]) -> Dict[Tuple[str,str], int]:
+def _store_edges(G: nx.Graph, store: DeviceStore, mode: str):
+    # build_topology's edges straight from the store's columns, added in the same order:
+    # networks by first attachment, attachments in devices order, then description hints
+    rows = store.rows()
+    net = store.network_ids()[rows]
+    att = net >= 0
+    _, first, inv = np.unique(net[att], return_index=True, return_inverse=True)
+    order = np.argsort(first[inv], kind="stable")
+    key = first[inv][order]
+    att, net = rows[att][order].tolist(), net[att][order].tolist()
+    bounds = [0] + (np.flatnonzero(np.diff(key)) + 1).tolist() + [len(att)]
+    owner, dev, s = store.owners(), store.if_device.tolist(), store.strings
+    bw, mtu = store.if_bw.tolist(), store.if_mtu.tolist()
+
+    lans = {}
+    for g in range(len(bounds) - 1):
+        lst = att[bounds[g]:bounds[g + 1]]
+        if len(lst) < 2:
+            continue
+        n = id_network(net[bounds[g]])
+        if mode == "segment" and len(lst) > 2:
+            seg = SEGMENT_PREFIX + n
+            G.add_node(seg, kind="segment", network=n)
+            for r in lst:
+                a = owner[dev[r]]
+                G.add_edge(a, seg, network=n, bandwidth=bw[r], mtu=mtu[r], weight=0.5)
+                lans.setdefault(a, set()).add(seg)
+        else:
+            for ra, rb in itertools.combinations(lst, 2):
+                G.add_edge(owner[dev[ra]], owner[dev[rb]], network=n, bandwidth=min(bw[ra], bw[rb]),
+                           mtu=min(mtu[ra], mtu[rb]))
+
+    # description hints: the regex runs once per distinct description
+    descs = store.column("if_desc")[rows]
+    hint = {}
+    for i in np.unique(descs).tolist():
+        n = _neighbor_from_desc(s[i])
+        if n and n in store:
+            hint[i] = n
+    if not hint:
+        return
+    sel = np.isin(descs, list(hint))
+    for r, i in zip(rows[sel].tolist(), descs[sel].tolist()):
+        a, n = owner[dev[r]], hint[i]
+        if not G.has_edge(a, n) and not (lans.get(a, set()) & lans.get(n, set())):
+            G.add_edge(a, n, network=network(store.if_ip[r], store.if_plen[r]), bandwidth=bw[r], mtu=mtu[r])
+
+class TopologyIndex:
+    # What build_topology derives from the devices, kept so patch_topology can rebuild
+    # only the part of the graph around changed devices. Entries are (device, interface
+    # position), sorted in devices-dict order like build_topology's own iteration.
+    def __init__(self, devices: Dict[str, Any]):
+        self.order: Dict[str, int] = {}  # device -> rank; replaced devices keep theirs, new ones go last
+        self.nets: Dict[str, List[Tuple[str, int]]] = defaultdict(list)  # network -> attachments
+        self.described: Dict[str, List[Tuple[str, int]]] = defaultdict(list)  # name -> ifaces saying "to <name>"
+        self.next_rank = 0
+        for d, dev in devices.items():
+            self.add(d, dev)
+
+    def rank(self, entry: Tuple[str, int]) -> Tuple[int, int]:
+        return self.order[entry[0]], entry[1]
+
+    def _insert(self, lst: List[Tuple[str, int]], entry: Tuple[str, int]):
+        if not lst or self.rank(lst[-1]) < self.rank(entry):
+            lst.append(entry)
+        else:
+            bisect.insort(lst, entry, key=self.rank)
+
+    def add(self, d: str, dev: Dict[str, Any]):
+        if d not in self.order:
+            self.order[d] = self.next_rank
+            self.next_rank += 1
+        for k, iface in enumerate(dev.get("interfaces", [])):
+            net = iface.get("network", "")
+            if net:
+                self._insert(self.nets[net], (d, k))
+            n = _neighbor_from_desc(iface.get("description", ""))
+            if n:
+                self._insert(self.described[n], (d, k))
+
+    def remove(self, d: str, dev: Dict[str, Any], forget: bool = False):
+        for table, keys in ((self.nets, {i.get("network", "") for i in dev.get("interfaces", [])}),
+                            (self.described, {_neighbor_from_desc(i.get("description", ""))
+                                              for i in dev.get("interfaces", [])})):
+            for key in keys - {""}:
+                rest = [e for e in table.get(key, ()) if e[0] != d]
+                if rest:
+                    table[key] = rest
+                else:
+                    table.pop(key, None)
+        if forget:
+            self.order.pop(d, None)
+
+def _shares_segment(G: nx.Graph, a: str, b: str) -> bool:
+    return any(is_segment(G, s) and G.has_edge(b, s) for s in G[a])
+
+def patch_topology(G: nx.Graph, devices: Dict[str, Any], tx: TopologyIndex,
+                   changes: Dict[str, Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    # changes: device -> new parsed device, or None if it is gone. Applies them to `devices`,
+    # `tx` and G in place: every edge touching a changed device, or a device sharing a subnet
+    # with one, is removed and rebuilt the way build_topology would, so G ends up equal to
+    # build_topology(devices) (node and edge iteration order aside).
+    # -> {"devices", "nets", "segments", "rebuilt": pairs looked at, "edges": pairs added,
+    #     removed or with new attributes, "nodes": nodes whose links changed, "structural"}
+    segment = G.graph.get("mode") == "segment"
+    nets = set()
+    for d, dev in changes.items():
+        for old_new in (devices.get(d), dev):
+            if old_new is not None:
+                nets |= {i.get("network", "") for i in old_new.get("interfaces", [])} - {""}
+    touched = set(changes) | {m for net in nets for m, _ in tx.nets.get(net, ())}
+    for d, dev in changes.items():
+        if d in devices:
+            tx.remove(d, devices[d], forget=dev is None)
+        if dev is None:
+            devices.pop(d, None)
+        else:
+            devices[d] = dev
+            tx.add(d, dev)
+    touched |= {m for net in nets for m, _ in tx.nets.get(net, ())}
+
+    before = {frozenset((a, b)): attrs for a in touched if a in G for b, attrs in G[a].items()}
+    G.remove_edges_from(tuple(e) * (2 if len(e) == 1 else 1) for e in before)
+    nodes = set()
+    for net in nets:
+        seg = SEGMENT_PREFIX + net
+        if seg in G:
+            G.remove_node(seg)
+            nodes.add(seg)
+    for d, dev in changes.items():
+        if dev is None:
+            if d in G:
+                G.remove_node(d)
+                nodes.add(d)
+        else:
+            if d not in G:
+                nodes.add(d)
+            G.add_node(d, **_node_attrs(dev))
+    alive = sorted((a for a in touched if a in devices), key=tx.order.__getitem__)
+
+    # subnet links, in build_topology's network order (first attachment) so that where two
+    # devices share several subnets the same one ends up on the edge
+    lan_nets = {i.get("network", "") for a in alive for i in devices[a].get("interfaces", [])} - {""}
+    for net in sorted(lan_nets, key=lambda n: tx.rank(tx.nets[n][0])):
+        lst = tx.nets[net]
+        if segment and len(lst) > 2:
+            seg = SEGMENT_PREFIX + net
+            if seg not in G:
+                G.add_node(seg, kind="segment", network=net)
+            for a, k in lst:
+                if a in touched:
+                    G.add_edge(a, seg, **_star_attrs(net, devices[a]["interfaces"][k]))
+        elif len(lst) >= 2:
+            pos = [i for i, (a, _) in enumerate(lst) if a in touched]
+            for i, j in sorted({(min(i, j), max(i, j)) for i in pos for j in range(len(lst)) if j != i}):
+                (a, ka), (b, kb) = lst[i], lst[j]
+                G.add_edge(a, b, **_link_attrs(net, devices[a]["interfaces"][ka], devices[b]["interfaces"][kb]))
+
+    # description hints from or to the touched devices, in build_topology's order
+    hints = set()
+    for a in alive:
+        for k, iface in enumerate(devices[a].get("interfaces", [])):
+            n = _neighbor_from_desc(iface.get("description", ""))
+            if n and n in devices:
+                hints.add((a, k, n))
+        hints.update((x, k, a) for x, k in tx.described.get(a, ()))
+    for x, k, n in sorted(hints, key=lambda h: tx.rank(h[:2])):
+        if not G.has_edge(x, n) and not _shares_segment(G, x, n):
+            G.add_edge(x, n, **_desc_attrs(devices[x]["interfaces"][k]))
+
+    after = {frozenset((a, b)): attrs for a in alive for b, attrs in G[a].items()}
+    edges = {e for e in before.keys() | after.keys() if before.get(e) != after.get(e)}
+    for e in edges:
+        nodes |= e
+    return {
+        "devices": set(changes),
+        "nets": nets,
+        "segments": {SEGMENT_PREFIX + net for net in nets},
+        "rebuilt": before.keys() | after.keys(),
+        "edges": edges,
+        "nodes": nodes,
+        "structural": any(e not in before or e not in after for e in edges),
+    }
+
+def path_weight(G: nx.Graph):
+    # segment graphs need the 0.5 star weights; mesh graphs keep plain hop-count BFS
+    return "weight" if G.graph.get("mode") == "segment" else None
+
+def compute_link_loads(G: nx.Graph, traffic_pairs: List[Tuple[str,str,int]], ecmp: bool = False) -> Dict[Tuple[str,str], int]:
     # traffic_pairs: list of (src_device, dst_device, demand_mbps)
+    # One shortest-path search per source, loads accumulated through a sparse routing
+    # matrix. ecmp=True splits each demand evenly over equal-cost next hops.
+    flows, demand = aggregate_demands(traffic_pairs)
+    rm = RoutingMatrix.build(G, flows, ecmp=ecmp, weight=path_weight(G))
+    totals = rm.loads(demand)
+    if not ecmp and all(isinstance(d, int) for d in demand):
+        totals = totals.round().astype(int)
+    return dict(zip(rm.edges, totals.tolist()))
+
+def compute_class_loads(G: nx.Graph, by_class: Dict[str, List[Tuple[str,str,int]]],
+                        ecmp: bool = False) -> Dict[str, Dict[Tuple[str,str], int]]:
+    # class -> compute_link_loads of that class's demands, routed once for the union of the
+    # classes' flows: one demand vector per class over the same routing matrix
+    flows, _ = aggregate_demands([p for pairs in by_class.values() for p in pairs])
+    col = {f: j for j, f in enumerate(flows)}
+    rm = RoutingMatrix.build(G, flows, ecmp=ecmp, weight=path_weight(G))
+    out = {}
+    for cls, pairs in by_class.items():
+        demand = np.zeros(len(flows))
+        for src, dst, d in pairs:
+            demand[col[(src, dst)]] += d
+        totals = rm.loads(demand)
+        if not ecmp and all(isinstance(d, int) for _, _, d in pairs):
+            totals = totals.round().astype(int)
+        out[cls] = dict(zip(rm.edges, totals.tolist()))
+    return out
+
+# Original per-pair implementation; kept as the reference for bench/bench_loads.py
+def compute_link_loads_pairwise(G: nx.Graph, traffic_pairs: List[Tuple[str,str,int]]) -> Dict[Tuple[str,str], int]:
     loads = { tuple(sorted((u,v))): 0 for u,v in G.edges() }
     for src, dst, demand in traffic_pairs:
         if src not in G or dst not in G:
             continue
         try:
-            path = nx.shortest_path(G, src, dst)
+            path = nx.shortest_path(G, src, dst, weight=path_weight(G))
             for u,v in zip(path, path[1:]):
                 e = tuple(sorted((u,v)))
                 loads[e] = loads.get(e, 0) + demand
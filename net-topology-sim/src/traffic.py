@@ -0,0 +1,263 @@
+from __future__ import annotations
+import csv, gzip, json
+from array import array
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+
+from .ndjson import _decode, is_ndjson
+from .validators import _no_gc
+
+# Demand input for plan-load and serve.
+#   traffic.json  {"endpoints": [...], "assumptions": {"use_peak": bool}}: endpoints are paired
+#                 in order, (0, 1), (2, 3), ..., with the demand taken from the first of each pair
+#   flow records  .csv or .ndjson/.jsonl (either optionally .gz), one flow per row with src, dst,
+#                 avg, peak (Mbps) and class. Read in chunks and summed per (src, dst, class) as
+#                 they stream, so memory grows with the distinct device pairs, not with the rows.
+#                 With a time column, read_series keeps one demand vector per interval.
+
+TRAFFIC_FORMATS = ("auto", "json", "csv", "ndjson")
+MEASURES = ("peak", "avg")
+DEFAULT_CLASS = "default"
+CHUNK_BYTES = 1 << 22
+MAX_ERRORS = 20  # malformed rows listed; the rest are only counted
+FIELDS = {
+    "src": ("src", "src_device", "source"),
+    "dst": ("dst", "dst_device", "destination"),
+    "avg": ("avg", "avg_mbps"),
+    "peak": ("peak", "peak_mbps"),
+    "class": ("class", "traffic_class", "cls"),
+    "time": ("time", "interval", "timestamp", "ts"),
+}
+
+Demand = Tuple[str, str, Any]
+
+class TrafficMatrix:
+    def __init__(self):
+        self.sums: Dict[Tuple[str, str, str], List[float]] = {}  # (src, dst, class) -> [avg, peak]
+        self.rows = 0
+        self.skipped = 0
+        self.use_peak = True  # default measure; traffic.json's assumptions can say otherwise
+
+    def add(self, src: str, dst: str, cls: str, avg, peak):
+        self.rows += 1
+        v = self.sums.get((src, dst, cls))
+        if v is None:
+            self.sums[(src, dst, cls)] = [avg, peak]
+        else:
+            v[0] += avg
+            v[1] += peak
+
+    def classes(self) -> List[str]:
+        return sorted({k[2] for k in self.sums})
+
+    def measure(self, measure: Optional[str] = None) -> str:
+        return measure or ("peak" if self.use_peak else "avg")
+
+    def pairs(self, measure: Optional[str] = None, classes: Optional[List[str]] = None) -> List[Demand]:
+        # -> [(src, dst, demand)], one per device pair in first-seen order, summed over `classes`
+        col = MEASURES.index(self.measure(measure)) ^ 1  # sums hold [avg, peak]
+        want = set(classes) if classes else None
+        out: Dict[Tuple[str, str], Any] = {}
+        for (src, dst, cls), v in self.sums.items():
+            if want is None or cls in want:
+                out[(src, dst)] = out.get((src, dst), 0) + v[col]
+        return [(s, d, _num(x)) for (s, d), x in out.items()]
+
+    def by_class(self, measure: Optional[str] = None,
+                 classes: Optional[List[str]] = None) -> Dict[str, List[Demand]]:
+        col = MEASURES.index(self.measure(measure)) ^ 1
+        out: Dict[str, List[Demand]] = {}
+        for (src, dst, cls), v in self.sums.items():
+            if not classes or cls in classes:
+                out.setdefault(cls, []).append((src, dst, _num(v[col])))
+        return {c: out[c] for c in sorted(out)}
+
+def _num(x):
+    # whole numbers stay ints, so compute_link_loads keeps integer loads like traffic.json gives
+    return int(x) if isinstance(x, float) and x.is_integer() else x
+
+def traffic_format(path: str, fmt: str = "auto") -> str:
+    if fmt != "auto":
+        return fmt
+    base = path[:-3] if path.endswith(".gz") else path
+    if base.endswith(".csv"):
+        return "csv"
+    return "ndjson" if is_ndjson(base) else "json"
+
+def _open(path: str):
+    return gzip.open(path, "rt", newline="") if path.endswith(".gz") else open(path, newline="")
+
+def _columns(names: List[str], path: str) -> Dict[str, Optional[int]]:
+    # header -> position of each field (None if absent); avg and peak stand in for each other
+    pos = {n.strip().lower(): i for i, n in enumerate(names)}
+    cols = {f: next((pos[a] for a in aliases if a in pos), None) for f, aliases in FIELDS.items()}
+    if cols["src"] is None or cols["dst"] is None or (cols["avg"] is None and cols["peak"] is None):
+        raise ValueError(f"{path}: flow records need src, dst and avg and/or peak columns, got {names}")
+    cols["avg"] = cols["peak"] if cols["avg"] is None else cols["avg"]
+    cols["peak"] = cols["avg"] if cols["peak"] is None else cols["peak"]
+    return cols
+
+def _value(x) -> float:
+    return float(x) if x not in ("", None) else 0.0
+
+def _read_json(path: str, tm: TrafficMatrix):
+    data = json.load(open(path))
+    tm.use_peak = data.get("assumptions", {}).get("use_peak", True)
+    eps = data.get("endpoints", [])
+    for i in range(0, len(eps) - 1, 2):
+        a, b = eps[i], eps[i + 1]
+        tm.add(a["device"], b["device"], DEFAULT_CLASS, int(a.get("avg_mbps", 0) or 0), int(a.get("peak_mbps") or 0))
+
+def _csv_records(path: str, bad, chunk_bytes: int):
+    # -> (src, dst, class, avg, peak, time or None) per well-formed row; bad(row, message) for the rest
+    with _open(path) as f:
+        header = next(csv.reader([f.readline()]), None)
+        if not header:
+            return
+        c = _columns(header, path)
+        si, di, ai, pi, ci, ti = c["src"], c["dst"], c["avg"], c["peak"], c["class"], c["time"]
+        line = 1
+        while True:
+            chunk = f.readlines(chunk_bytes)
+            if not chunk:
+                break
+            for row in csv.reader(chunk):
+                line += 1
+                try:
+                    avg, peak = row[ai], row[pi]
+                    yield (row[si], row[di], (row[ci] if ci is not None else "") or DEFAULT_CLASS,
+                           float(avg) if avg else 0.0, float(peak) if peak else 0.0,
+                           row[ti] if ti is not None else None)
+                except ValueError as e:
+                    bad(line, e)
+                except IndexError:
+                    if row:
+                        bad(line, f"{len(row)} columns, header has {len(header)}")
+
+def _ndjson_records(path: str, bad, chunk_bytes: int):
+    names: Dict[str, str] = {}
+    with (gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")) as f:
+        line = 0
+        while True:
+            chunk = f.readlines(chunk_bytes)
+            if not chunk:
+                break
+            for raw in chunk:
+                line += 1
+                if not raw.strip():
+                    continue
+                try:
+                    r = _decode(raw)
+                    if not names:  # field names of the first record, for all of them
+                        c = _columns(list(r), path)
+                        keys = list(r)
+                        names = {f: keys[i] if i is not None else "" for f, i in c.items()}
+                    t = r.get(names["time"])
+                    rec = (str(r[names["src"]]), str(r[names["dst"]]), str(r.get(names["class"]) or DEFAULT_CLASS),
+                           _value(r.get(names["avg"])), _value(r.get(names["peak"])), None if t is None else str(t))
+                except (KeyError, TypeError, ValueError) as e:
+                    if not names:
+                        raise
+                    bad(line, e)
+                    continue
+                yield rec
+
+def _records(path: str, fmt: str, tm: TrafficMatrix, errors, chunk_bytes: int):
+    def bad(line, e):
+        tm.skipped += 1
+        if errors is not None and len(errors) < MAX_ERRORS:
+            errors.append({"row": line, "error": str(e)})
+    return (_csv_records if fmt == "csv" else _ndjson_records)(path, bad, chunk_bytes)
+
+def read_traffic(path: str, fmt: str = "auto", errors: Optional[List[Dict[str, Any]]] = None,
+                 chunk_bytes: int = CHUNK_BYTES) -> TrafficMatrix:
+    # errors: filled with the first MAX_ERRORS malformed flow records ({"row", "error"}); they are skipped
+    tm = TrafficMatrix()
+    fmt = traffic_format(path, fmt)
+    if fmt == "json":
+        _read_json(path, tm)
+    elif fmt in ("csv", "ndjson"):
+        sums = tm.sums
+        get = sums.get
+        with _no_gc():  # the sums only grow; collections would keep walking them
+            # tm.add inlined: this loop runs once per flow record
+            for src, dst, cls, avg, peak, _ in _records(path, fmt, tm, errors, chunk_bytes):
+                v = get((src, dst, cls))
+                if v is None:
+                    sums[(src, dst, cls)] = [avg, peak]
+                else:
+                    v[0] += avg
+                    v[1] += peak
+                tm.rows += 1
+    else:
+        raise ValueError(f"unknown traffic format {fmt}; one of {', '.join(TRAFFIC_FORMATS)}")
+    return tm
+
+def load_traffic(path: str, fmt: str = "auto", measure: Optional[str] = None,
+                 classes: Optional[List[str]] = None) -> List[Demand]:
+    return read_traffic(path, fmt).pairs(measure, classes)
+
+class DemandSeries:
+    # one demand vector per interval: demand[j, t] for flow j = (src, dst) in interval labels[t]
+    def __init__(self, flows: List[Tuple[str, str]], labels: List[str], demand: np.ndarray,
+                 rows: int = 0, skipped: int = 0):
+        self.flows = flows
+        self.labels = labels
+        self.demand = demand
+        self.rows = rows
+        self.skipped = skipped
+
+def _label_order(labels: List[str]) -> List[int]:
+    # numeric labels (epoch seconds, interval numbers) by value, anything else as text
+    try:
+        keys = [float(x) for x in labels]
+    except ValueError:
+        keys = labels
+    return sorted(range(len(labels)), key=keys.__getitem__)
+
+def read_series(path: str, fmt: str = "auto", measure: Optional[str] = None,
+                classes: Optional[List[str]] = None, errors: Optional[List[Dict[str, Any]]] = None,
+                chunk_bytes: int = CHUNK_BYTES, by_time: bool = True) -> DemandSeries:
+    # Flow records with a time column, summed per (src, dst) and interval over `classes`. Memory
+    # is the dense flows x intervals matrix, never the rows. Records without a time (all of
+    # them with by_time=False, and traffic.json) fall in one interval, "all".
+    fmt = traffic_format(path, fmt)
+    if fmt == "json":
+        tm = read_traffic(path, fmt)
+        pairs = tm.pairs(measure, classes)
+        return DemandSeries([(s, d) for s, d, _ in pairs], ["all"],
+                            np.array([x for _, _, x in pairs], dtype=np.float64).reshape(len(pairs), 1), tm.rows)
+    if fmt not in ("csv", "ndjson"):
+        raise ValueError(f"unknown traffic format {fmt}; one of {', '.join(TRAFFIC_FORMATS)}")
+    peak = (measure or "peak") == "peak"
+    want = set(classes) if classes else None
+    flows: Dict[Tuple[str, str], int] = {}
+    labels: Dict[str, int] = {}
+    acc = np.zeros((1024, 16))
+    rows, cols, vals = array("q"), array("q"), array("d")
+
+    def flush():
+        nonlocal acc, rows, cols, vals
+        if len(flows) > acc.shape[0] or len(labels) > acc.shape[1]:
+            grown = np.zeros((max(len(flows), acc.shape[0] * 2), max(len(labels), acc.shape[1] * 2)))
+            grown[:acc.shape[0], :acc.shape[1]] = acc
+            acc = grown
+        np.add.at(acc, (np.frombuffer(rows, dtype=np.int64), np.frombuffer(cols, dtype=np.int64)),
+                  np.frombuffer(vals, dtype=np.float64))
+        rows, cols, vals = array("q"), array("q"), array("d")
+
+    tm = TrafficMatrix()
+    with _no_gc():
+        for src, dst, cls, a, p, t in _records(path, fmt, tm, errors, chunk_bytes):
+            if want is not None and cls not in want:
+                continue
+            tm.rows += 1
+            rows.append(flows.setdefault((src, dst), len(flows)))
+            cols.append(labels.setdefault("all" if t is None or not by_time else t, len(labels)))
+            vals.append(p if peak else a)
+            if len(rows) >= 1 << 20:
+                flush()
+        flush()
+    order = _label_order(list(labels))
+    names = list(labels)
+    return DemandSeries(list(flows), [names[i] for i in order], acc[:len(flows), order], tm.rows, tm.skipped)
@@ -1,14 +1,44 @@
 from __future__ import annotations
 from dataclasses import dataclass
 import ipaddress
+from functools import lru_cache
 from typing import Optional, Tuple
 
-def ip_mask_to_network(ip: str, mask: str) -> str:
+_DIGITS = frozenset("0123456789")
+
+def ip_to_int(ip: str) -> int:
+    # same acceptance rules as ipaddress.IPv4Address, -1 if invalid
+    parts = ip.split(".")
+    if len(parts) != 4:
+        return -1
+    n = 0
+    for p in parts:
+        if not p or len(p) > 3 or not _DIGITS.issuperset(p) or (len(p) > 1 and p[0] == "0"):
+            return -1
+        o = int(p)
+        if o > 255:
+            return -1
+        n = (n << 8) | o
+    return n
+
+def int_to_ip(n: int) -> str:
+    return f"{n >> 24}.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255}"
+
+@lru_cache(maxsize=None)
+def mask_prefixlen(mask: str) -> int:
+    # netmask or hostmask, as accepted by ipaddress; -1 if invalid
     try:
-        net = ipaddress.IPv4Network((ip, mask), strict=False)
-        return str(net)
+        return ipaddress.IPv4Network(("0.0.0.0", mask)).prefixlen
     except Exception:
+        return -1
+
+def ip_mask_to_network(ip: str, mask: str) -> str:
+    # hot path of the parser: avoids building IPv4Network objects per interface
+    plen = mask_prefixlen(mask)
+    n = ip_to_int(ip)
+    if plen < 0 or n < 0:
         return ""
+    return f"{int_to_ip(n & ((0xFFFFFFFF << (32 - plen)) & 0xFFFFFFFF))}/{plen}"
 
 def same_subnet(ip1: str, mask1: str, ip2: str, mask2: str) -> bool:
     try:
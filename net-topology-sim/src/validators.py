@@ -1,8 +1,14 @@
 from __future__ import annotations
+import multiprocessing as mp
+import contextlib, gc, json, os, re, time
 import networkx as nx
-from typing import Dict, Any, List, Tuple, Set
-from collections import defaultdict
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Any, List, Optional, Tuple, Set
+from collections import Counter, defaultdict
 from .utils import same_subnet
+from .topology import is_segment
+from .store import DeviceStore
 
 def duplicate_ips(devices: Dict[str, Any]) -> List[Dict[str, Any]]:
     seen = defaultdict(list)  # ip -> list[(dev, iface)]
@@ -25,6 +31,8 @@ def vlan_mismatches(G: nx.Graph, devices: Dict[str, Any]) -> List[Dict[str, Any]
         net = data.get("network","")
         if not net: 
             continue
+        if is_segment(G, u) or is_segment(G, v):
+            continue  # checked once per segment below
         u_vlans = set()
         v_vlans = set()
         for i in devices[u]["interfaces"]:
@@ -35,6 +43,16 @@ def vlan_mismatches(G: nx.Graph, devices: Dict[str, Any]) -> List[Dict[str, Any]
                 v_vlans.add(i.get("vlan",0))
         if u_vlans and v_vlans and u_vlans != v_vlans:
             issues.append({"type":"vlan_mismatch","link":(u,v),"u_vlans":list(u_vlans),"v_vlans":list(v_vlans)})
+    # LAN segments: all attached devices should agree, compared once per segment instead of per pair
+    for seg in G.nodes():
+        if not is_segment(G, seg):
+            continue
+        net = G.nodes[seg]["network"]
+        member_vlans = {}
+        for d in G.neighbors(seg):
+            member_vlans[d] = sorted({i.get("vlan",0) for i in devices[d]["interfaces"] if i.get("network","") == net})
+        if len({tuple(v) for v in member_vlans.values()}) > 1:
+            issues.append({"type":"vlan_mismatch","segment":seg,"member_vlans":member_vlans})
     return issues
 
 def mtu_mismatches(G: nx.Graph) -> List[Dict[str, Any]]:
@@ -52,6 +70,62 @@ def loops(G: nx.Graph) -> List[Dict[str, Any]]:
         return [{"type":"loop_detected","cycle":c} for c in cycles]
     return []
 
+# Scalable alternative to enumerating a cycle basis: one finding per biconnected
+# component that contains a cycle, with its cyclomatic number (independent loops,
+# E - V + 1) and at most max_cycles example cycles. Linear in the graph size plus
+# the length of the sampled cycles.
+LOOP_MODES = ("summary", "basis")
+LOOP_SCOPES = ("all", "l2")
+MAX_SAMPLE_CYCLES = 10
+
+def _sample_cycles(edges: List[Tuple[str, str]], limit: int) -> List[List[str]]:
+    # fundamental cycles of a BFS tree: each non-tree edge closes one short cycle
+    if limit <= 0:
+        return []
+    adj: Dict[str, List[str]] = defaultdict(list)
+    for u, v in edges:
+        adj[u].append(v)
+        adj[v].append(u)
+    root = edges[0][0]
+    parent, depth, order = {root: root}, {root: 0}, [root]
+    for n in order:
+        for m in adj[n]:
+            if m not in parent:
+                parent[m], depth[m] = n, depth[n] + 1
+                order.append(m)
+    cycles = []
+    for u, v in edges:
+        if parent[u] == v or parent[v] == u:
+            continue
+        a, b, left, right = u, v, [u], [v]
+        while a != b:
+            if depth[a] >= depth[b]:
+                a = parent[a]
+                left.append(a)
+            else:
+                b = parent[b]
+                right.append(b)
+        cycles.append(left + right[-2::-1])
+        if len(cycles) >= limit:
+            break
+    return cycles
+
+def loop_summary(G: nx.Graph, max_cycles: int = MAX_SAMPLE_CYCLES,
+                 edges: Optional[List[Tuple[str, str]]] = None, scope: str = "all") -> List[Dict[str, Any]]:
+    # edges: restrict the analysis to this subset (e.g. L2 links); largest components first
+    H = G if edges is None else G.edge_subgraph(edges)
+    issues = []
+    for comp in nx.biconnected_component_edges(H):
+        if len(comp) < 3:
+            continue  # a bridge
+        nodes = {n for e in comp for n in e}
+        k = len(comp) - len(nodes) + 1
+        cycles = _sample_cycles(comp, max_cycles)
+        issues.append({"type": "loop_summary", "scope": scope, "nodes": len(nodes), "links": len(comp),
+                       "cyclomatic_number": k, "sample_cycles": cycles, "truncated": k > len(cycles)})
+    issues.sort(key=lambda i: -i["cyclomatic_number"])
+    return issues
+
 def missing_devices_by_description(devices: Dict[str, Any]) -> List[Dict[str, Any]]:
     import re
     issues = []
@@ -83,11 +157,12 @@ def aggregate_nodes(G: nx.Graph) -> List[Dict[str, Any]]:
     # Toy suggestion: degree-1 routers with same subnet as parent could be aggregated
     recs = []
     for n in G.nodes():
-        if G.degree(n) == 1:
+        if G.degree(n) == 1 and not is_segment(G, n):
             recs.append({"type":"aggregation_opportunity","node":n,"reason":"Leaf node; consider collapsing if not needed."})
     return recs
 
-def validate_all(G: nx.Graph, devices: Dict[str, Any]) -> List[Dict[str, Any]]:
+# Original rule-by-rule implementation; kept as the reference for bench/bench_validate.py
+def validate_all_sequential(G: nx.Graph, devices: Dict[str, Any]) -> List[Dict[str, Any]]:
     issues = []
     issues += duplicate_ips(devices)
     issues += vlan_mismatches(G, devices)
@@ -97,3 +172,397 @@ def validate_all(G: nx.Graph, devices: Dict[str, Any]) -> List[Dict[str, Any]]:
     issues += recommend_protocols(devices)
     issues += aggregate_nodes(G)
     return issues
+
+# --- indexed engine -------------------------------------------------------
+# One pass over the devices builds the lookups every rule needs; rules are plugins
+# registered by name and only read the index, so they can run in any order or in
+# parallel. validate_all returns the same findings, in the same order, as
+# validate_all_sequential.
+
+DESC_NEIGHBOR_RE = re.compile(r'\bto\s+([A-Za-z0-9_-]+)', re.I)
+
+@contextlib.contextmanager
+def _no_gc():
+    # the index is millions of small containers that all survive; collections while it
+    # is being built would only walk them again and again
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+class ValidationIndex:
+    def __init__(self, G: nx.Graph, devices: Dict[str, Any], options: Optional[Dict[str, Any]] = None):
+        self.G = G
+        self.devices = devices
+        self.options = options or {}  # per-rule settings, e.g. loops / loop_scope / max_cycles
+        self.order: Dict[str, int] = {}  # device -> rank in devices order (new devices go last)
+        self.ips: Dict[str, List[Tuple[str, str]]] = {}  # ip -> [(device, iface)]
+        self.net_vlans: Dict[Tuple[str, str], List[int]] = {}  # (device, network) -> vlans in iface order
+        self.desc_neighbors: Dict[str, List[Tuple[str, str]]] = {}  # device -> [(iface, neighbor named in description)]
+        self.described: Dict[str, Set[str]] = defaultdict(set)  # neighbor name -> devices naming it
+        self.bgp_asns: Dict[Any, int] = Counter()  # asn -> devices running it
+        self.ospf_devices: Set[str] = set()
+        self.next_rank = 0
+        with _no_gc():
+            if isinstance(devices, DeviceStore) and devices.regular:
+                self._add_store(devices)
+            else:
+                for d, dev in devices.items():
+                    self.add(d, dev)
+
+    def _add_store(self, store: DeviceStore):
+        # add() for every device at once, from the store's columns; the description regex
+        # runs once per distinct description and every network is formatted once
+        s, ips, net_vlans = store.strings, self.ips, self.net_vlans
+        rows = store.rows()
+        owner = store.owners()
+        devs = [owner[k] for k in store.column("if_device")[rows].tolist()]
+        names = [s[k] for k in store.column("if_name")[rows].tolist()]
+        addrs = [f"{a >> 24}.{a >> 16 & 255}.{a >> 8 & 255}.{a & 255}" if p >= 0 else ""
+                 for a, p in zip(store.column("if_ip")[rows].tolist(), store.column("if_plen")[rows].tolist())]
+        ids, inv = np.unique(store.network_ids()[rows], return_inverse=True)
+        uniq = [f"{k >> 30}.{k >> 22 & 255}.{k >> 14 & 255}.{k >> 6 & 255}/{k & 63}" if k >= 0 else ""
+                for k in ids.tolist()]  # id_network, inlined
+        nets = [uniq[k] for k in inv.tolist()]
+        for d in store:
+            self.order[d] = self.next_rank
+            self.next_rank += 1
+        for d, name, ip, net, vlan in zip(devs, names, addrs, nets, store.column("if_vlan")[rows].tolist()):
+            if ip:
+                ips.setdefault(ip, []).append((d, name))
+            net_vlans.setdefault((d, net), []).append(vlan)
+        named = {}
+        for k in np.unique(store.column("if_desc")).tolist():
+            m = DESC_NEIGHBOR_RE.search(s[k]) if k else None
+            if m:
+                named[k] = m.group(1)
+        descs = store.column("if_desc")[rows]
+        for i in np.flatnonzero(np.isin(descs, list(named))).tolist():
+            n = named[int(descs[i])]
+            self.desc_neighbors.setdefault(devs[i], []).append((names[i], n))
+            self.described[n].add(devs[i])
+        for d, dev in store.items():
+            routing = dev.get("routing", {})
+            for b in routing.get("bgp", []):
+                self.bgp_asns[b.get("asn")] += 1
+            if routing.get("ospf"):
+                self.ospf_devices.add(d)
+
+    @property
+    def runs_ospf(self) -> bool:
+        return bool(self.ospf_devices)
+
+    def add(self, d: str, dev: Dict[str, Any]):
+        if d not in self.order:
+            self.order[d] = self.next_rank
+            self.next_rank += 1
+        for i in dev.get("interfaces", []):
+            ip = i.get("ip", "")
+            if ip:
+                lst = self.ips.get(ip)
+                if lst is None:
+                    self.ips[ip] = [(d, i.get("name", ""))]
+                elif self.order[lst[-1][0]] <= self.order[d]:
+                    self.ips[ip] = lst + [(d, i.get("name", ""))]
+                else:  # a replaced device: keep locations in devices order
+                    self.ips[ip] = sorted(lst + [(d, i.get("name", ""))], key=lambda e: self.order[e[0]])
+            self.net_vlans.setdefault((d, i.get("network", "")), []).append(i.get("vlan", 0))
+            m = DESC_NEIGHBOR_RE.search(i.get("description", ""))
+            if m:
+                self.desc_neighbors.setdefault(d, []).append((i.get("name"), m.group(1)))
+                self.described[m.group(1)].add(d)
+        routing = dev.get("routing", {})
+        for b in routing.get("bgp", []):
+            self.bgp_asns[b.get("asn")] += 1
+        if routing.get("ospf"):
+            self.ospf_devices.add(d)
+
+    def remove(self, d: str, dev: Dict[str, Any], forget: bool = False):
+        # undo add(); lists are replaced rather than edited since findings may share them
+        for i in dev.get("interfaces", []):
+            ip = i.get("ip", "")
+            if ip in self.ips:
+                rest = [e for e in self.ips[ip] if e[0] != d]
+                if rest:
+                    self.ips[ip] = rest
+                else:
+                    del self.ips[ip]
+            self.net_vlans.pop((d, i.get("network", "")), None)
+        for _, n in self.desc_neighbors.pop(d, ()):
+            self.described[n].discard(d)
+            if not self.described[n]:
+                del self.described[n]
+        for b in dev.get("routing", {}).get("bgp", []):
+            self.bgp_asns[b.get("asn")] -= 1
+            if self.bgp_asns[b.get("asn")] <= 0:
+                del self.bgp_asns[b.get("asn")]
+        self.ospf_devices.discard(d)
+        if forget:
+            self.order.pop(d, None)
+
+    def vlans(self, device: str, network: str) -> Set[int]:
+        return set(self.net_vlans.get((device, network), ()))
+
+    def l2_edges(self) -> List[Tuple[str, str]]:
+        # switched links: LAN segment attachments, or a VLAN-tagged interface on either end
+        G, out = self.G, []
+        for u, v, net in G.edges(data="network", default=""):
+            if is_segment(G, u) or is_segment(G, v) or (
+                    net and (any(self.net_vlans.get((u, net), ())) or any(self.net_vlans.get((v, net), ())))):
+                out.append((u, v))
+        return out
+
+Rule = Callable[[ValidationIndex], List[Dict[str, Any]]]
+# A delta re-checks only what a change can affect. It gets the updated index and the
+# change (topology.patch_topology's result plus "ips") and returns (stale, fresh): previous
+# findings for which stale(finding) is true are replaced by fresh; None = unaffected.
+Delta = Callable[[ValidationIndex, Dict[str, Any]],
+                 Optional[Tuple[Callable[[Dict[str, Any]], bool], List[Dict[str, Any]]]]]
+RULES: Dict[str, Rule] = {}
+DELTAS: Dict[str, Delta] = {}
+
+def register_rule(name: str, fn: Rule, delta: Optional[Delta] = None):
+    # plugins call this (or use @rule); findings are reported in registration order.
+    # Incremental validation re-runs a rule without a delta in full on every change.
+    RULES[name] = fn
+    if delta is not None:
+        DELTAS[name] = delta
+    else:
+        DELTAS.pop(name, None)
+
+def rule(name: str, delta: Optional[Delta] = None):
+    def deco(fn: Rule) -> Rule:
+        register_rule(name, fn, delta)
+        return fn
+    return deco
+
+def _links(G: nx.Graph, pairs) -> List[Tuple[str, str]]:
+    # frozenset pairs from patch_topology that are still edges, in a stable order
+    out = []
+    for e in pairs:
+        u, v = sorted(e) if len(e) == 2 else (next(iter(e)),) * 2
+        if G.has_edge(u, v):
+            out.append((u, v))
+    return sorted(out)
+
+def _on_links(pairs):
+    return lambda f: frozenset(f["link"]) in pairs
+
+def _duplicate_ips_delta(ix: ValidationIndex, ch: Dict[str, Any]):
+    ips = ch["ips"]
+    if not ips:
+        return None
+    return (lambda f: f["ip"] in ips), [{"type": "duplicate_ip", "ip": ip, "locations": list(ix.ips[ip])}
+                                        for ip in sorted(ips) if len(ix.ips.get(ip, ())) > 1]
+
+@rule("duplicate_ips", _duplicate_ips_delta)
+def _duplicate_ips(ix: ValidationIndex):
+    return [{"type": "duplicate_ip", "ip": ip, "locations": list(lst)} for ip, lst in ix.ips.items() if len(lst) > 1]
+
+def _vlan_link(ix: ValidationIndex, u: str, v: str, net: str):
+    u_vlans, v_vlans = ix.vlans(u, net), ix.vlans(v, net)
+    if u_vlans and v_vlans and u_vlans != v_vlans:
+        return [{"type": "vlan_mismatch", "link": (u, v), "u_vlans": list(u_vlans), "v_vlans": list(v_vlans)}]
+    return []
+
+def _vlan_segment(ix: ValidationIndex, seg: str):
+    net = ix.G.nodes[seg]["network"]
+    member_vlans = {d: sorted(ix.vlans(d, net)) for d in ix.G.neighbors(seg)}
+    if len({tuple(v) for v in member_vlans.values()}) > 1:
+        return [{"type": "vlan_mismatch", "segment": seg, "member_vlans": member_vlans}]
+    return []
+
+def _vlan_delta(ix: ValidationIndex, ch: Dict[str, Any]):
+    G, issues = ix.G, []
+    for u, v in _links(G, ch["rebuilt"]):
+        net = G[u][v].get("network", "")
+        if net and not is_segment(G, u) and not is_segment(G, v):
+            issues += _vlan_link(ix, u, v, net)
+    for seg in sorted(ch["segments"]):
+        if seg in G:
+            issues += _vlan_segment(ix, seg)
+    rebuilt, segs = ch["rebuilt"], ch["segments"]
+    return (lambda f: frozenset(f["link"]) in rebuilt if "link" in f else f["segment"] in segs), issues
+
+@rule("vlan_mismatches", _vlan_delta)
+def _vlan_mismatches(ix: ValidationIndex):
+    G, issues = ix.G, []
+    for u, v, data in G.edges(data=True):
+        net = data.get("network", "")
+        if not net or is_segment(G, u) or is_segment(G, v):
+            continue
+        issues += _vlan_link(ix, u, v, net)
+    for seg in G.nodes():
+        if is_segment(G, seg):
+            issues += _vlan_segment(ix, seg)
+    return issues
+
+def _mtu_delta(ix: ValidationIndex, ch: Dict[str, Any]):
+    G = ix.G
+    return _on_links(ch["rebuilt"]), [{"type": "mtu_mismatch_warning", "link": (u, v), "edge_mtu": G[u][v].get("mtu")}
+                                      for u, v in _links(G, ch["rebuilt"]) if G[u][v].get("mtu", 1500) < 1500]
+
+@rule("mtu_mismatches", _mtu_delta)
+def _mtu_mismatches(ix: ValidationIndex):
+    return mtu_mismatches(ix.G)
+
+def _loops_delta(ix: ValidationIndex, ch: Dict[str, Any]):
+    # loops are global; only links appearing or disappearing can change them
+    return ((lambda f: True), _loops(ix)) if ch["structural"] else None
+
+@rule("loops", _loops_delta)
+def _loops(ix: ValidationIndex):
+    # the default stays the full basis; summary mode is for large meshed cores
+    scope = ix.options.get("loop_scope", "all")
+    if ix.options.get("loops", "basis") == "basis":
+        return loops(ix.G if scope == "all" else ix.G.edge_subgraph(ix.l2_edges()))
+    return loop_summary(ix.G, ix.options.get("max_cycles", MAX_SAMPLE_CYCLES),
+                        edges=ix.l2_edges() if scope == "l2" else None, scope=scope)
+
+def _missing_in(ix: ValidationIndex, d: str, only: Optional[str] = None):
+    return [{"type": "missing_neighbor_config", "device": d, "iface": name, "neighbor": n}
+            for name, n in ix.desc_neighbors.get(d, ()) if n not in ix.devices and only in (None, n)]
+
+def _missing_delta(ix: ValidationIndex, ch: Dict[str, Any]):
+    # re-check the changed devices' descriptions, and descriptions naming a changed device
+    devs, issues = ch["devices"], []
+    for d in sorted(devs):
+        issues += _missing_in(ix, d)
+        if d not in ix.devices:
+            for other in sorted(ix.described.get(d, ())):
+                if other not in devs:
+                    issues += _missing_in(ix, other, only=d)
+    return (lambda f: f["device"] in devs or f["neighbor"] in devs), issues
+
+@rule("missing_devices_by_description", _missing_delta)
+def _missing_devices(ix: ValidationIndex):
+    return [f for d in ix.devices for f in _missing_in(ix, d)]
+
+def _recommend_delta(ix: ValidationIndex, ch: Dict[str, Any]):
+    return ((lambda f: True), _recommend_protocols(ix)) if ch["devices"] else None
+
+@rule("recommend_protocols", _recommend_delta)
+def _recommend_protocols(ix: ValidationIndex):
+    if ix.bgp_asns and ix.runs_ospf:
+        return [{"type": "protocol_recommendation",
+                 "advice": "Use BGP for inter-domain and OSPF for intra-domain boundaries."}]
+    return []
+
+def _aggregate_delta(ix: ValidationIndex, ch: Dict[str, Any]):
+    G, nodes = ix.G, ch["nodes"]
+    return (lambda f: f["node"] in nodes), [
+        {"type": "aggregation_opportunity", "node": n, "reason": "Leaf node; consider collapsing if not needed."}
+        for n in sorted(nodes) if n in G and G.degree(n) == 1 and not is_segment(G, n)]
+
+@rule("aggregate_nodes", _aggregate_delta)
+def _aggregate_nodes(ix: ValidationIndex):
+    return aggregate_nodes(ix.G)
+
+_INDEX: Optional[ValidationIndex] = None
+
+def _run_rule(name: str):
+    t0 = time.perf_counter()
+    issues = RULES[name](_INDEX)
+    return name, issues, time.perf_counter() - t0
+
+def run_validation(G: nx.Graph, devices: Dict[str, Any], jobs: int = 1,
+                   rules: Optional[List[str]] = None, options: Optional[Dict[str, Any]] = None,
+                   index: Optional[ValidationIndex] = None,
+                   on_findings: Optional[Callable[[str, List[Dict[str, Any]]], None]] = None) -> Dict[str, Any]:
+    # -> {"issues": [...], "rules": [{"rule", "seconds", "findings"}], "index_seconds": s}
+    # index: reuse an existing ValidationIndex of G/devices (options are then taken from it)
+    # on_findings: called with (rule, findings) as each rule finishes, in rule order; the
+    #   findings are then not collected, and "issues" is empty
+    global _INDEX
+    names = [r for r in RULES if rules is None or r in rules]
+    t0 = time.perf_counter()
+    _INDEX = index if index is not None else ValidationIndex(G, devices, options)
+    index_seconds = time.perf_counter() - t0
+    workers = min(jobs if jobs > 0 else (os.cpu_count() or 1), len(names))
+    issues, timings = [], []
+    try:
+        with contextlib.ExitStack() as stack:
+            if workers > 1 and "fork" in mp.get_all_start_methods():
+                # forked workers inherit the index (and any runtime-registered rules) without pickling
+                ex = stack.enter_context(ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("fork")))
+                results = ex.map(_run_rule, names)
+            else:
+                results = map(_run_rule, names)
+            for n, found, dt in results:
+                timings.append({"rule": n, "seconds": round(dt, 6), "findings": len(found)})
+                if on_findings is not None:
+                    on_findings(n, found)
+                else:
+                    issues += found
+    finally:
+        _INDEX = None
+    return {"issues": issues, "rules": timings, "index_seconds": round(index_seconds, 6)}
+
+def validate_all(G: nx.Graph, devices: Dict[str, Any], jobs: int = 1,
+                 options: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    return run_validation(G, devices, jobs=jobs, options=options)["issues"]
+
+# --- incremental re-validation ---------------------------------------------
+
+def finding_key(f: Dict[str, Any]) -> str:
+    # identity of a finding when diffing runs: link direction and a loop's sample cycles
+    # depend on graph iteration order, so they do not count
+    f = dict(f)
+    if "link" in f:
+        u, v = f["link"]
+        if v < u:
+            f["link"], f["u_vlans"], f["v_vlans"] = (v, u), f.get("v_vlans"), f.get("u_vlans")
+        for k in ("u_vlans", "v_vlans"):
+            if f.get(k) is not None:
+                f[k] = sorted(f[k])
+            else:
+                f.pop(k, None)
+    f.pop("sample_cycles", None)
+    return json.dumps(f, sort_keys=True, default=list)
+
+def diff_findings(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    # -> (added, resolved), as multisets by finding_key
+    counts = Counter(finding_key(f) for f in old)
+    added = []
+    for f in new:
+        k = finding_key(f)
+        if counts[k] > 0:
+            counts[k] -= 1
+        else:
+            added.append(f)
+    resolved = []
+    for f in old:
+        k = finding_key(f)
+        if counts[k] > 0:
+            counts[k] -= 1
+            resolved.append(f)
+    return added, resolved
+
+def run_incremental(ix: ValidationIndex, findings: Dict[str, List[Dict[str, Any]]],
+                    change: Dict[str, Any]) -> Dict[str, Any]:
+    # findings: rule -> findings of the previous run; updated in place for the change
+    # (ix, ix.G and ix.devices must already reflect it)
+    # -> {"added": [...], "resolved": [...], "rules": [{"rule", "seconds", "findings", "rechecked"}]}
+    added, resolved, timings = [], [], []
+    for name, fn in RULES.items():
+        t0 = time.perf_counter()
+        old = findings.get(name)
+        if old is None or name not in DELTAS:
+            res = ((lambda f: True), fn(ix)) if old is None or change["devices"] else None
+        else:
+            res = DELTAS[name](ix, change)
+        if res is not None:
+            stale, fresh = res
+            keep, gone = [], []
+            for f in old or ():
+                (gone if stale(f) else keep).append(f)
+            a, r = diff_findings(gone, fresh)
+            added += a
+            resolved += r
+            findings[name] = keep + fresh
+        timings.append({"rule": name, "seconds": round(time.perf_counter() - t0, 6),
+                        "findings": len(findings[name]), "rechecked": res is not None})
+    return {"added": added, "resolved": resolved, "rules": timings}
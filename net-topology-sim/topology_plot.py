@@ -1,35 +1,108 @@
-import networkx as nx
-import matplotlib.pyplot as plt
-import json
+import argparse, os, time
+from src.ndjson import load_report
+from src.parser import iter_conf_dir
+from src.plot import (GROUPINGS, DEFAULT_PLOT, DEFAULT_LAYOUT_CACHE, MAX_NODES, auto_grouping, cached_layout,
+                      collapse, device_findings, group_nodes, link_utilization, neighborhood, render)
+from src.snapshot import SnapshotCache, load_snapshot, write_snapshot, DEFAULT_SNAPSHOT, STALE_MODES
+from src.topology import build_topology, TOPOLOGY_MODES
 
-# Load parsed.json (generated earlier by parse command)
-with open("./outputs/reports/parsed.json") as f:
-    devices = json.load(f)
+# Draws the topology to a file (no window; runs headless). The graph comes from a build
+# snapshot if there is one (rebuilt first if its configs changed), else from --conf, else from parsed.json or parsed.ndjson
+# (generated earlier by the parse command). Large graphs are collapsed into groups, see
+# src/plot.py.
+# usage: python topology_plot.py [--around LEAF0 --hops 2] [--group site] \
+#            [--loads outputs/reports/loadplan.json] [--findings outputs/reports/validate.json]
 
-# Build graph
-G = nx.Graph()
-for dev in devices:
-    G.add_node(dev)
+def load_graph(args):
+    snap = load_snapshot(args.snapshot) if args.snapshot and not args.conf else None
+    if snap is not None and snap.mode == args.topology:
+        return snapshot_graph(args, snap)
+    if args.conf:
+        devices = dict(iter_conf_dir(args.conf))
+    else:
+        path = args.parsed
+        if not os.path.exists(path) and os.path.exists(path.replace(".json", ".ndjson")):
+            path = path.replace(".json", ".ndjson")
+        if not os.path.exists(path):
+            raise SystemExit(f"no snapshot at {args.snapshot} and no {path}; run build or parse first, or pass --conf")
+        devices = load_report(path)
+    return build_topology(devices, mode=args.topology)
 
-subnet_map = {}
-for d, dev in devices.items():
-    for iface in dev.get("interfaces", []):
-        net = iface.get("network", "")
-        if net:
-            subnet_map.setdefault(net, []).append(d)
+def snapshot_graph(args, snap):
+    # the snapshot's graph, checked against its conf tree first (like --snapshot-stale in
+    # the CLI: rebuild re-parses only the changed configs and rewrites the snapshot)
+    if not os.path.isdir(snap.conf_root):
+        print(f"warning: {snap.conf_root} (the snapshot's conf tree) is gone, drawing the snapshot as it is")
+        return snap.graph()
+    stale = snap.stale()
+    if not stale:
+        return snap.graph()
+    summary = ", ".join(f"{len(v)} {k}" for k, v in stale.items())
+    if args.snapshot_stale == "error":
+        raise SystemExit(f"snapshot {args.snapshot} is stale ({summary} configs); run build again")
+    if args.snapshot_stale == "ignore":
+        print(f"warning: snapshot is stale ({summary} configs), drawing it anyway")
+        return snap.graph()
+    print(f"snapshot is stale ({summary} configs), rebuilding it")
+    sources = {}
+    devices = dict(iter_conf_dir(snap.conf_root, cache=SnapshotCache(snap), sources=sources))
+    G = build_topology(devices, mode=snap.mode)
+    write_snapshot(args.snapshot, snap.conf_root, devices, G, sources)
+    return G
 
-for net, lst in subnet_map.items():
-    if len(lst) > 1:
-        for i in range(len(lst)):
-            for j in range(i+1, len(lst)):
-                G.add_edge(lst[i], lst[j], label=net)
+def main():
+    ap = argparse.ArgumentParser(description="Draw the network topology to an image file")
+    ap.add_argument("--snapshot", default=DEFAULT_SNAPSHOT, metavar="DIR",
+                    help="build snapshot to take the graph from ('' to ignore it)")
+    ap.add_argument("--snapshot-stale", choices=STALE_MODES, default="rebuild",
+                    help="when configs changed since the snapshot: re-parse only those and rewrite "
+                         "it (rebuild), stop (error) or draw it anyway (ignore)")
+    ap.add_argument("--conf", default=None, help="parse this config directory instead")
+    ap.add_argument("--parsed", default="./outputs/reports/parsed.json",
+                    help="parse report to build from when there is no snapshot")
+    ap.add_argument("--topology", choices=TOPOLOGY_MODES, default="mesh")
+    ap.add_argument("--around", default=None, metavar="DEVICE", help="only draw the neighborhood of DEVICE")
+    ap.add_argument("--hops", type=int, default=2, help="size of the --around neighborhood")
+    ap.add_argument("--group", choices=GROUPINGS, default="auto",
+                    help=f"collapse devices by site, subnet or into the best-connected ones "
+                         f"(auto: site or degree above --max-nodes)")
+    ap.add_argument("--max-nodes", type=int, default=MAX_NODES, help="nodes drawn with --group auto/degree")
+    ap.add_argument("--site-pattern", default=None, metavar="REGEX",
+                    help="site = group 1 of this regex on the hostname (default: up to the first - _ or .)")
+    ap.add_argument("--subnet-prefix", type=int, default=16, help="prefix length of --group subnet")
+    ap.add_argument("--loads", default=None, metavar="REPORT", help="color links by utilization from plan-load")
+    ap.add_argument("--findings", default=None, metavar="REPORT", help="mark devices with validate findings")
+    ap.add_argument("--layout-cache", default=DEFAULT_LAYOUT_CACHE, help="layout cache directory ('' to disable)")
+    ap.add_argument("--iterations", type=int, default=50)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--out", default=DEFAULT_PLOT)
+    args = ap.parse_args()
 
-# Draw graph
-pos = nx.spring_layout(G, seed=42)
-nx.draw(G, pos, with_labels=True, node_color="lightblue", node_size=2000, font_size=12, font_weight="bold")
-labels = nx.get_edge_attributes(G, 'label')
-nx.draw_networkx_edge_labels(G, pos, edge_labels=labels, font_size=8)
+    t0 = time.perf_counter()
+    G = load_graph(args)
+    title = "Network topology"
+    if args.around:
+        try:
+            G = neighborhood(G, args.around, args.hops)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        title += f": {args.hops} hops around {args.around}"
+    util = link_utilization(G, load_report(args.loads)) if args.loads else None
+    found = device_findings(G, load_report(args.findings)) if args.findings else None
+    by = auto_grouping(G, args.max_nodes, args.site_pattern) if args.group == "auto" else args.group
+    try:
+        groups = group_nodes(G, by, args.max_nodes, args.site_pattern, args.subnet_prefix)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    H = collapse(G, groups, util, found)
+    if by != "none":
+        title += f" ({G.number_of_nodes()} nodes by {by})"
+    t1 = time.perf_counter()
+    pos, how = cached_layout(H, args.layout_cache or None, args.iterations, args.seed)
+    t2 = time.perf_counter()
+    render(H, pos, args.out, title, overlay=util is not None)
+    print(f"{H.number_of_nodes()} nodes, {H.number_of_edges()} links drawn to {args.out} "
+          f"(graph {t1 - t0:.1f}s, layout {how} {t2 - t1:.1f}s, render {time.perf_counter() - t2:.1f}s)")
 
-plt.title("Generated Network Topology", fontsize=14)
-plt.savefig("topology_diagram.png")
-plt.show()
+if __name__ == "__main__":
+    main()